@@ -0,0 +1,88 @@
+"""Benchmark for utils.insert_citation_markers.
+
+Times the single-pass implementation against the original per-citation string
+rebuild on long grounded answers. Their byte-for-byte equivalence is checked by
+tests/unit_tests/test_citations.py.
+
+Usage:
+    PYTHONPATH=src python benchmarks/citation_bench.py
+"""
+
+import random
+import timeit
+
+from agent.utils import insert_citation_markers
+
+
+def original_insert_citation_markers(text, citations_list):
+    """Verbatim copy of the implementation before the single-pass rewrite."""
+    sorted_citations = sorted(
+        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+    )
+    modified_text = text
+    for citation_info in sorted_citations:
+        end_idx = citation_info["end_index"]
+        marker_to_insert = ""
+        for segment in citation_info["segments"]:
+            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
+        modified_text = (
+            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+        )
+    return modified_text
+
+
+def grounded_answer(n_chars: int, n_citations: int):
+    """Build a long answer with `n_citations` random citations (seeded by the sizes)."""
+    rng = random.Random(n_chars * 31 + n_citations)
+    text = ("Đây là một câu trả lời có nguồn dẫn. " * (n_chars // 37 + 1))[:n_chars]
+    citations = []
+    for i in range(n_citations):
+        end = rng.randint(1, n_chars)
+        citations.append(
+            {
+                "start_index": max(0, end - 80),
+                "end_index": end,
+                "segments": [
+                    {
+                        "label": f"site{j}",
+                        "short_url": f"https://vertexaisearch.cloud.google.com/id/{i}-{j}",
+                    }
+                    for j in range(rng.randint(1, 3))
+                ],
+            }
+        )
+    return text, citations
+
+
+def main() -> None:
+    """Time both implementations on growing answers and print the speedup."""
+    print(
+        f"{'chars':>8}{'citations':>11}{'original ms':>13}{'single-pass ms':>16}{'speedup':>9}"
+    )
+    for n_chars, n_citations in [
+        (2_000, 20),
+        (10_000, 100),
+        (40_000, 400),
+        (100_000, 1_000),
+    ]:
+        text, citations = grounded_answer(n_chars, n_citations)
+        number = max(1, 2_000_000 // (n_chars * n_citations // 10 + 1))
+        old = (
+            timeit.timeit(
+                lambda: original_insert_citation_markers(text, citations), number=number
+            )
+            / number
+        )
+        new = (
+            timeit.timeit(
+                lambda: insert_citation_markers(text, citations), number=number
+            )
+            / number
+        )
+        print(
+            f"{n_chars:>8}{n_citations:>11}{old * 1e3:>13.3f}{new * 1e3:>16.3f}{old / new:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
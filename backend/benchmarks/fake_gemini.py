@@ -0,0 +1,243 @@
+"""Deterministic stand-ins for the Gemini clients used by `agent.graph`.
+
+`FakeGenaiClient` mimics `google.genai.Client` (`models.generate_content` and
+`aio.models.generate_content`) and returns grounded responses with grounding
+chunks and supports, or a fixed verdict for the speculative route classifier. `FakeChatModel` mimics the parts of ChatGoogleGenerativeAI
+the graph uses: invoke/ainvoke, stream/astream and with_structured_output for
+the schemas in `agent.tools_and_schemas`. Every call waits `latency` seconds
+plus uniform jitter drawn from a seeded RNG, so runs are reproducible.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace as NS
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from agent.tools_and_schemas import PlannerPlan, PlanStep, Reflection, SearchQueryList
+
+WORDS = (
+    "dữ liệu thị trường năm nay cho thấy mức tăng trưởng ổn định trong khi "
+    "các chuyên gia dự báo xu hướng tiếp tục với nhiều yếu tố tác động khác nhau"
+).split()
+
+
+class Latency:
+    """Seeded latency model shared by every fake client of a benchmark run."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, seed: int = 0):
+        """Time calls at `latency` seconds plus up to `jitter` either way."""
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def next(self) -> float:
+        """Return the duration of the next call."""
+        with self._lock:
+            self.calls += 1
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def sleep(self) -> None:
+        """Block for the duration of the next call."""
+        time.sleep(self.next())
+
+    async def asleep(self) -> None:
+        """Await the duration of the next call."""
+        await asyncio.sleep(self.next())
+
+
+def _text(n_words: int, salt: str = "") -> str:
+    offset = sum(map(ord, salt)) % len(WORDS)
+    words = [WORDS[(offset + i) % len(WORDS)] for i in range(n_words)]
+    sentences = [
+        " ".join(words[i : i + 12]).capitalize() + "." for i in range(0, n_words, 12)
+    ]
+    return " ".join(sentences)
+
+
+def grounded_response(query: str, n_sources: int = 4, n_words: int = 120):
+    """Build a generate_content response shaped like a Google Search grounded answer."""
+    text = _text(n_words, query)
+    chunks = [
+        NS(
+            web=NS(
+                uri=f"https://example{i}.com/{abs(hash(query)) % 10_000}",
+                title=f"example{i}.com",
+            )
+        )
+        for i in range(n_sources)
+    ]
+    supports = []
+    for m in re.finditer(r"[^.]*\.", text):
+        i = len(supports)
+        supports.append(
+            NS(
+                segment=NS(start_index=m.start(), end_index=m.end()),
+                grounding_chunk_indices=[i % n_sources, (i + 1) % n_sources],
+            )
+        )
+    metadata = NS(grounding_chunks=chunks, grounding_supports=supports)
+    return NS(text=text, candidates=[NS(grounding_metadata=metadata)])
+
+
+def _topic(contents) -> str:
+    m = re.search(r"research topic[^:]*:\s*(.+)", str(contents), re.IGNORECASE)
+    return (m.group(1) if m else str(contents))[:80]
+
+
+class _FakeModels:
+    def __init__(self, latency: Latency, n_sources: int, verdict: str):
+        self._latency = latency
+        self._n_sources = n_sources
+        self._verdict = verdict
+
+    def _response(self, contents):
+        if "chat or search" in str(contents):
+            return NS(text=self._verdict, candidates=[])
+        return grounded_response(_topic(contents), self._n_sources)
+
+    def generate_content(self, *, model, contents, config=None):
+        self._latency.sleep()
+        return self._response(contents)
+
+
+class _FakeAsyncModels(_FakeModels):
+    async def generate_content(self, *, model, contents, config=None):
+        await self._latency.asleep()
+        return self._response(contents)
+
+
+class FakeGenaiClient:
+    """Stand-in for `google.genai.Client` (sync and async `generate_content`)."""
+
+    def __init__(self, latency: Latency, n_sources: int = 4, verdict: str = "search"):
+        """Search answers cite `n_sources` sources; the route classifier answers `verdict`."""
+        self.models = _FakeModels(latency, n_sources, verdict)
+        self.aio = NS(models=_FakeAsyncModels(latency, n_sources, verdict))
+
+
+def _prompt_text(prompt) -> str:
+    if isinstance(prompt, list):
+        return "\n".join(str(getattr(m, "content", m)) for m in prompt)
+    return str(prompt)
+
+
+class FakeStructuredModel:
+    """Answers `with_structured_output` calls for the graph's schemas."""
+
+    def __init__(self, schema, latency: Latency, sufficient_after: int):
+        """Reflection reports sufficient once it sees `sufficient_after` summaries."""
+        self._schema = schema
+        self._latency = latency
+        self._sufficient_after = sufficient_after
+
+    def _result(self, prompt):
+        text = _prompt_text(prompt)
+        if self._schema is SearchQueryList:
+            m = re.search(r"more than (\d+) queries", text)
+            n = int(m.group(1)) if m else 1
+            return SearchQueryList(
+                query=[f"query {i} {_text(4, text)}" for i in range(n)],
+                rationale="fake",
+            )
+        if self._schema is Reflection:
+            summaries = text.count("\n---\n") + 1
+            sufficient = summaries >= self._sufficient_after
+            return Reflection(
+                is_sufficient=sufficient,
+                knowledge_gap="" if sufficient else "more detail needed",
+                follow_up_queries=[]
+                if sufficient
+                else [f"follow up {summaries} a", f"follow up {summaries} b"],
+            )
+        if self._schema is PlannerPlan:
+            return PlannerPlan(
+                objective="answer the question",
+                kind="answer",
+                steps=[PlanStep(description="summarize findings")],
+                acceptance_criteria=["cites sources"],
+            )
+        raise ValueError(f"FakeStructuredModel has no answer for {self._schema}")
+
+    def invoke(self, prompt, config=None, **kwargs):
+        """Return the schema instance for `prompt`."""
+        self._latency.sleep()
+        return self._result(prompt)
+
+    async def ainvoke(self, prompt, config=None, **kwargs):
+        """Async `invoke`."""
+        await self._latency.asleep()
+        return self._result(prompt)
+
+
+class FakeChatModel:
+    """Stand-in for the parts of ChatGoogleGenerativeAI the graph uses."""
+
+    def __init__(
+        self,
+        latency: Latency,
+        answer_words: int = 200,
+        chunk_words: int = 8,
+        sufficient_after: int = 4,
+    ):
+        """Answers are `answer_words` words long, streamed `chunk_words` at a time."""
+        self._latency = latency
+        self._answer_words = answer_words
+        self._chunk_words = chunk_words
+        self._sufficient_after = sufficient_after
+
+    def with_structured_output(self, schema, **kwargs):
+        """Return a structured fake for `schema`."""
+        return FakeStructuredModel(schema, self._latency, self._sufficient_after)
+
+    def _chunks(self, prompt):
+        words = _text(self._answer_words, _prompt_text(prompt)[:200]).split(" ")
+        for i in range(0, len(words), self._chunk_words):
+            yield AIMessageChunk(
+                content=" ".join(words[i : i + self._chunk_words]) + " "
+            )
+
+    def invoke(self, prompt, config=None, **kwargs):
+        """Return the whole answer to `prompt`."""
+        self._latency.sleep()
+        return AIMessage(content="".join(c.content for c in self._chunks(prompt)))
+
+    async def ainvoke(self, prompt, config=None, **kwargs):
+        """Async `invoke`."""
+        await self._latency.asleep()
+        return AIMessage(content="".join(c.content for c in self._chunks(prompt)))
+
+    def stream(self, prompt, config=None, **kwargs):
+        """Yield the answer to `prompt` chunk by chunk."""
+        self._latency.sleep()
+        yield from self._chunks(prompt)
+
+    async def astream(self, prompt, config=None, **kwargs):
+        """Async `stream`."""
+        await self._latency.asleep()
+        for chunk in self._chunks(prompt):
+            yield chunk
+
+
+def install(latency: Latency, verdict: str = "search", **chat_kwargs) -> None:
+    """Point `agent.graph` at the fakes. Must run before the graph is invoked.
+
+    `verdict` is what the speculative route classifier answers ("chat" or "search").
+    """
+    import sys
+
+    import agent.graph  # noqa: F401  (agent/__init__ shadows the module name)
+    from agent.clients import set_genai_client
+
+    graph_module = sys.modules["agent.graph"]
+    chat = FakeChatModel(latency, **chat_kwargs)
+    set_genai_client(FakeGenaiClient(latency, verdict=verdict))
+    graph_module.get_chat_model = lambda *args, **kwargs: chat
+    graph_module.get_structured_model = lambda model, temperature, schema: (
+        chat.with_structured_output(schema)
+    )
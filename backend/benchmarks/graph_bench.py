@@ -0,0 +1,237 @@
+"""End-to-end benchmark of the compiled `agent.graph` against a fake Gemini backend.
+
+Runs the real graph (routing, fan-out, reflection loops, planner/actor/self-check,
+streaming finalize) with `fake_gemini` standing in for google-genai and
+ChatGoogleGenerativeAI, and reports:
+
+- per-node wall time (from LangGraph callbacks),
+- end-to-end latency percentiles per concurrency level,
+- throughput (runs/s) at each concurrency level,
+- process memory high-water mark (and traced Python peak with --tracemalloc).
+
+The caches are disabled unless --with-caches is given, so every run pays for
+every model call.
+
+Usage:
+    PYTHONPATH=src python benchmarks/graph_bench.py --runs 40 --concurrency 1 8 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from typing_extensions import override
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gemini  # noqa: E402
+
+from agent.graph import graph  # noqa: E402
+
+RESEARCH_QUESTIONS = [
+    "giá vàng hôm nay thế nào",
+    "what is the latest gemini model",
+    "so sánh cổ phiếu nvidia và amd năm 2025",
+    "tình hình thời tiết hà nội tuần này",
+]
+CHAT_QUESTIONS = ["xin chào", "cảm ơn bạn nhiều nhé"]
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects wall time of every top-level graph node run."""
+
+    def __init__(self):
+        """Start with no recorded runs."""
+        self._starts: dict = {}
+        self.durations: dict = defaultdict(list)
+
+    @override
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        node = (metadata or {}).get("langgraph_node")
+        # Skip runs nested inside the node's own run (wrapped callables, edge functions)
+        if node and kwargs.get("name") == node and parent_run_id not in self._starts:
+            self._starts[run_id] = (node, time.perf_counter())
+
+    @override
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        started = self._starts.pop(run_id, None)
+        if started:
+            self.durations[started[0]].append(time.perf_counter() - started[1])
+
+    @override
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+
+def percentile(values, q: float) -> float:
+    """Return the `q` quantile of `values`, linearly interpolated."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+async def run_once(question: str, config: dict) -> float:
+    """Run the graph once on `question`; return the wall time in seconds."""
+    start = time.perf_counter()
+    state = {
+        "messages": [HumanMessage(content=question)],
+        "initial_search_query_count": config["configurable"][
+            "number_of_initial_queries"
+        ],
+        "max_research_loops": config["configurable"]["max_research_loops"],
+    }
+    async for _ in graph.astream(state, config, stream_mode="updates"):
+        pass
+    return time.perf_counter() - start
+
+
+async def run_level(concurrency: int, runs: int, args, timer: NodeTimer) -> dict:
+    """Run `runs` questions, `concurrency` at a time; return latency and throughput figures."""
+    questions = RESEARCH_QUESTIONS * (args.research_share) + CHAT_QUESTIONS
+    config = {
+        "callbacks": [timer],
+        "configurable": {
+            "number_of_initial_queries": args.initial_queries,
+            "max_research_loops": args.max_loops,
+            "search_cache_backend": "memory" if args.with_caches else "none",
+            "llm_cache_enabled": args.with_caches,
+            "execution_profile": args.profile,
+            "pipelined_research": args.pipelined,
+        },
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list = []
+
+    async def one(i: int):
+        async with semaphore:
+            latencies.append(await run_once(questions[i % len(questions)], config))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(runs)))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "wall_s": wall,
+        "throughput_rps": runs / wall,
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "p99_s": percentile(latencies, 0.99),
+        "mean_s": statistics.fmean(latencies),
+    }
+
+
+def main() -> None:
+    """Run every concurrency level and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=40, help="runs per concurrency level"
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="mean fake model latency (s)"
+    )
+    parser.add_argument("--jitter", type=float, default=0.02, help="uniform jitter (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--initial-queries", type=int, default=3)
+    parser.add_argument("--max-loops", type=int, default=2)
+    parser.add_argument("--answer-words", type=int, default=400)
+    parser.add_argument(
+        "--research-share",
+        type=int,
+        default=2,
+        help="copies of the research questions per copy of the chat questions",
+    )
+    parser.add_argument(
+        "--profile", default="balanced", choices=["fast", "balanced", "thorough"]
+    )
+    parser.add_argument(
+        "--pipelined", action="store_true", help="use the pipelined research node"
+    )
+    parser.add_argument(
+        "--with-caches", action="store_true", help="keep search/semantic caches on"
+    )
+    parser.add_argument(
+        "--tracemalloc", action="store_true", help="also report traced Python peak"
+    )
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    latency = fake_gemini.Latency(args.latency, args.jitter, args.seed)
+    fake_gemini.install(
+        latency,
+        answer_words=args.answer_words,
+        sufficient_after=args.initial_queries + 1,
+    )
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    timer = NodeTimer()
+    levels = []
+    for concurrency in args.concurrency:
+        levels.append(asyncio.run(run_level(concurrency, args.runs, args, timer)))
+
+    nodes = {
+        node: {
+            "calls": len(d),
+            "mean_ms": statistics.fmean(d) * 1e3,
+            "p95_ms": percentile(d, 0.95) * 1e3,
+            "total_s": sum(d),
+        }
+        for node, d in sorted(timer.durations.items())
+    }
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    maxrss_mb = maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+    memory = {"max_rss_mb": maxrss_mb}
+    if args.tracemalloc:
+        memory["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+    print(
+        f"fake latency {args.latency * 1e3:.0f}±{args.jitter * 1e3:.0f} ms, {latency.calls} model calls\n"
+    )
+    print(f"{'node':<18}{'calls':>7}{'mean ms':>10}{'p95 ms':>10}{'total s':>10}")
+    for node, s in nodes.items():
+        print(
+            f"{node:<18}{s['calls']:>7}{s['mean_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['total_s']:>10.2f}"
+        )
+    print(
+        f"\n{'concurrency':<13}{'runs':>6}{'runs/s':>9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+    )
+    for lv in levels:
+        print(
+            f"{lv['concurrency']:<13}{lv['runs']:>6}{lv['throughput_rps']:>9.2f}"
+            f"{lv['p50_s']:>8.3f}{lv['p95_s']:>8.3f}{lv['p99_s']:>8.3f}"
+        )
+    print("\nmemory: " + ", ".join(f"{k}={v:.1f}" for k, v in memory.items()))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "args": vars(args),
+                    "nodes": nodes,
+                    "levels": levels,
+                    "memory": memory,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Micro-benchmark: compiled route matcher vs. the original keyword if-chain.
+
+Measures the per-turn routing cost for growing conversations. The original
+joined the whole transcript and rescanned every keyword list on every turn;
+`classify_conversation` scans each message once and only scans new messages
+on later turns. Also checks that both agree on every input.
+
+Usage:
+    PYTHONPATH=src python benchmarks/route_mode_bench.py [--repeat 500]
+"""
+
+import argparse
+import re
+import time
+import timeit
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.routing import (
+    PATTERN_RULES,
+    ROUTE_RULES,
+    SHORT_FACTUAL_MAX_WORDS,
+    SHORT_FACTUAL_WORDS,
+    KeywordMatcher,
+    _scan_message,
+    classify_conversation,
+    classify_route,
+)
+from agent.utils import get_research_topic
+
+
+def legacy_route(q: str) -> str:
+    """Route like the pre-compilation route_mode body: one `any(k in q ...)` scan per rule."""
+    for rule in ("time", "new_tech", "knowledge"):
+        if any(k in q for k in ROUTE_RULES[rule]):
+            return "generate_query"
+    import re as _re  # the original imported inline on every call
+
+    if _re.search(PATTERN_RULES["year"], q) or _re.search(PATTERN_RULES["date"], q):
+        return "generate_query"
+    for rule in ("tech_entity", "outdated", "event"):
+        if any(k in q for k in ROUTE_RULES[rule]):
+            return "generate_query"
+    if len(q.split()) <= SHORT_FACTUAL_MAX_WORDS and any(
+        w in q for w in SHORT_FACTUAL_WORDS
+    ):
+        return "generate_query"
+    return "llm"
+
+
+def legacy_route_mode(messages) -> str:
+    """Route a conversation with `legacy_route`, like the old route_mode."""
+    return legacy_route((get_research_topic(messages) or "").lower().strip())
+
+
+def brute_force_rules(q: str) -> set:
+    """Every rule present in `q`, computed the slow obvious way."""
+    rules = {rule for rule, words in ROUTE_RULES.items() if any(k in q for k in words)}
+    rules |= {name for name, pattern in PATTERN_RULES.items() if re.search(pattern, q)}
+    if any(w in q for w in SHORT_FACTUAL_WORDS):
+        rules.add("short_factual")
+    return rules
+
+
+SEARCH_PROMPTS = [
+    "thời tiết hà nội hôm nay thế nào",
+    "gpt-5 ra mắt khi nào",
+    "so sánh react và vue cho dự án lớn",
+    "lịch nghỉ tết 2025",
+]
+CHAT_PROMPTS = [
+    "xin chào",
+    "cảm ơn bạn nhiều nhé",
+    "kể cho tôi nghe một câu chuyện cười",
+    "viết giúp tôi một bài thơ về mùa thu hà nội thật lãng mạn và sâu lắng",
+    "đọc hộ tôi đoạn văn này và sửa lỗi chính tả giúp nhé bạn ơi",
+]
+REPLY = "mình rất vui được trò chuyện cùng bạn, chúc bạn luôn vui vẻ và khỏe mạnh. " * 4
+
+
+def conversation(turns: int, prompts) -> list:
+    """Build a history of `turns` exchanges followed by one more prompt."""
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=prompts[i % len(prompts)]))
+        messages.append(AIMessage(content=REPLY))
+    messages.append(HumanMessage(content=prompts[turns % len(prompts)]))
+    return messages
+
+
+def main() -> None:
+    """Compare the legacy and compiled routers and print the timings."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    # Correctness: same route as the original, and explain=True finds every rule
+    for prompt in SEARCH_PROMPTS + CHAT_PROMPTS:
+        assert classify_route(prompt).route == legacy_route(prompt), prompt
+        assert classify_route(prompt, explain=True).rules == brute_force_rules(
+            prompt
+        ), prompt
+    for prompts in (SEARCH_PROMPTS, CHAT_PROMPTS):
+        for turns in (0, 1, 3, 10):
+            messages = conversation(turns, prompts)
+            q = (get_research_topic(messages) or "").lower().strip()
+            decision = classify_conversation(messages, explain=True)
+            assert decision.route == legacy_route_mode(messages), (turns, prompts)
+            assert decision.rules == brute_force_rules(q), (turns, prompts)
+
+    print(
+        f"{'conversation':<16}{'chars':>8}{'route':>16}{'legacy us':>12}{'compiled us':>14}{'speedup':>10}"
+    )
+    for kind, prompts in (("search", SEARCH_PROMPTS), ("chat", CHAT_PROMPTS)):
+        for turns in (0, 4, 16, 64):
+            messages = conversation(turns, prompts)
+            chars = len(get_research_topic(messages))
+            legacy = timeit.timeit(
+                lambda: legacy_route_mode(messages), number=args.repeat
+            )
+            # Every turn brings one new user message; earlier ones were scanned last turn
+            _scan_message.cache_clear()
+            classify_conversation(messages[:-1])
+            compiled = 0.0
+            last = messages[-1].content
+            for i in range(args.repeat):
+                messages[-1] = HumanMessage(content=f"{last} {i}")
+                start = time.perf_counter()
+                classify_conversation(messages)
+                compiled += time.perf_counter() - start
+            print(
+                f"{kind + '-' + str(turns):<16}{chars:>8}{legacy_route_mode(messages):>16}"
+                f"{legacy / args.repeat * 1e6:>12.1f}{compiled / args.repeat * 1e6:>14.1f}"
+                f"{legacy / compiled:>9.1f}x"
+            )
+
+    start = timeit.default_timer()
+    KeywordMatcher(ROUTE_RULES, PATTERN_RULES)
+    print(
+        f"matcher build: {(timeit.default_timer() - start) * 1e3:.2f} ms (once, at import)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Cold-start benchmark: import time of the API app and the graph worker.
+
+Every sample is a new `python -c "import <module>"` process (so nothing is
+warm in sys.modules), run without GEMINI_API_KEY to check that importing never
+needs credentials. Reports the import time measured inside the child and the
+process wall time including interpreter start-up. With --importtime, also lists
+the slowest imports of each module (from `python -X importtime`).
+
+Usage:
+    PYTHONPATH=src python benchmarks/startup_bench.py [--runs 10] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = [
+    "agent.app",
+    "agent.graph",
+    "agent.image",
+    "agent.intent",
+    "agent.preview",
+]
+
+_CHILD = (
+    "import importlib, time\n"
+    "t = time.perf_counter()\n"
+    "importlib.import_module({module!r})\n"
+    "print(time.perf_counter() - t)\n"
+)
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env.pop("GEMINI_API_KEY", None)
+    src = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+    )
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (src, env.get("PYTHONPATH")) if p)
+    # A .env file would put the key back (honoured by python-dotenv >= 1.1)
+    env["PYTHON_DOTENV_DISABLED"] = "1"
+    return env
+
+
+def sample(module: str, env: dict):
+    """Return (import seconds, process seconds), or the child's error text."""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(module=module)],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        return proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"
+    return float(proc.stdout.strip().splitlines()[-1]), wall
+
+
+def slowest_imports(module: str, env: dict, top: int):
+    """Slowest imports up to two levels below `module`: (cumulative us, self us, name)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <indented name>"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        head, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if 1 <= depth <= 2:
+            rows.append((int(cumulative_us), int(head.split(":")[1]), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.0f}"
+
+
+def main() -> None:
+    """Run the benchmark and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=10, help="fresh processes per module"
+    )
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument(
+        "--importtime", action="store_true", help="list the slowest imports"
+    )
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument(
+        "--json", dest="json_path", help="write the results to this file"
+    )
+    args = parser.parse_args()
+
+    env = _child_env()
+    results = {}
+    print(
+        f"{'module':<16}{'import p50':>12}{'p95':>9}{'process p50':>13}{'p95':>9}   (ms)"
+    )
+    for module in args.modules:
+        samples = [sample(module, env) for _ in range(args.runs)]
+        errors = [s for s in samples if isinstance(s, str)]
+        if errors:
+            results[module] = {"error": errors[0]}
+            print(f"{module:<16}  import failed: {errors[0]}")
+            continue
+        imports = sorted(s[0] for s in samples)
+        walls = sorted(s[1] for s in samples)
+        p95 = max(0, int(round(0.95 * len(samples))) - 1)
+        results[module] = {
+            "import_p50_s": statistics.median(imports),
+            "import_p95_s": imports[p95],
+            "process_p50_s": statistics.median(walls),
+            "process_p95_s": walls[p95],
+        }
+        print(
+            f"{module:<16}{_ms(statistics.median(imports)):>12}{_ms(imports[p95]):>9}"
+            f"{_ms(statistics.median(walls)):>13}{_ms(walls[p95]):>9}"
+        )
+
+    if args.importtime:
+        for module in args.modules:
+            if "error" in results.get(module, {}):
+                continue
+            print(f"\nslowest imports under {module} (cumulative ms, self ms):")
+            for cumulative, self_us, name in slowest_imports(module, env, args.top):
+                print(f"  {cumulative / 1000:8.1f} {self_us / 1000:8.1f}  {name}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,19 @@
-from agent.graph import graph
+"""The research agent.
+
+`agent.graph` (the compiled graph) is imported on first access, so importing
+other modules of the package, e.g. `agent.app`, does not build the graph.
+"""
+
+from typing import Any
 
 __all__ = ["graph"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "graph":
+        from agent.graph import graph
+
+        # Importing the submodule bound `agent.graph` to the module; expose the graph instead
+        globals()["graph"] = graph
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,16 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
 import pathlib
+
+from dotenv import load_dotenv
 from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
-from .preview import router as preview_router
-from .image import router as image_router
-from .intent import router as intent_router
+
 from policy.admin import router as policy_admin_router
 
-from dotenv import load_dotenv
+from .image import router as image_router
+from .intent import router as intent_router
+from .metrics import router as metrics_router
+from .preview import router as preview_router
 
 # Load environment variables from .env at startup so uvicorn works standalone
 load_dotenv()
@@ -18,6 +21,7 @@ app.include_router(preview_router)
 app.include_router(policy_admin_router)
 app.include_router(image_router)
 app.include_router(intent_router)
+app.include_router(metrics_router)
 
 
 def create_frontend_router(build_dir="../frontend/dist"):
@@ -0,0 +1,131 @@
+"""ChatGoogleGenerativeAI routed through the outbound scheduler.
+
+Kept apart from agent.models so that langchain_google_genai is only imported
+when the first model is built.
+"""
+
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from agent.outbound import (
+    MAX_QUOTA_RETRIES,
+    Priority,
+    is_quota_error,
+    priority_for_node,
+    quota_delay,
+    reserve_tokens,
+    scheduler,
+)
+
+
+def _reserved_tokens(messages: Sequence[BaseMessage]) -> int:
+    return reserve_tokens(*(str(getattr(m, "content", m)) for m in messages))
+
+
+def _priority(
+    run_manager: CallbackManagerForLLMRun | AsyncCallbackManagerForLLMRun | None,
+) -> Priority:
+    # Graph nodes pass their name down to the model run as metadata
+    metadata = getattr(run_manager, "metadata", None) or {}
+    return priority_for_node(metadata.get("langgraph_node"))
+
+
+def _chat_result_tokens(result: ChatResult) -> int:
+    usage = (
+        getattr(result.generations[0].message, "usage_metadata", None)
+        if result.generations
+        else None
+    )
+    return int((usage or {}).get("total_tokens", 0))
+
+
+class ScheduledChatModel(ChatGoogleGenerativeAI):
+    """ChatGoogleGenerativeAI whose calls queue in the process-wide outbound scheduler.
+
+    Streams are requeued after a quota error only until their first chunk.
+    """
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return scheduler.call(
+            self.model,
+            lambda: super(ScheduledChatModel, self)._generate(
+                messages, stop, run_manager, **kwargs
+            ),
+            tokens=_reserved_tokens(messages),
+            priority=_priority(run_manager),
+            usage=_chat_result_tokens,
+        )
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await scheduler.acall(
+            self.model,
+            lambda: super(ScheduledChatModel, self)._agenerate(
+                messages, stop, run_manager, **kwargs
+            ),
+            tokens=_reserved_tokens(messages),
+            priority=_priority(run_manager),
+            usage=_chat_result_tokens,
+        )
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens, priority = _reserved_tokens(messages), _priority(run_manager)
+        for attempt in range(MAX_QUOTA_RETRIES + 1):
+            scheduler.acquire(self.model, tokens, priority)
+            started = False
+            try:
+                for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_quota_error(e) or attempt >= MAX_QUOTA_RETRIES:
+                    raise
+                scheduler.pause(self.model, quota_delay(e, attempt))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens, priority = _reserved_tokens(messages), _priority(run_manager)
+        for attempt in range(MAX_QUOTA_RETRIES + 1):
+            await scheduler.aacquire(self.model, tokens, priority)
+            started = False
+            try:
+                async for chunk in super()._astream(
+                    messages, stop, run_manager, **kwargs
+                ):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_quota_error(e) or attempt >= MAX_QUOTA_RETRIES:
+                    raise
+                scheduler.pause(self.model, quota_delay(e, attempt))
@@ -0,0 +1,155 @@
+"""Shared clients and concurrency primitives.
+
+The google-genai client, named per-loop semaphores and the pooled HTTP client
+used for link previews.
+
+Every named semaphore reports its queue depth, tasks in flight, saturation
+(in flight / limit) and wait time on `/metrics`, labelled by workload, like
+the executors of agent.executors.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Literal, Optional
+
+from dotenv import load_dotenv
+from typing_extensions import override
+
+from agent.metrics import registry
+
+if TYPE_CHECKING:
+    import httpx
+    from google.genai import Client
+
+load_dotenv()
+
+# Shared Gemini client, built on first use. The sync surface lives on
+# `.models`, the async one on `.aio.models`; both reuse the same credentials.
+_genai_client: Optional["Client"] = None
+_genai_client_lock = threading.Lock()
+
+
+def get_genai_client() -> "Client":
+    """Return the process-wide google-genai client, creating it on first call.
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set.
+    """
+    global _genai_client
+    if _genai_client is None:
+        with _genai_client_lock:
+            if _genai_client is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if api_key is None:
+                    raise ValueError("GEMINI_API_KEY is not set")
+                from google.genai import Client
+
+                _genai_client = Client(api_key=api_key)
+    return _genai_client
+
+
+def set_genai_client(client: Optional["Client"]) -> None:
+    """Replace the shared client (e.g. with a fake); None rebuilds it on next use."""
+    global _genai_client
+    with _genai_client_lock:
+        _genai_client = client
+
+
+SEMAPHORE_QUEUE_DEPTH = registry.gauge(
+    "locaith_semaphore_queue_depth", "Tasks waiting for a named semaphore, by workload."
+)
+SEMAPHORE_IN_FLIGHT = registry.gauge(
+    "locaith_semaphore_in_flight", "Tasks holding a named semaphore, by workload."
+)
+SEMAPHORE_SATURATION = registry.gauge(
+    "locaith_semaphore_saturation",
+    "Tasks in flight as a fraction of the semaphore limit, by workload.",
+)
+SEMAPHORE_WAIT = registry.histogram(
+    "locaith_semaphore_wait_seconds",
+    "Time tasks waited for a named semaphore, by workload.",
+)
+
+
+class MeteredSemaphore(asyncio.Semaphore):
+    """A semaphore for one workload, with queue and saturation metrics."""
+
+    def __init__(self, name: str, limit: int):
+        """Allow `limit` holders of workload `name` at once."""
+        super().__init__(limit)
+        self.name = name
+        self.limit = limit
+        self._in_flight = 0
+
+    def _held(self, delta: int) -> None:
+        self._in_flight += delta
+        SEMAPHORE_IN_FLIGHT.inc(delta, workload=self.name)
+        SEMAPHORE_SATURATION.set(self._in_flight / self.limit, workload=self.name)
+
+    @override
+    async def acquire(self) -> Literal[True]:
+        """Wait for a slot, counting the wait in the workload's metrics."""
+        started = time.monotonic()
+        SEMAPHORE_QUEUE_DEPTH.inc(1, workload=self.name)
+        try:
+            await super().acquire()
+        finally:
+            SEMAPHORE_QUEUE_DEPTH.inc(-1, workload=self.name)
+        SEMAPHORE_WAIT.observe(time.monotonic() - started, workload=self.name)
+        self._held(1)
+        return True
+
+    @override
+    def release(self) -> None:
+        """Free a slot."""
+        self._held(-1)
+        super().release()
+
+
+# asyncio primitives are bound to the loop they are first used on, so keep one
+# set of named semaphores per running event loop.
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, MeteredSemaphore]]" = weakref.WeakKeyDictionary()
+_semaphores_lock = threading.Lock()
+
+
+def get_semaphore(name: str, limit: int) -> MeteredSemaphore:
+    """Return the process-wide semaphore `name` for the running event loop.
+
+    The limit is fixed by the first caller; later calls with a different limit
+    reuse the existing semaphore so every caller shares the same budget.
+    """
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        per_loop = _semaphores.setdefault(loop, {})
+        semaphore = per_loop.get(name)
+        if semaphore is None:
+            semaphore = MeteredSemaphore(name, max(1, int(limit)))
+            per_loop[name] = semaphore
+        return semaphore
+
+
+# Pooled HTTP client for plain web fetches (link previews). Its connection pool
+# belongs to the loop it was created on, so there is one client per event loop.
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_http_clients_lock = threading.Lock()
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Return the shared `httpx.AsyncClient` of the running event loop."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        client = _http_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(5.0),
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+            _http_clients[loop] = client
+        return client
@@ -1,8 +1,8 @@
 import os
-from pydantic import BaseModel, Field
 from typing import Any, Optional
 
 from langchain_core.runnables import RunnableConfig
+from pydantic import BaseModel, Field
 
 
 class Configuration(BaseModel):
@@ -10,33 +10,195 @@ class Configuration(BaseModel):
 
     query_generator_model: str = Field(
         default="gemini-2.0-flash",
-        metadata={
-            "description": "The name of the language model to use for the agent's query generation."
-        },
+        description="The name of the language model to use for the agent's query generation.",
     )
 
     reflection_model: str = Field(
         default="gemini-2.5-flash",
-        metadata={
-            "description": "The name of the language model to use for the agent's reflection."
-        },
+        description="The name of the language model to use for the agent's reflection.",
     )
 
     answer_model: str = Field(
         default="gemini-2.5-pro",
-        metadata={
-            "description": "The name of the language model to use for the agent's answer."
-        },
+        description="The name of the language model to use for the agent's answer.",
     )
 
     number_of_initial_queries: int = Field(
         default=3,
-        metadata={"description": "The number of initial search queries to generate."},
+        description="The number of initial search queries to generate.",
     )
 
     max_research_loops: int = Field(
         default=2,
-        metadata={"description": "The maximum number of research loops to perform."},
+        description="The maximum number of research loops to perform.",
+    )
+
+    execution_profile: str = Field(
+        default="balanced",
+        description=(
+            "Post-research pipeline: fast (straight to the answer), balanced "
+            "(cheap planner, actor and self-check only for code/analysis tasks) or thorough "
+            "(planner, actor and self-check on the answer model)."
+        ),
+    )
+
+    planner_model: str = Field(
+        default="gemini-2.5-flash",
+        description="The name of the language model used for planning in the balanced profile.",
+    )
+
+    speculative_routing: bool = Field(
+        default=False,
+        description=(
+            "Run the direct llm draft and query generation together for borderline "
+            "prompts and keep the one a fast classifier picks."
+        ),
+    )
+
+    speculative_classifier_model: str = Field(
+        default="gemini-2.0-flash",
+        description="The name of the language model that decides between chat and search when speculating.",
+    )
+
+    speculative_classifier_timeout: float = Field(
+        default=2.0,
+        description="Seconds to wait for the speculative classifier before keeping the search branch.",
+    )
+
+    speculative_max_in_flight: int = Field(
+        default=8,
+        description="Process-wide cap on concurrent speculative routings.",
+    )
+
+    speculative_max_per_minute: int = Field(
+        default=120,
+        description=(
+            "Process-wide cap on speculative routings started per minute; "
+            "prompts over budget take their keyword route."
+        ),
+    )
+
+    pipelined_research: bool = Field(
+        default=False,
+        description=(
+            "Reflect while web research queries are still running, start follow-up "
+            "queries early and drop stragglers (async path only)."
+        ),
+    )
+
+    pipelined_reflection_quorum: float = Field(
+        default=0.5,
+        description=(
+            "Fraction of in-flight web research queries that must return before a "
+            "pipelined reflection runs."
+        ),
+    )
+
+    research_straggler_deadline: float = Field(
+        default=20.0,
+        description=(
+            "Seconds a pipelined web research query may take, retries included, "
+            "before it is dropped."
+        ),
+    )
+
+    follow_up_max_queries: int = Field(
+        default=3,
+        description="Maximum number of follow-up queries researched in parallel per research loop.",
+    )
+
+    research_latency_budget: float = Field(
+        default=60.0,
+        description=(
+            "Seconds a request may spend researching; no follow-up loop is started "
+            "that is expected to overrun it."
+        ),
+    )
+
+    research_token_budget: int = Field(
+        default=60000,
+        description="Research summary tokens a request may gather; caps the follow-up fan-out.",
+    )
+
+    singleflight_enabled: bool = Field(
+        default=True,
+        description=(
+            "Whether concurrent identical web research queries and direct llm "
+            "prompts share one in-flight Gemini call."
+        ),
+    )
+
+    web_research_max_concurrency: int = Field(
+        default=16,
+        description="Process-wide cap on concurrent Google Search grounding calls (async path only).",
+    )
+
+    web_research_timeout: float = Field(
+        default=30.0,
+        description="Timeout in seconds for a single web research attempt (async path only).",
+    )
+
+    web_research_max_retries: int = Field(
+        default=3,
+        description="The maximum number of attempts per web research query.",
+    )
+
+    search_cache_backend: str = Field(
+        default="memory",
+        description="Backend for the web research result cache: memory, sqlite, redis or none.",
+    )
+
+    search_cache_ttl: float = Field(
+        default=6 * 3600,
+        description="Lifetime in seconds of a cached web research result.",
+    )
+
+    search_cache_max_entries: int = Field(
+        default=1024,
+        description="Maximum number of cached web research results before LRU eviction.",
+    )
+
+    search_cache_url: Optional[str] = Field(
+        default=None,
+        description="SQLite file path or Redis URL for the search cache (defaults to REDIS_URI for redis).",
+    )
+
+    llm_cache_enabled: bool = Field(
+        default=False,
+        description=(
+            "Whether the direct llm path answers near-duplicate opening prompts from the semantic cache. "
+            "Hits also need the same numbers, dates and names as the cached prompt."
+        ),
+    )
+
+    llm_cache_threshold: float = Field(
+        default=0.97,
+        description="Minimum cosine similarity for a semantic cache hit on the direct llm path.",
+    )
+
+    llm_cache_capacity: int = Field(
+        default=2048,
+        description="Maximum number of answers kept in the semantic cache.",
+    )
+
+    llm_cache_eviction: str = Field(
+        default="lru",
+        description="Semantic cache eviction policy when full: lru or fifo.",
+    )
+
+    reflection_context_tokens: int = Field(
+        default=24000,
+        description="Token budget for research summaries in the reflection prompt.",
+    )
+
+    planner_context_tokens: int = Field(
+        default=12000,
+        description="Token budget for research summaries in the planner prompt.",
+    )
+
+    answer_context_tokens: int = Field(
+        default=32000,
+        description="Token budget for research summaries, plan, artifacts and feedback in the final answer prompt.",
     )
 
     @classmethod
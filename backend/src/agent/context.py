@@ -0,0 +1,130 @@
+"""Token-bounded research context for the reflection, planner and answer prompts.
+
+Every web_research summary becomes a segment with its token estimate computed
+once; prompts are built from the deduplicated segments, fitted into a budget.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# A research segment is one web_research summary with its token count computed
+# once, when the summary is produced:
+#   {"id": str, "text": str, "tokens": int}
+Segment = Dict[str, Any]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Cut truncated segments at the last sentence or line break when one is close
+_CUT_RE = re.compile(r"(?s).*[.!?\n]")
+_ELLIPSIS = " …"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), no tokenizer round trip."""
+    return (len(text) + 3) // 4
+
+
+def make_segment(text: str) -> Segment:
+    """Wrap a research summary as a segment; the id is a digest of its normalized text."""
+    normalized = _WHITESPACE_RE.sub(" ", text).strip()
+    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+    return {"id": digest, "text": text, "tokens": estimate_tokens(text)}
+
+
+def merge_segments(
+    left: Optional[List[Segment]], right: Optional[List[Segment]]
+) -> List[Segment]:
+    """State reducer: append new segments, dropping ones whose content is already present."""
+    left = list(left or [])
+    seen = {seg["id"] for seg in left}
+    for seg in right or []:
+        if seg["id"] not in seen:
+            seen.add(seg["id"])
+            left.append(seg)
+    return left
+
+
+def segments_from_state(state: Mapping[str, Any]) -> List[Segment]:
+    """Research segments of a run; rebuilt from `web_research_result` for older checkpoints."""
+    segments: Optional[List[Segment]] = state.get("research_context")
+    if segments:
+        return segments
+    return merge_segments(
+        [], [make_segment(t) for t in state.get("web_research_result") or []]
+    )
+
+
+def _truncate(text: str, tokens: int) -> str:
+    max_chars = max(0, tokens * 4 - len(_ELLIPSIS))
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    m = _CUT_RE.match(head)
+    if m and m.end() >= max_chars // 2:
+        head = m.group(0)
+    return head.rstrip() + _ELLIPSIS
+
+
+def _fit(segments: Sequence[Segment], budget: int, separator: str) -> str:
+    sep_tokens = estimate_tokens(separator) * max(len(segments) - 1, 0)
+    total = sum(seg["tokens"] for seg in segments) + sep_tokens
+    if total <= budget:
+        return separator.join(seg["text"] for seg in segments)
+
+    # Water-filling: small segments are kept whole, the rest share what is left
+    # equally, so every query keeps some coverage instead of the tail being cut.
+    remaining = max(budget - sep_tokens, 0)
+    allowance: Dict[int, int] = {}
+    order = sorted(range(len(segments)), key=lambda i: segments[i]["tokens"])
+    for n, i in enumerate(order):
+        share = remaining // (len(order) - n)
+        allowance[i] = min(segments[i]["tokens"], share)
+        remaining -= allowance[i]
+    parts = []
+    for i, seg in enumerate(segments):
+        if allowance[i] >= seg["tokens"]:
+            parts.append(seg["text"])
+        elif allowance[i] > 0:
+            parts.append(_truncate(seg["text"], allowance[i]))
+    return separator.join(parts)
+
+
+class ContextBuilder:
+    """Builds token-bounded prompt context from research segments.
+
+    Results are memoized by (segment ids, budget, separator): the nodes of a run
+    (and the loops of a run) ask for the same or a growing segment list, so an
+    unchanged context is never rebuilt.
+    """
+
+    def __init__(self, max_cached: int = 256):
+        """Memoize up to `max_cached` built contexts."""
+        self._cache: OrderedDict[Tuple[Tuple[str, ...], int, str], str] = OrderedDict()
+        self._max_cached = max_cached
+        self._lock = threading.Lock()
+
+    def build(self, segments: Sequence[Segment], budget: int, separator: str) -> str:
+        """Join `segments` with `separator`, fitted into `budget` tokens."""
+        key = (tuple(seg["id"] for seg in segments), budget, separator)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        text = _fit(segments, budget, separator)
+        with self._lock:
+            self._cache[key] = text
+            while len(self._cache) > self._max_cached:
+                self._cache.popitem(last=False)
+        return text
+
+
+context_builder = ContextBuilder()
+
+
+def build_research_context(
+    state: Mapping[str, Any], budget: int, separator: str
+) -> str:
+    """Deduplicated research summaries of `state`, fitted into `budget` tokens."""
+    return context_builder.build(segments_from_state(state), budget, separator)
@@ -0,0 +1,99 @@
+"""Named thread pools for blocking work, one per workload.
+
+`asyncio.to_thread` runs everything on the event loop's default executor, so
+a burst of slow work of one kind (e.g. image store disk I/O) can hold every
+thread and stall unrelated requests. Blocking work runs on the executor of its
+workload instead, each sized on its own (`<NAME>_EXECUTOR_WORKERS`, e.g.
+IMAGE_EXECUTOR_WORKERS), so a slow workload only queues behind itself.
+
+Every executor reports its queue depth, busy workers, saturation (busy /
+workers) and queue wait on `/metrics`, labelled by workload.
+
+Gemini calls do not go through an executor: they use the async client. Async
+workloads (link preview fetches, intent classification) are bounded by the
+named semaphores of agent.clients, which report the same metrics.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from agent.metrics import registry
+
+_T = TypeVar("_T")
+
+# Default worker threads per workload; unlisted workloads get DEFAULT_WORKERS
+EXECUTOR_WORKERS: Dict[str, int] = {"image": 8}
+DEFAULT_WORKERS = 4
+
+QUEUE_DEPTH = registry.gauge(
+    "locaith_executor_queue_depth", "Jobs waiting for a worker thread, by workload."
+)
+BUSY = registry.gauge(
+    "locaith_executor_busy_workers", "Worker threads running a job, by workload."
+)
+SATURATION = registry.gauge(
+    "locaith_executor_saturation",
+    "Busy worker threads as a fraction of the pool, by workload.",
+)
+QUEUE_WAIT = registry.histogram(
+    "locaith_executor_wait_seconds",
+    "Time jobs waited for a worker thread, by workload.",
+)
+
+
+class BoundedExecutor:
+    """A fixed-size thread pool for one workload, with queue and saturation metrics."""
+
+    def __init__(self, name: str, max_workers: int):
+        """Start a pool of `max_workers` threads named after workload `name`."""
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(
+            self.max_workers, thread_name_prefix=f"locaith-{name}"
+        )
+        self._busy = 0
+        self._lock = threading.Lock()
+        SATURATION.set(0, workload=name)
+
+    def _run(self, enqueued: float, fn: Callable[[], _T]) -> _T:
+        QUEUE_DEPTH.inc(-1, workload=self.name)
+        QUEUE_WAIT.observe(time.monotonic() - enqueued, workload=self.name)
+        with self._lock:
+            self._busy += 1
+            BUSY.set(self._busy, workload=self.name)
+            SATURATION.set(self._busy / self.max_workers, workload=self.name)
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self._busy -= 1
+                BUSY.set(self._busy, workload=self.name)
+                SATURATION.set(self._busy / self.max_workers, workload=self.name)
+
+    def _dequeue_cancelled(self, future: "Future[Any]") -> None:
+        if future.cancelled():
+            QUEUE_DEPTH.inc(-1, workload=self.name)
+
+    async def run(self, fn: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+        """Await `fn(*args, **kwargs)` on this pool, like `asyncio.to_thread` (context included)."""
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        QUEUE_DEPTH.inc(1, workload=self.name)
+        future = self._pool.submit(self._run, time.monotonic(), call)
+        # A job cancelled while queued never reaches _run
+        future.add_done_callback(self._dequeue_cancelled)
+        return await asyncio.wrap_future(future)
+
+
+@functools.cache
+def get_executor(name: str) -> BoundedExecutor:
+    """Process-wide executor of workload `name`, sized by <NAME>_EXECUTOR_WORKERS."""
+    workers = os.getenv(
+        f"{name.upper()}_EXECUTOR_WORKERS", EXECUTOR_WORKERS.get(name, DEFAULT_WORKERS)
+    )
+    return BoundedExecutor(name, int(workers))
@@ -1,44 +1,114 @@
-import os, json
+import asyncio
+import functools
+import json
+import logging
+import math
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+    get_type_hints,
+)
 
-from agent.tools_and_schemas import SearchQueryList, Reflection, PlannerPlan
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    BaseMessageChunk,
+    HumanMessage,
+    SystemMessage,
+)
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import merge_configs
+from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
-from langgraph.graph import StateGraph
-from langgraph.graph import START, END
-from langchain_core.runnables import RunnableConfig
-from google.genai import Client
 
-from agent.state import (
-    OverallState,
-    QueryGenerationState,
-    ReflectionState,
-    WebSearchState,
-)
+from agent.clients import get_genai_client, get_semaphore
 from agent.configuration import Configuration
+from agent.context import (
+    build_research_context,
+    estimate_tokens,
+    make_segment,
+    segments_from_state,
+)
+from agent.metrics import (
+    instrument_node,
+    note_cache,
+    note_model_call,
+    note_retry,
+    recent_duration,
+)
+from agent.models import get_chat_model, get_structured_model
+from agent.outbound import Priority, genai_usage, reserve_tokens, scheduler
 from agent.prompts import (
+    answer_instructions,
     get_current_date,
     query_writer_instructions,
-    web_searcher_instructions,
     reflection_instructions,
-    answer_instructions,
+    route_classifier_instructions,
+    web_searcher_instructions,
+)
+from agent.research_budget import (
+    DEFAULT_REFLECTION_SECONDS,
+    DEFAULT_TOKENS_PER_QUERY,
+    DEFAULT_WEB_RESEARCH_SECONDS,
+    follow_up_fan_out,
+)
+from agent.routing import classify_conversation, is_borderline
+from agent.search_cache import (
+    Payload,
+    SearchCache,
+    get_search_cache,
+    make_cache_key,
+    normalize_query,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
+from agent.semantic_cache import SemanticCache, get_semantic_cache
+from agent.singleflight import SingleFlight
+from agent.sources import (
+    merge_sources,
+    register_short_urls,
+    rewrite_short_urls,
+    source_registry_from_state,
+    sources_from_citations,
+)
+from agent.speculation import get_speculation_budget, note_speculation, parse_verdict
+from agent.state import (
+    OverallState,
+    QueryGenerationState,
+    ReflectionState,
+    WebSearchState,
+)
+from agent.tools_and_schemas import PlannerPlan, Reflection, SearchQueryList
 from agent.utils import (
     get_citations,
     get_research_topic,
     insert_citation_markers,
+    resolve_url_list,
     resolve_urls,
 )
 from policy.loader import get_system_preamble
 
+if TYPE_CHECKING:
+    from google.genai import types
+
 load_dotenv()
 
-if os.getenv("GEMINI_API_KEY") is None:
-    raise ValueError("GEMINI_API_KEY is not set")
+logger = logging.getLogger(__name__)
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
+_T = TypeVar("_T")
 
 
 # Nodes
@@ -56,19 +126,16 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
         Dictionary with state update, including search_query key containing the generated queries
     """
     configurable = Configuration.from_runnable_config(config)
+    started_at = time.time()
 
     # check for custom initial search query count
     if state.get("initial_search_query_count") is None:
         state["initial_search_query_count"] = configurable.number_of_initial_queries
 
     # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = get_structured_model(
+        configurable.query_generator_model, 1.0, SearchQueryList
     )
-    structured_llm = llm.with_structured_output(SearchQueryList)
 
     # Format the prompt
     current_date = get_current_date()
@@ -79,24 +146,196 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
     )
     # Generate the search queries
     result = structured_llm.invoke(formatted_prompt)
-    return {"generate_query": {"search_query": result.query}, "search_query": result.query}
+    return {
+        "generate_query": {"search_query": result.query},
+        "search_query": result.query,
+        "research_started_at": started_at,
+    }
 
 
-def continue_to_web_research(state: QueryGenerationState):
+def continue_to_web_research(
+    state: QueryGenerationState, config: RunnableConfig
+) -> Union[str, List[Send]]:
     """LangGraph node that sends the search queries to the web research node.
 
-    This is used to spawn n number of web research nodes, one for each search query.
+    This is used to spawn n number of web research nodes, one for each search query,
+    or to hand all of them to the `research` node when `pipelined_research` is on.
     """
+    if Configuration.from_runnable_config(config).pipelined_research:
+        return "research"
     return [
         Send("web_research", {"search_query": search_query, "id": int(idx)})
         for idx, search_query in enumerate(state["search_query"])
     ]
 
 
+@functools.lru_cache(maxsize=1)
+def _retryable_search_errors() -> Tuple[Type[Exception], ...]:
+    """Errors worth retrying: 5xx from the Gemini API plus transport-level failures.
+
+    Built on first use so importing the graph does not import google-genai.
+    """
+    from google.genai import errors as genai_errors
+
+    return (genai_errors.ServerError, ConnectionError, TimeoutError)
+
+
+def _web_research_prompt(state: WebSearchState, current_date: str) -> str:
+    return web_searcher_instructions.format(
+        current_date=current_date,
+        research_topic=state["search_query"],
+    )
+
+
+def _search_cache(configurable: Configuration) -> Optional[SearchCache]:
+    return get_search_cache(
+        configurable.search_cache_backend,
+        configurable.search_cache_ttl,
+        configurable.search_cache_max_entries,
+        configurable.search_cache_url,
+    )
+
+
+def _web_research_config() -> "types.GenerateContentConfigDict":
+    return {
+        "tools": [{"google_search": {}}],
+        "temperature": 0,
+    }
+
+
+def _web_research_failure(state: WebSearchState, message: str) -> OverallState:
+    return {
+        "web_research": {"sources_gathered": []},
+        "sources_gathered": [],
+        "search_query": [state["search_query"]],
+        "web_research_result": [message],
+        "research_context": [make_segment(message)],
+    }
+
+
+def _search_payload(response: Any) -> Optional[Payload]:
+    """Extract the cacheable part of a grounded response, or None if it is not grounded."""
+    if not response.candidates or not response.candidates[0].grounding_metadata:
+        return None
+    chunks = response.candidates[0].grounding_metadata.grounding_chunks or []
+    # Short urls depend on the branch id, so they are resolved again when the payload is used
+    citations = get_citations(response, resolve_urls(chunks, 0))
+    return {
+        "text": response.text,
+        "grounding_chunks": [{"uri": c.web.uri, "title": c.web.title} for c in chunks],
+        "citations": [
+            {
+                "start_index": c["start_index"],
+                "end_index": c["end_index"],
+                "segments": [
+                    {"label": seg["label"], "value": seg["value"]} for seg in c["segments"]
+                ],
+            }
+            for c in citations
+        ],
+    }
+
+
+def _note_genai_usage(model: str, response: _T) -> _T:
+    usage = getattr(response, "usage_metadata", None)
+    note_model_call(
+        model,
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "candidates_token_count", 0) or 0,
+    )
+    return response
+
+
+# Concurrent identical searches / direct llm prompts share one in-flight call
+_search_flights = SingleFlight("web_research")
+_llm_flights = SingleFlight("llm")
+
+
+def _search_flight_key(
+    configurable: Configuration, query: str, model: str, current_date: str
+) -> Optional[str]:
+    if not configurable.singleflight_enabled:
+        return None
+    return make_cache_key(query, model, current_date)
+
+
+def _web_research_result(
+    state: WebSearchState,
+    response: Any,
+    cache: Optional[SearchCache] = None,
+    model: str = "",
+    current_date: str = "",
+) -> OverallState:
+    """Turn a grounded generate_content response into a web_research state update."""
+    payload = _search_payload(response)
+    # Check if response has grounding metadata
+    if payload is None:
+        logger.warning("No grounding metadata found for query: %s", state["search_query"])
+        return _web_research_failure(
+            state, response.text if response.text else "No results found"
+        )
+    if cache is not None:
+        cache.set(state["search_query"], model, current_date, payload)
+    return _web_research_from_payload(state, payload)
+
+
+async def _aweb_research_result(
+    state: WebSearchState,
+    response: Any,
+    cache: Optional[SearchCache],
+    model: str,
+    current_date: str,
+) -> OverallState:
+    """Async `_web_research_result`: the cache is written off the event loop."""
+    payload = _search_payload(response)
+    if payload is None:
+        return _web_research_result(state, response)
+    if cache is not None:
+        await cache.aset(state["search_query"], model, current_date, payload)
+    return _web_research_from_payload(state, payload)
+
+
+def _web_research_from_payload(state: WebSearchState, payload: Payload) -> OverallState:
+    # resolve the urls to short urls for saving tokens and time
+    resolved_urls = resolve_url_list(
+        [chunk["uri"] for chunk in payload["grounding_chunks"]], state["id"]
+    )
+    citations = [
+        {
+            "start_index": c["start_index"],
+            "end_index": c["end_index"],
+            "segments": [
+                {
+                    "label": seg["label"],
+                    "short_url": resolved_urls.get(seg["value"]),
+                    "value": seg["value"],
+                }
+                for seg in c["segments"]
+            ],
+        }
+        for c in payload["citations"]
+    ]
+    # Adds the citations to the generated text
+    modified_text = insert_citation_markers(payload["text"], citations)
+    segments = [item for citation in citations for item in citation["segments"]]
+    sources_gathered = sources_from_citations(citations, state["id"])
+
+    return {
+        "web_research": {"sources_gathered": segments},
+        "sources_gathered": sources_gathered,
+        "source_registry": register_short_urls(sources_gathered),
+        "search_query": [state["search_query"]],
+        "web_research_result": [modified_text],
+        "research_context": [make_segment(modified_text)],
+    }
+
+
 def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
 
     Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
+    This is the synchronous variant used by `graph.invoke`; `aweb_research` is used when the
+    graph runs on an event loop.
 
     Args:
         state: Current graph state containing the search query and research loop count
@@ -105,85 +344,139 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     Returns:
         Dictionary with state update, including sources_gathered, research_loop_count, and web_research_results
     """
-    import time
-    from google.api_core import exceptions as google_exceptions
-    
-    # Configure
     configurable = Configuration.from_runnable_config(config)
-    formatted_prompt = web_searcher_instructions.format(
-        current_date=get_current_date(),
-        research_topic=state["search_query"],
-    )
+    model = configurable.query_generator_model
+    current_date = get_current_date()
+    cache = _search_cache(configurable)
+    if cache is not None:
+        cached = cache.get(state["search_query"], model, current_date)
+        note_cache("search", cached is not None)
+        if cached is not None:
+            return _web_research_from_payload(state, cached)
+    formatted_prompt = _web_research_prompt(state, current_date)
+
+    flight_key = _search_flight_key(configurable, state["search_query"], model, current_date)
+
+    def search_call() -> "types.GenerateContentResponse":
+        # Uses the google genai client as the langchain client doesn't return grounding metadata
+        response = scheduler.call(
+            model,
+            lambda: get_genai_client().models.generate_content(
+                model=model,
+                contents=formatted_prompt,
+                config=_web_research_config(),
+            ),
+            tokens=reserve_tokens(formatted_prompt),
+            usage=genai_usage,
+        )
+        return _note_genai_usage(model, response)
 
     # Retry logic with exponential backoff for Google Search API
-    max_retries = 3
+    max_retries = configurable.web_research_max_retries
     base_delay = 1.0
-    
+
     for attempt in range(max_retries):
         try:
-            # Uses the google genai client as the langchain client doesn't return grounding metadata
-            response = genai_client.models.generate_content(
-                model=configurable.query_generator_model,
-                contents=formatted_prompt,
-                config={
-                    "tools": [{"google_search": {}}],
-                    "temperature": 0,
-                },
-            )
-            
-            # Check if response has grounding metadata
-            if not response.candidates or not response.candidates[0].grounding_metadata:
-                print(f"Warning: No grounding metadata found for query: {state['search_query']}")
-                return {
-                    "web_research": {"sources_gathered": []},
-                    "sources_gathered": [],
-                    "search_query": [state["search_query"]],
-                    "web_research_result": [response.text if response.text else "No results found"],
-                }
-            
-            # resolve the urls to short urls for saving tokens and time
-            resolved_urls = resolve_urls(
-                response.candidates[0].grounding_metadata.grounding_chunks, state["id"]
+            if flight_key is None:
+                response = search_call()
+            else:
+                response = _search_flights.do(flight_key, search_call)
+            return _web_research_result(state, response, cache, model, current_date)
+
+        except _retryable_search_errors() as e:
+            logger.warning(
+                "Google Search API timeout/error (attempt %d/%d): %s", attempt + 1, max_retries, e
             )
-            # Gets the citations and adds them to the generated text
-            citations = get_citations(response, resolved_urls)
-            modified_text = insert_citation_markers(response.text, citations)
-            sources_gathered = [item for citation in citations for item in citation["segments"]]
 
-            return {
-                "web_research": {"sources_gathered": sources_gathered},
-                "sources_gathered": sources_gathered,
-                "search_query": [state["search_query"]],
-                "web_research_result": [modified_text],
-            }
-            
-        except (google_exceptions.DeadlineExceeded, google_exceptions.ServiceUnavailable, 
-                google_exceptions.InternalServerError, ConnectionError, TimeoutError) as e:
-            print(f"Google Search API timeout/error (attempt {attempt + 1}/{max_retries}): {e}")
-            
             if attempt < max_retries - 1:
+                note_retry()
                 # Exponential backoff
                 delay = base_delay * (2 ** attempt)
-                print(f"Retrying in {delay} seconds...")
+                logger.info("Retrying in %s seconds...", delay)
                 time.sleep(delay)
                 continue
+        except Exception as e:
+            logger.exception("Unexpected error in web_research: %s", e)
+            return _web_research_failure(state, f"Search error: {str(e)}")
+
+    # Final attempt failed, return empty results
+    logger.warning("All retry attempts failed for query: %s", state["search_query"])
+    return _web_research_failure(
+        state, f"Search failed after {max_retries} attempts. Please try again."
+    )
+
+
+async def aweb_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+    """Async variant of `web_research` built on the async google-genai surface.
+
+    Every attempt holds a slot of the process-wide "web_research" semaphore and is
+    bounded by `web_research_timeout`; backoff between attempts uses `asyncio.sleep`
+    and does not hold a slot, so fan-out branches never pin a worker thread.
+    """
+    configurable = Configuration.from_runnable_config(config)
+    model = configurable.query_generator_model
+    current_date = get_current_date()
+    cache = _search_cache(configurable)
+    if cache is not None:
+        cached = await cache.aget(state["search_query"], model, current_date)
+        note_cache("search", cached is not None)
+        if cached is not None:
+            return _web_research_from_payload(state, cached)
+    formatted_prompt = _web_research_prompt(state, current_date)
+    semaphore = get_semaphore("web_research", configurable.web_research_max_concurrency)
+    flight_key = _search_flight_key(configurable, state["search_query"], model, current_date)
+
+    async def attempt_call() -> "types.GenerateContentResponse":
+        async with semaphore:
+            return await asyncio.wait_for(
+                get_genai_client().aio.models.generate_content(
+                    model=model,
+                    contents=formatted_prompt,
+                    config=_web_research_config(),
+                ),
+                timeout=configurable.web_research_timeout,
+            )
+
+    async def search_call() -> "types.GenerateContentResponse":
+        # Wait for rate-limit capacity before taking a concurrency slot
+        response = await scheduler.acall(
+            model,
+            attempt_call,
+            tokens=reserve_tokens(formatted_prompt),
+            usage=genai_usage,
+        )
+        return _note_genai_usage(model, response)
+
+    max_retries = configurable.web_research_max_retries
+    base_delay = 1.0
+
+    for attempt in range(max_retries):
+        try:
+            if flight_key is None:
+                response = await search_call()
             else:
-                # Final attempt failed, return empty results
-                print(f"All retry attempts failed for query: {state['search_query']}")
-                return {
-                    "web_research": {"sources_gathered": []},
-                    "sources_gathered": [],
-                    "search_query": [state["search_query"]],
-                    "web_research_result": [f"Search failed after {max_retries} attempts. Please try again."],
-                }
+                response = await _search_flights.ado(flight_key, search_call)
+            return await _aweb_research_result(state, response, cache, model, current_date)
+
+        except _retryable_search_errors() as e:
+            logger.warning(
+                "Google Search API timeout/error (attempt %d/%d): %s", attempt + 1, max_retries, e
+            )
+
+            if attempt < max_retries - 1:
+                note_retry()
+                delay = base_delay * (2 ** attempt)
+                logger.info("Retrying in %s seconds...", delay)
+                await asyncio.sleep(delay)
+                continue
         except Exception as e:
-            print(f"Unexpected error in web_research: {e}")
-            return {
-                "web_research": {"sources_gathered": []},
-                "sources_gathered": [],
-                "search_query": [state["search_query"]],
-                "web_research_result": [f"Search error: {str(e)}"],
-            }
+            logger.exception("Unexpected error in web_research: %s", e)
+            return _web_research_failure(state, f"Search error: {str(e)}")
+
+    logger.warning("All retry attempts failed for query: %s", state["search_query"])
+    return _web_research_failure(
+        state, f"Search failed after {max_retries} attempts. Please try again."
+    )
 
 
 def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
@@ -207,19 +500,18 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
 
     # Format the prompt
     current_date = get_current_date()
+    segments = segments_from_state(state)
     formatted_prompt = reflection_instructions.format(
         current_date=current_date,
         research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
+        summaries=build_research_context(
+            state, configurable.reflection_context_tokens, "\n\n---\n\n"
+        ),
     )
     # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    result = get_structured_model(reasoning_model, 1.0, Reflection).invoke(
+        formatted_prompt
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
 
     return {
         "reflection": {"is_sufficient": result.is_sufficient},
@@ -228,24 +520,69 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
         "follow_up_queries": result.follow_up_queries,
         "research_loop_count": state["research_loop_count"],
         "number_of_ran_queries": len(state["search_query"]),
+        "research_tokens": sum(seg["tokens"] for seg in segments),
+        "research_segments": len(segments),
     }
 
 
+EXECUTION_PROFILES = ("fast", "balanced", "thorough")
+
+
+def _execution_profile(state: Mapping[str, Any], configurable: Configuration) -> str:
+    """Return the execution profile of this request; the state value wins over the configuration."""
+    profile = (state.get("execution_profile") or configurable.execution_profile).lower()
+    if profile not in EXECUTION_PROFILES:
+        logger.warning("Unknown execution profile %r, using 'balanced'", profile)
+        return "balanced"
+    return profile
+
+
+def _after_research(state: Mapping[str, Any], configurable: Configuration) -> str:
+    # The fast profile answers straight from the research summaries
+    if _execution_profile(state, configurable) == "fast":
+        return "finalize_answer"
+    return "planner"
+
+
+def _follow_up_fan_out(
+    state: Mapping[str, Any], configurable: Configuration, max_research_loops: int
+) -> int:
+    """Return how many `follow_up_queries` to run next, from the latency and token budgets."""
+    started_at = state.get("research_started_at") or time.time()
+    research_tokens = state.get("research_tokens") or 0
+    research_segments = state.get("research_segments") or 0
+    return follow_up_fan_out(
+        candidates=len(state["follow_up_queries"] or []),
+        loops_left=max_research_loops - state["research_loop_count"],
+        remaining_seconds=configurable.research_latency_budget - (time.time() - started_at),
+        loop_seconds=recent_duration("web_research", DEFAULT_WEB_RESEARCH_SECONDS)
+        + recent_duration("reflection", DEFAULT_REFLECTION_SECONDS),
+        remaining_tokens=configurable.research_token_budget - research_tokens,
+        tokens_per_query=(
+            research_tokens // research_segments if research_segments else DEFAULT_TOKENS_PER_QUERY
+        ),
+        max_queries=configurable.follow_up_max_queries,
+    )
+
+
 def evaluate_research(
     state: ReflectionState,
     config: RunnableConfig,
-) -> OverallState:
+) -> Union[str, List[Send]]:
     """LangGraph routing function that determines the next step in the research flow.
 
     Controls the research loop by deciding whether to continue gathering information
     or to finalize the summary based on the configured maximum number of research loops.
+    Follow-up queries are sent in parallel; how many is decided per loop from the
+    request's latency and token budgets and the observed node times
+    (see `agent.research_budget`).
 
     Args:
         state: Current graph state containing the research loop count
         config: Configuration for the runnable, including max_research_loops setting
 
     Returns:
-        String literal indicating the next node to visit ("web_research" or "finalize_summary")
+        String literal indicating the next node to visit ("web_research", "planner" or "finalize_answer")
     """
     configurable = Configuration.from_runnable_config(config)
     max_research_loops = (
@@ -254,46 +591,189 @@ def evaluate_research(
         else configurable.max_research_loops
     )
     if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
-        # Guild5: when sufficient, move to planner instead of finalizing immediately
-        return "planner"
-    else:
-        # Limit to only 1 follow-up query per loop for performance optimization
-        # Take the first (most important) follow-up query only
-        if state["follow_up_queries"]:
-            return [
-                Send(
-                    "web_research",
-                    {
-                        "search_query": state["follow_up_queries"][0],  # Only first query
-                        "id": state["number_of_ran_queries"],
-                    },
-                )
-            ]
-        else:
-            return "planner"
+        # Guild5: when sufficient, move to planner (or straight to the answer
+        # in the fast profile)
+        return _after_research(state, configurable)
+
+    # Adaptive fan-out: spread the follow-ups over the loops the latency and
+    # token budgets still allow (most important queries first)
+    follow_ups = state["follow_up_queries"] or []
+    fan_out = _follow_up_fan_out(state, configurable, max_research_loops)
+    if fan_out == 0:
+        return _after_research(state, configurable)
+    return [
+        Send(
+            "web_research",
+            {"search_query": query, "id": state["number_of_ran_queries"] + i},
+        )
+        for i, query in enumerate(follow_ups[:fan_out])
+    ]
+
+
+# Pipelined research: reflect while searches are still running
+
+# Reducers of the accumulating OverallState keys, used to merge branch updates
+# inside the `research` node the way LangGraph merges them between nodes.
+_STATE_REDUCERS = {
+    key: hint.__metadata__[0]
+    for key, hint in get_type_hints(OverallState, include_extras=True).items()
+    if getattr(hint, "__metadata__", None) and key != "messages"
+}
+
+
+async def _ainvoke_node(
+    node: Callable[..., Any], state: Mapping[str, Any], config: RunnableConfig
+) -> Any:
+    """Run node function `node` inside the current node, as a child run sharing its config."""
+    return await RunnableLambda(node).ainvoke(state, config)
+
+
+def _merge_update(acc: Dict[str, Any], update: Mapping[str, Any]) -> None:
+    for key, value in update.items():
+        reducer = _STATE_REDUCERS.get(key)
+        acc[key] = reducer(acc[key], value) if reducer and key in acc else value
+
+
+async def apipelined_research(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that runs the web research fan-out and the reflection loop as a pipeline.
+
+    Replaces the `web_research` fan-out and `reflection` when `pipelined_research` is on:
+
+    - reflection runs as soon as `pipelined_reflection_quorum` of the in-flight queries
+      have returned, while the rest keep running;
+    - a sufficient reflection drops the queries still running;
+    - an insufficient one starts its follow-up query right away, next to the stragglers;
+    - a query still running `research_straggler_deadline` seconds after it started
+      (retries included) is dropped.
+
+    Returns the merged web research updates plus the last reflection's fields.
+    """
+    configurable = Configuration.from_runnable_config(config)
+    max_research_loops = (
+        state.get("max_research_loops")
+        if state.get("max_research_loops") is not None
+        else configurable.max_research_loops
+    )
+    deadline = configurable.research_straggler_deadline
+    next_id = len(state.get("search_query") or [])
+    # Measured like the web_research node: the adaptive fan-out reads its recent duration
+    web_research_node = instrument_node("web_research", aweb_research)
+
+    async def search(query: str, query_id: int) -> Optional[OverallState]:
+        try:
+            return await asyncio.wait_for(
+                web_research_node({"search_query": query, "id": query_id}, config), timeout=deadline
+            )
+        except TimeoutError:
+            logger.info("Dropping web research straggler after %ss: %s", deadline, query)
+            return None
+
+    pending = {
+        asyncio.create_task(search(query, query_id))
+        for query_id, query in enumerate(state["search_query"])
+    }
+    acc: Dict[str, Any] = {}
+    reflected: Optional[Dict[str, Any]] = None
+    loops = state.get("research_loop_count", 0)
+    unreflected = 0
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result:
+                    _merge_update(acc, result)
+                    unreflected += 1
+            in_batch = unreflected + len(pending)
+            if (
+                loops >= max_research_loops
+                or not unreflected
+                or unreflected < math.ceil(configurable.pipelined_reflection_quorum * in_batch)
+            ):
+                continue
+
+            view: Dict[str, Any] = {**state, "research_loop_count": loops}
+            for key, value in acc.items():
+                reducer = _STATE_REDUCERS.get(key)
+                view[key] = reducer(state.get(key) or [], value) if reducer else value
+            reflected = await _ainvoke_node(reflection, view, config)
+            loops = reflected["research_loop_count"]
+            unreflected = 0
+            if reflected["is_sufficient"]:
+                break
+            # Like evaluate_research, fan out to as many follow-ups as the budgets allow
+            fan_out = _follow_up_fan_out(
+                {**reflected, "research_started_at": state.get("research_started_at")},
+                configurable,
+                max_research_loops,
+            )
+            for query in reflected["follow_up_queries"][:fan_out]:
+                pending.add(asyncio.create_task(search(query, next_id)))
+                next_id += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    update: Dict[str, Any] = dict(acc)
+    update["web_research"] = {"sources_gathered": acc.get("sources_gathered") or []}
+    update["research_loop_count"] = loops
+    if reflected is not None:
+        update["reflection"] = reflected["reflection"]
+        update["is_sufficient"] = reflected["is_sufficient"]
+        update["knowledge_gap"] = reflected["knowledge_gap"]
+    return cast(OverallState, update)
+
+
+# Event loop of the sync `research` node, started on first use. One long-lived loop
+# keeps its per-loop semaphores and HTTP/genai clients across runs, and works
+# whether or not the calling thread already runs a loop.
+_research_loop: Optional[asyncio.AbstractEventLoop] = None
+_research_loop_lock = threading.Lock()
+
+
+def _get_research_loop() -> asyncio.AbstractEventLoop:
+    global _research_loop
+    with _research_loop_lock:
+        if _research_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="pipelined-research", daemon=True).start()
+            _research_loop = loop
+        return _research_loop
+
+
+def pipelined_research(state: OverallState, config: RunnableConfig) -> OverallState:
+    """Sync variant of `apipelined_research` for `graph.invoke`; runs it on a shared loop thread."""
+    return asyncio.run_coroutine_threadsafe(
+        apipelined_research(state, config), _get_research_loop()
+    ).result()
+
+
+def after_pipelined_research(state: OverallState, config: RunnableConfig) -> str:
+    """LangGraph routing function after the `research` node; the same exits as evaluate_research."""
+    return _after_research(state, Configuration.from_runnable_config(config))
 
 
 # Guild5: Planner node
 
 def planner(state: OverallState, config: RunnableConfig) -> OverallState:
     configurable = Configuration.from_runnable_config(config)
-    reasoning_model = state.get("reasoning_model") or configurable.answer_model
+    if _execution_profile(state, configurable) == "balanced":
+        reasoning_model = configurable.planner_model
+    else:
+        reasoning_model = state.get("reasoning_model") or configurable.answer_model
 
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0.3,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+    structured_llm = get_structured_model(reasoning_model, 0.3, PlannerPlan)
     system_preamble = get_system_preamble()
     user_prompt = (
         f"You are a planner. Based on the user's request and the gathered summaries, "
         f"produce a JSON plan with fields: objective, kind (code|analysis|answer), "
         f"steps (each with description), and acceptance_criteria. \n\n"
         f"User request: {get_research_topic(state['messages'])}\n\n"
-        f"Summaries: {'\n---\n'.join(state.get('web_research_result', []) or [])}"
+        "Summaries: "
+        + build_research_context(state, configurable.planner_context_tokens, "\n---\n")
     )
-    plan = llm.with_structured_output(PlannerPlan).invoke([
+    plan = structured_llm.invoke([
         SystemMessage(content=system_preamble),
         HumanMessage(content=user_prompt),
     ])
@@ -305,6 +785,20 @@ def planner(state: OverallState, config: RunnableConfig) -> OverallState:
     }
 
 
+def after_planner(state: OverallState, config: RunnableConfig) -> str:
+    """LangGraph routing function that skips actor and self-check where they add nothing.
+
+    In the balanced profile a plain "answer" task goes straight to `finalize_answer`;
+    the actor's draft would only be folded into the final prompt. Code and analysis
+    tasks, and every task in the thorough profile, run the full pipeline.
+    """
+    configurable = Configuration.from_runnable_config(config)
+    kind = (state.get("task_kind") or "answer").lower()
+    if _execution_profile(state, configurable) == "balanced" and kind == "answer":
+        return "finalize_answer"
+    return "actor"
+
+
 # Guild5: Actor node
 
 def actor(state: OverallState, config: RunnableConfig) -> OverallState:
@@ -312,12 +806,7 @@ def actor(state: OverallState, config: RunnableConfig) -> OverallState:
     reasoning_model = state.get("reasoning_model") or configurable.answer_model
     kind = (state.get("task_kind") or "answer").lower()
 
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0.2,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+    llm = get_chat_model(reasoning_model, 0.2)
 
     system_preamble = get_system_preamble()
     base_instruction = (
@@ -370,12 +859,7 @@ def actor(state: OverallState, config: RunnableConfig) -> OverallState:
 def self_check(state: OverallState, config: RunnableConfig) -> OverallState:
     configurable = Configuration.from_runnable_config(config)
     reasoning_model = state.get("reasoning_model") or configurable.answer_model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0.2,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+    llm = get_chat_model(reasoning_model, 0.2)
 
     content = (state.get("artifacts") or [{}])[0].get("content", "")
     feedback_prompt = (
@@ -389,20 +873,39 @@ def self_check(state: OverallState, config: RunnableConfig) -> OverallState:
     }
 
 
-def finalize_answer(state: OverallState, config: RunnableConfig):
+def _chunk_text(chunk: BaseMessageChunk) -> str:
+    """Text of a streamed message chunk whose content is a string or a list of parts.
+
+    Read from `content`, since `.text` is a method before langchain-core 1.0.
+    """
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, str) or (isinstance(part, dict) and part.get("type", "text") == "text")
+    )
+
+
+def finalize_answer(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that finalizes the research summary and composes the final answer.
 
     Enhancements:
     - Incorporate Planner plan, Actor artifacts (e.g., code), and Self-check feedback into the final prompt.
     - Ensure sources are always appended as a References section with real URLs.
     - Replace any short URLs in the model output with original URLs.
+
+    While the answer streams, each model chunk is sent once as a custom stream event
+    (`stream_mode="custom"`):
+    `{"finalize_answer": {"status": "streaming", "index": i, "delta": text}}`, and
+    `{"finalize_answer": {"status": "restart"}}` if streaming fails and the answer is
+    regenerated. The complete message is built once, in the returned update.
     """
     configurable = Configuration.from_runnable_config(config)
     reasoning_model = state.get("reasoning_model") or configurable.answer_model
 
     # Prepare combined summaries: web research + optional plan/artifacts/self-check
-    research_summaries = "\n---\n\n".join(state.get("web_research_result", []) or [])
-
     plan = state.get("plan") or {}
     try:
         plan_text = json.dumps(plan, ensure_ascii=False, indent=2) if plan else ""
@@ -421,6 +924,11 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     if self_check_feedback:
         extra_ctx_parts.append(f"Self-check feedback:\n{self_check_feedback}")
 
+    # The plan/artifacts/feedback are kept whole; research summaries get what is left
+    extra_tokens = sum(estimate_tokens(p) for p in extra_ctx_parts)
+    research_summaries = build_research_context(
+        state, max(configurable.answer_context_tokens - extra_tokens, 0), "\n---\n\n"
+    )
     combined_summaries = "\n---\n\n".join(
         [p for p in [research_summaries] + extra_ctx_parts if p]
     )
@@ -434,165 +942,127 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     )
 
     # Init Reasoning Model, default to Gemini 2.5 Pro/Flash depending on configuration
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-        streaming=True,  # Enable streaming for final response
-    )
+    llm = get_chat_model(reasoning_model, 0, streaming=True)  # Enable streaming for final response
     
-    # Use streaming for final response
-    result_content = ""
+    # Use streaming for final response; only deltas go out while streaming
+    writer = get_stream_writer()
+    parts: List[str] = []
     try:
         for chunk in llm.stream(formatted_prompt):
-            if hasattr(chunk, 'content') and chunk.content:
-                result_content += chunk.content
-                # Yield intermediate streaming results
-                yield {
-                    "finalize_answer": {"status": "streaming", "content": chunk.content},
-                    "messages": [AIMessage(content=result_content)],
-                }
+            delta = _chunk_text(chunk)
+            if delta:
+                writer({"finalize_answer": {"status": "streaming", "index": len(parts), "delta": delta}})
+                parts.append(delta)
+        result_content = "".join(parts)
     except Exception as e:
-        print(f"Streaming error in finalize_answer: {e}")
+        logger.warning("Streaming error in finalize_answer: %s", e)
+        writer({"finalize_answer": {"status": "restart"}})
         # Fallback to non-streaming if streaming fails
         result = llm.invoke(formatted_prompt)
         result_content = result.content
 
-    # Replace the short urls with the original urls and dedupe sources
-    unique_sources = []
-    seen_values = set()
-    for source in state.get("sources_gathered", []) or []:
-        short_url = source.get("short_url")
-        original = source.get("value") or source.get("url") or source.get("link")
-        if short_url and original and short_url in result_content:
-            result_content = result_content.replace(short_url, original)
-        if original and original not in seen_values:
-            seen_values.add(original)
-            unique_sources.append(source)
+    # Replace the short urls with the original urls (one regex pass) and dedupe sources
+    registry = source_registry_from_state(state)
+    result_content = rewrite_short_urls(result_content, registry)
+    # Normalizes sources from checkpoints that predate the compact records
+    sources = merge_sources([], state.get("sources_gathered"))
 
     # Always append a references section with real URLs so the user can verify
-    if unique_sources:
-        refs_lines = []
-        for s in unique_sources:
-            label = s.get("label") or s.get("title") or (s.get("value") or s.get("url") or s.get("link") or "Source")
-            url = s.get("value") or s.get("url") or s.get("link")
-            if url:
-                refs_lines.append(f"- [{label}]({url})")
-        if refs_lines:
-            result_content = result_content.strip() + "\n\nNguồn tham khảo:\n" + "\n".join(refs_lines)
-
-    # Final yield with complete content
-    yield {
+    if sources:
+        refs_lines = [f"- [{s['label']}]({s['url']})" for s in sources]
+        result_content = result_content.strip() + "\n\nNguồn tham khảo:\n" + "\n".join(refs_lines)
+
+    return {
         "finalize_answer": {"status": "done"},
         "messages": [AIMessage(content=result_content)],
-        "sources_gathered": unique_sources,
+        "sources_gathered": sources,
     }
 
 
 # Routing logic: decide mode based on the user's prompt
 
-def route_mode(state: OverallState, config: RunnableConfig):
+def route_mode(state: OverallState, config: RunnableConfig) -> str:
     """Auto router giữa web search và trả lời trực tiếp bằng LLM.
 
     Nếu câu hỏi có tính thời sự/thời gian thực hoặc về thông tin mới, bắt buộc dùng web search.
     Ngược lại, nếu là trò chuyện thông thường, dùng LLM trực tiếp.
+    Các bộ từ khóa được biên dịch một lần trong `agent.routing`; mỗi tin nhắn chỉ được quét một lần.
+    Khi bật `speculative_routing`, câu hỏi lưng chừng (chỉ khớp từ khóa yếu) đi qua `speculate`.
     """
-    q = (get_research_topic(state["messages"]) or "").lower().strip()
-
-    # Các từ khóa nhận diện câu hỏi thời gian thực hoặc phụ thuộc dữ liệu cập nhật
-    time_keywords = [
-        "hôm nay", "today", "hiện tại", "bây giờ", "mới nhất", "latest",
-        "tuần này", "tháng này", "năm nay", "this week", "this month", "this year",
-        "lịch", "calendar", "ngày", "ngày gì", "holiday", "lễ",
-        "event", "festival", "sự kiện", "đang diễn ra", "happening",
-        "thời tiết", "weather", "giá", "price", "cổ phiếu", "stock", "tỷ giá", "exchange rate",
-        "ở việt nam", "tại việt nam", "vn", "in vietnam"
-    ]
-    if any(k in q for k in time_keywords):
-        return "generate_query"
-
-    # Từ khóa về công nghệ mới, sản phẩm mới, thông tin cập nhật
-    new_tech_keywords = [
-        "mới", "new", "ra mắt", "launch", "phát hành", "release", "công bố", "announce",
-        "cập nhật", "update", "phiên bản", "version", "beta", "alpha",
-        "agentkit", "gpt-5", "gpt 5", "claude", "gemini", "chatgpt", "openai",
-        "ai mới", "new ai", "model mới", "new model", "công nghệ mới", "new technology",
-        "startup", "unicorn", "ipo", "funding", "đầu tư", "investment",
-        "breakthrough", "đột phá", "innovation", "sáng tạo"
-    ]
-    if any(k in q for k in new_tech_keywords):
-        return "generate_query"
-
-    # Từ khóa tri thức/hỏi đáp phổ biến -> ưu tiên tìm kiếm
-    knowledge_keywords = [
-        "tin", "news", "ai là", "what", "when", "where", "who", "how",
-        "định nghĩa", "define", "nguồn", "source", "website", "so sánh", "compare",
-        "thông tin", "information", "chi tiết", "details", "giải thích", "explain",
-        "tìm hiểu", "learn", "research", "nghiên cứu"
-    ]
-    if any(k in q for k in knowledge_keywords):
-        return "generate_query"
-
-    # Nếu có chỉ dấu năm/thời điểm cụ thể -> ưu tiên search
-    import re
-    if re.search(r"\b20\d{2}\b", q) or re.search(r"\b\d{1,2}/\d{1,2}/\d{2,4}\b", q):
-        return "generate_query"
-
-    # Phát hiện tên công ty, sản phẩm công nghệ nổi tiếng
-    tech_entities = [
-        "openai", "google", "microsoft", "apple", "meta", "facebook", "amazon", "tesla",
-        "nvidia", "anthropic", "deepmind", "hugging face", "stability ai",
-        "chatgpt", "claude", "gemini", "bard", "copilot", "midjourney", "dall-e",
-        "github", "stackoverflow", "reddit", "twitter", "x.com", "linkedin"
-    ]
-    if any(entity in q for entity in tech_entities):
-        return "generate_query"
-
-    # Phát hiện các câu hỏi có thể chứa thông tin lỗi thời
-    # Nếu câu hỏi đề cập đến số liệu, thống kê, hoặc thông tin có thể thay đổi
-    outdated_indicators = [
-        "bao nhiêu", "how many", "số lượng", "count", "thống kê", "statistics",
-        "tỷ lệ", "rate", "percentage", "phần trăm", "top", "ranking", "xếp hạng",
-        "danh sách", "list", "best", "tốt nhất", "worst", "tệ nhất",
-        "popular", "phổ biến", "trending", "xu hướng", "market share", "thị phần"
-    ]
-    if any(indicator in q for indicator in outdated_indicators):
-        return "generate_query"
-
-    # Phát hiện câu hỏi về sự kiện, tin tức, hoặc thông tin có thể thay đổi
-    event_indicators = [
-        "có gì", "what's", "diễn ra", "happening", "xảy ra", "occur",
-        "tình hình", "situation", "status", "trạng thái", "hiện trạng",
-        "vấn đề", "issue", "problem", "crisis", "khủng hoảng"
-    ]
-    if any(indicator in q for indicator in event_indicators):
-        return "generate_query"
+    configurable = Configuration.from_runnable_config(config)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    decision = classify_conversation(
+        state["messages"], explain=debug or configurable.speculative_routing
+    )
+    route = decision.route
+    if configurable.speculative_routing and is_borderline(decision):
+        route = "speculate"
+    if debug:
+        logger.debug(
+            "route_mode -> %s (rule=%s, rules=%s, keywords=%s)",
+            route, decision.rule, sorted(decision.rules), sorted(decision.keywords),
+        )
+    return route
 
-    # Nếu câu hỏi ngắn và có thể là factual question
-    if len(q.split()) <= 10 and any(word in q for word in ["là", "is", "are", "was", "were", "có", "have", "has"]):
-        return "generate_query"
 
-    return "llm"
+# Direct LLM node (Gemini 2.5 Flash)
 
+# Tags the speculative draft of `aspeculate`, which may yet be discarded
+TAG_SPECULATIVE_DRAFT = "speculative_draft"
 
-# Direct LLM node (Gemini 2.5 Flash)
 
-def node_llm(state: OverallState, config: RunnableConfig) -> OverallState:
-    """Answer directly using Gemini 2.5 Flash without web search."""
-    # Always use Gemini 2.5 Flash for casual chat
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+def _llm_cache(state: Mapping[str, Any], configurable: Configuration) -> Optional[SemanticCache]:
+    # Only opening messages use the cache: later turns are answered from the whole
+    # transcript, and conversations that open alike would match on their shared history
+    if not configurable.llm_cache_enabled or len(state["messages"]) != 1:
+        return None
+    return get_semantic_cache(
+        configurable.llm_cache_threshold,
+        configurable.llm_cache_capacity,
+        configurable.llm_cache_eviction,
     )
+
+
+def node_llm(state: OverallState, config: RunnableConfig) -> OverallState:
+    """Answer directly using Gemini 2.5 Flash without web search.
+
+    Near-duplicate opening prompts are answered from the semantic cache when it
+    is enabled. A speculative draft is only cached once `aspeculate` keeps it.
+    """
+    configurable = Configuration.from_runnable_config(config)
     user_prompt = get_research_topic(state["messages"]) or ""
+
+    cache = _llm_cache(state, configurable)
+    if cache is not None:
+        cached = cache.lookup(user_prompt)
+        note_cache("semantic", cached is not None)
+        if cached is not None:
+            return {
+                "llm": {"model": "gemini-2.5-flash", "cache": "hit"},
+                "messages": [AIMessage(content=cached)],
+                "sources_gathered": [],
+            }
+        if TAG_SPECULATIVE_DRAFT in config.get("tags", []):
+            cache = None
+
+    # Always use Gemini 2.5 Flash for casual chat
+    llm = get_chat_model("gemini-2.5-flash", 0)
     system_preamble = get_system_preamble()
-    result = llm.invoke([
-        SystemMessage(content=system_preamble),
-        HumanMessage(content=user_prompt),
-    ])
+
+    def answer() -> BaseMessage:
+        result = llm.invoke([
+            SystemMessage(content=system_preamble),
+            HumanMessage(content=user_prompt),
+        ])
+        if cache is not None and isinstance(result.content, str) and result.content:
+            cache.add(user_prompt, result.content)
+        return result
+
+    if configurable.singleflight_enabled:
+        # Callers that join an in-flight answer get it whole, without token streaming
+        result = _llm_flights.do(("gemini-2.5-flash", normalize_query(user_prompt)), answer)
+    else:
+        result = answer()
 
     # Return an AI message; no sources for direct LLM mode
     return {
@@ -602,39 +1072,209 @@ def node_llm(state: OverallState, config: RunnableConfig) -> OverallState:
     }
 
 
+# Speculative routing for borderline prompts
+
+_ROUTE_CLASSIFIER_CONFIG: "types.GenerateContentConfigDict" = {"temperature": 0, "max_output_tokens": 4}
+
+
+def _route_classifier_prompt(state: OverallState) -> str:
+    return route_classifier_instructions.format(
+        research_topic=get_research_topic(state["messages"])
+    )
+
+
+def speculate(state: OverallState, config: RunnableConfig) -> OverallState:
+    """Sync variant of `aspeculate`: ask the classifier first, then run only its branch.
+
+    Without an event loop the branches cannot overlap, so nothing is speculated
+    (or wasted) here; the classifier just replaces the keyword route.
+    """
+    configurable = Configuration.from_runnable_config(config)
+    model = configurable.speculative_classifier_model
+    prompt = _route_classifier_prompt(state)
+    try:
+        response = scheduler.call(
+            model,
+            lambda: get_genai_client().models.generate_content(
+                model=model,
+                contents=prompt,
+                config=_ROUTE_CLASSIFIER_CONFIG,
+            ),
+            tokens=reserve_tokens(prompt, output=4),
+            priority=Priority.INTERACTIVE,
+            usage=genai_usage,
+        )
+        _note_genai_usage(model, response)
+        verdict = parse_verdict(response.text)
+    except Exception as e:
+        logger.warning("Route classifier failed, keeping web search: %s", e)
+        verdict = None
+    note_speculation(verdict or "undecided")
+    if verdict == "chat":
+        return {**node_llm(state, config), "speculative_route": "llm"}
+    return {**generate_query(state, config), "speculative_route": "generate_query"}
+
+
+async def _aclassify_route(state: OverallState, configurable: Configuration) -> Optional[str]:
+    model = configurable.speculative_classifier_model
+    prompt = _route_classifier_prompt(state)
+    try:
+        # The timeout covers the wait for rate-limit capacity too
+        response = await asyncio.wait_for(
+            scheduler.acall(
+                model,
+                lambda: get_genai_client().aio.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=_ROUTE_CLASSIFIER_CONFIG,
+                ),
+                tokens=reserve_tokens(prompt, output=4),
+                priority=Priority.INTERACTIVE,
+                usage=genai_usage,
+            ),
+            timeout=configurable.speculative_classifier_timeout,
+        )
+    except Exception as e:
+        logger.warning("Route classifier failed or timed out, keeping web search: %r", e)
+        return None
+    _note_genai_usage(model, response)
+    return parse_verdict(response.text)
+
+
+def _consume_error(task: "asyncio.Task[Any]") -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+def _discard(task: "asyncio.Task[Any]") -> None:
+    task.cancel()
+    # Retrieve the error of a branch that failed before it was discarded
+    task.add_done_callback(_consume_error)
+
+
+def _cache_kept_draft(state: Mapping[str, Any], configurable: Configuration, update: Mapping[str, Any]) -> None:
+    cache = _llm_cache(state, configurable)
+    if cache is None or update["llm"].get("cache") == "hit":
+        return
+    content = update["messages"][0].content
+    if isinstance(content, str) and content:
+        cache.add(get_research_topic(state["messages"]) or "", content)
+
+
+async def aspeculate(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that races the direct llm draft against query generation.
+
+    Both branches start at once, next to a fast chat/search classifier. A "chat"
+    verdict cancels query generation (and so the whole research fan-out) and
+    returns the draft; anything else discards the draft. The branches run with
+    the nostream tag so a discarded draft never reaches the client; the kept
+    branch's update is returned as this node's update. Over the speculation
+    budget the prompt takes its keyword route (web search) without a draft.
+
+    Both branches are sync nodes, so they run in worker threads, and cancelling
+    their tasks does not stop them: a discarded branch's model calls still run
+    to completion and count against the rate limits, only their result is
+    dropped. The draft is therefore written to the semantic cache here, once
+    kept, rather than by `node_llm`.
+    """
+    configurable = Configuration.from_runnable_config(config)
+    budget = get_speculation_budget(
+        configurable.speculative_max_in_flight, configurable.speculative_max_per_minute
+    )
+    if not budget.try_acquire():
+        note_speculation("skipped")
+        update = await _ainvoke_node(generate_query, dict(state), config)
+        return {**update, "speculative_route": "generate_query"}
+
+    draft = research = None
+    try:
+        quiet = merge_configs(config, {"tags": [TAG_NOSTREAM]})
+        draft_config = merge_configs(quiet, {"tags": [TAG_SPECULATIVE_DRAFT]})
+        draft = asyncio.create_task(_ainvoke_node(node_llm, dict(state), draft_config))
+        research = asyncio.create_task(_ainvoke_node(generate_query, dict(state), quiet))
+        verdict = await _aclassify_route(state, configurable)
+        note_speculation(verdict or "undecided")
+        if verdict == "chat":
+            _discard(research)
+            update = await draft
+            _cache_kept_draft(state, configurable, update)
+            return {**update, "speculative_route": "llm"}
+        _discard(draft)
+        return {**(await research), "speculative_route": "generate_query"}
+    finally:
+        budget.release()
+        for task in (draft, research):
+            if task is not None and not task.done():
+                _discard(task)
+
+
+def after_speculation(state: OverallState, config: RunnableConfig) -> Union[str, List[Send]]:
+    """LangGraph routing function: end with the kept draft or fan out the kept queries."""
+    if state.get("speculative_route") == "llm":
+        return END
+    return continue_to_web_research(state, config)
+
+
 # Create our Agent Graph
 builder = StateGraph(OverallState, config_schema=Configuration)
 
 # Define the nodes we will cycle between
-builder.add_node("generate_query", generate_query)
-builder.add_node("web_research", web_research)
-builder.add_node("reflection", reflection)
+builder.add_node("generate_query", instrument_node("generate_query", generate_query))
+# Both variants are registered: graph.invoke uses the sync one, astream/ainvoke
+# (and the LangGraph server) use the async one.
+builder.add_node(
+    "web_research",
+    RunnableLambda(
+        instrument_node("web_research", web_research),
+        afunc=instrument_node("web_research", aweb_research),
+    ),
+)
+builder.add_node("reflection", instrument_node("reflection", reflection))
+builder.add_node(
+    "research",
+    RunnableLambda(
+        instrument_node("research", pipelined_research),
+        afunc=instrument_node("research", apipelined_research),
+    ),
+)
 # Guild5 nodes
-builder.add_node("planner", planner)
-builder.add_node("actor", actor)
-builder.add_node("self_check", self_check)
-builder.add_node("finalize_answer", finalize_answer)
+builder.add_node("planner", instrument_node("planner", planner))
+builder.add_node("actor", instrument_node("actor", actor))
+builder.add_node("self_check", instrument_node("self_check", self_check))
+builder.add_node("finalize_answer", instrument_node("finalize_answer", finalize_answer))
+builder.add_node(
+    "speculate",
+    RunnableLambda(
+        instrument_node("speculate", speculate),
+        afunc=instrument_node("speculate", aspeculate),
+    ),
+)
 # Add direct LLM node
-builder.add_node("llm", node_llm)
+builder.add_node("llm", instrument_node("llm", node_llm))
 
 # Start at route_mode to decide the path
 builder.add_node("route_mode", lambda state: state)
 builder.add_edge(START, "route_mode")
 # Route to either search or llm
-builder.add_conditional_edges("route_mode", route_mode, ["generate_query", "llm"])
+builder.add_conditional_edges("route_mode", route_mode, ["generate_query", "llm", "speculate"])
+# Borderline prompts (speculative_routing): the kept branch ends or fans out to web research
+builder.add_conditional_edges("speculate", after_speculation, ["web_research", "research", END])
 
 # Add conditional edge to continue with search queries in a parallel branch
 builder.add_conditional_edges(
-    "generate_query", continue_to_web_research, ["web_research"]
+    "generate_query", continue_to_web_research, ["web_research", "research"]
 )
+# Pipelined research runs its own reflection loop, then goes on like evaluate_research
+builder.add_conditional_edges("research", after_pipelined_research, ["planner", "finalize_answer"])
 # Reflect on the web research
 builder.add_edge("web_research", "reflection")
 # Evaluate the research
 builder.add_conditional_edges(
-    "reflection", evaluate_research, ["web_research", "planner"]
+    "reflection", evaluate_research, ["web_research", "planner", "finalize_answer"]
 )
-# Guild5 flow: planner -> actor -> self_check -> finalize
-builder.add_edge("planner", "actor")
+# Guild5 flow: planner -> actor -> self_check -> finalize; execution profiles
+# may skip straight to finalize (see evaluate_research and after_planner)
+builder.add_conditional_edges("planner", after_planner, ["actor", "finalize_answer"])
 builder.add_edge("actor", "self_check")
 builder.add_edge("self_check", "finalize_answer")
 # Finalize the answer
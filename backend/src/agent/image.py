@@ -1,21 +1,54 @@
+import asyncio
+import json
+import logging
 import os
-from typing import Optional
-
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import (
+    APIRouter,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from google.genai import Client, types
 
-# Gemini client
-if os.getenv("GEMINI_API_KEY") is None:
-    raise ValueError("GEMINI_API_KEY is not set")
+from agent.clients import get_genai_client, get_semaphore
+from agent.executors import get_executor
+from agent.image_derivatives import (
+    DEFAULT_FORMAT,
+    VARIANT_FORMATS,
+    VARIANT_SIZES,
+    derivatives_available,
+    get_variant,
+    schedule_derivatives,
+)
+from agent.image_store import ANONYMOUS_SESSION, StoredImage, get_image_store
+from agent.outbound import Priority, genai_usage, reserve_tokens, scheduler
+
+if TYPE_CHECKING:
+    from google.genai import types
 
-client = Client(api_key=os.getenv("GEMINI_API_KEY"))
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/image", tags=["image"])
 
-# In-memory cache for last generated/edited image
-_last_image_bytes: Optional[bytes] = None
-_last_mime_type: str = "image/png"
+IMAGE_MODEL = "gemini-2.5-flash-image"
+# Tokens Gemini bills for one generated image, reserved against the model's TPM
+IMAGE_OUTPUT_TOKENS = 1290
+
+MAX_SESSION_ID_LENGTH = 128
+# Batch generation: images per request, images generated at once (process-wide)
+# and the time one image may take
+MAX_BATCH_ITEMS = 8
+IMAGE_BATCH_CONCURRENCY = int(os.getenv("IMAGE_BATCH_CONCURRENCY", 4))
+IMAGE_ITEM_TIMEOUT = float(os.getenv("IMAGE_ITEM_TIMEOUT", 90))
+# Image URLs are content-addressed, so their bytes never change
+IMAGE_CACHE_CONTROL = "private, max-age=31536000, immutable"
 
 
 class GenerateRequest(BaseModel):
@@ -23,7 +56,7 @@ class GenerateRequest(BaseModel):
     aspect_ratio: Optional[str] = None  # e.g., "1:1", "16:9", "4:3"
 
 
-def _extract_image_and_text(response: types.GenerateContentResponse):
+def _extract_image_and_text(response: "types.GenerateContentResponse"):
     """Extracts image bytes and text from a Gemini generate_content response."""
     image_bytes = None
     mime_type = "image/png"
@@ -47,30 +80,71 @@ def _extract_image_and_text(response: types.GenerateContentResponse):
     return image_bytes, mime_type, ("\n".join(texts).strip() if texts else None)
 
 
-@router.post("/generate")
-async def generate_image(payload: GenerateRequest):
-    """Generate an image from a descriptive prompt using Gemini 2.5 Flash Image."""
-    global _last_image_bytes, _last_mime_type
+def _session_id(x_session_id: Optional[str]) -> str:
+    """Session of the caller, from the X-Session-Id header; clients without one share a session."""
+    session_id = (x_session_id or "").strip()
+    if len(session_id) > MAX_SESSION_ID_LENGTH:
+        raise HTTPException(status_code=400, detail="X-Session-Id is too long")
+    return session_id or ANONYMOUS_SESSION
 
-    prompt = payload.prompt.strip()
-    if not prompt:
-        raise HTTPException(status_code=400, detail="Prompt is required")
 
-    config: dict = {
+def _required_session_id(x_session_id: Optional[str]) -> str:
+    """Session of the caller for "last image" lookups, which headerless clients would all share."""
+    session_id = _session_id(x_session_id)
+    if session_id == ANONYMOUS_SESSION:
+        raise HTTPException(status_code=400, detail="X-Session-Id is required to use the last image")
+    return session_id
+
+
+def _image_payload(image: StoredImage, data_url: bool = False) -> Dict[str, str]:
+    """Metadata and URL of a stored image; the base64 data URL only when asked for."""
+    url = f"{router.prefix}/{image.id}"
+    payload = {
+        "image_id": image.id,
+        "mime_type": image.mime_type,
+        "url": url,
+        "thumbnail_url": f"{url}?size=thumb",
+    }
+    if data_url:
+        payload["data_url"] = get_image_store().data_url(image)
+    return payload
+
+
+async def _store(session_id: str, image_bytes: bytes, mime_type: Optional[str]) -> StoredImage:
+    mime_type = mime_type or "image/png"
+    image_id = await get_executor("image").run(get_image_store().put, session_id, image_bytes, mime_type)
+    image = StoredImage(image_id, image_bytes, mime_type)
+    # Thumbnails and resized variants are rendered off the event loop
+    schedule_derivatives(image)
+    return image
+
+
+async def _generate_one(prompt: str, aspect_ratio: Optional[str]) -> Tuple[bytes, str, Optional[str]]:
+    """Generate one image; returns (image bytes, mime type, caption).
+
+    Uses the async genai surface, so a request waiting on Gemini holds no thread.
+
+    Raises:
+        HTTPException: 500 if Gemini fails or returns no image.
+    """
+    config: types.GenerateContentConfigDict = {
         "response_modalities": ["IMAGE", "TEXT"],
         "temperature": 0.8,
     }
-    if payload.aspect_ratio:
-        config["image_config"] = {"aspect_ratio": payload.aspect_ratio}
+    if aspect_ratio:
+        config["image_config"] = {"aspect_ratio": aspect_ratio}
 
     try:
-        import asyncio
-        # Use asyncio.to_thread to avoid blocking the event loop
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model="gemini-2.5-flash-image",
-            contents=prompt,
-            config=config,
+        response = await scheduler.acall(
+            IMAGE_MODEL,
+            lambda: get_genai_client().aio.models.generate_content(
+                model=IMAGE_MODEL,
+                contents=prompt,
+                config=config,
+            ),
+            tokens=reserve_tokens(prompt, output=IMAGE_OUTPUT_TOKENS),
+            priority=Priority.DEFAULT,
+            usage=genai_usage,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini image generation failed: {e}")
@@ -78,15 +152,113 @@ async def generate_image(payload: GenerateRequest):
     image_bytes, mime_type, caption = _extract_image_and_text(response)
     if image_bytes is None:
         raise HTTPException(status_code=500, detail="No image returned from Gemini")
+    return image_bytes, mime_type, caption
+
+
+@router.post("/generate")
+async def generate_image(
+    payload: GenerateRequest,
+    x_session_id: Optional[str] = Header(None),
+    data_url: bool = Query(False, description="Also return the image as a base64 data URL"),
+):
+    """Generate an image from a descriptive prompt using Gemini 2.5 Flash Image."""
+    session_id = _session_id(x_session_id)
+
+    prompt = payload.prompt.strip()
+    if not prompt:
+        raise HTTPException(status_code=400, detail="Prompt is required")
+
+    image_bytes, mime_type, caption = await _generate_one(prompt, payload.aspect_ratio)
 
-    # Cache last image
-    _last_image_bytes = image_bytes
-    _last_mime_type = mime_type or "image/png"
+    # Becomes the session's last image
+    image = await _store(session_id, image_bytes, mime_type)
+    return {**_image_payload(image, data_url), "caption": caption}
 
-    import base64
 
-    data_url = f"data:{_last_mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
-    return {"mime_type": _last_mime_type, "data_url": data_url, "caption": caption}
+class BatchGenerateRequest(BaseModel):
+    """Either `variants` images of `prompt` or one image per entry of `prompts`."""
+    prompt: Optional[str] = None
+    variants: int = 1  # images of `prompt`
+    prompts: Optional[list[str]] = None  # or one image per prompt
+    aspect_ratio: Optional[str] = None
+
+
+def _batch_prompts(payload: BatchGenerateRequest) -> list[str]:
+    if payload.prompts:
+        prompts = [p.strip() for p in payload.prompts]
+    elif payload.prompt and payload.prompt.strip():
+        if not 1 <= payload.variants <= MAX_BATCH_ITEMS:
+            raise HTTPException(status_code=400, detail=f"variants must be between 1 and {MAX_BATCH_ITEMS}")
+        prompts = [payload.prompt.strip()] * payload.variants
+    else:
+        raise HTTPException(status_code=400, detail="Prompt or prompts is required")
+    if not all(prompts):
+        raise HTTPException(status_code=400, detail="Prompts must not be empty")
+    if len(prompts) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} images per batch")
+    return prompts
+
+
+@router.post("/generate/batch")
+async def generate_image_batch(
+    payload: BatchGenerateRequest,
+    x_session_id: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+) -> StreamingResponse:
+    """Generate several images (N variants of a prompt, or one per prompt) concurrently.
+
+    Results are streamed as each image finishes, as NDJSON or, when the client
+    accepts text/event-stream, as server-sent events. Every item is one line /
+    event: `{"index", "prompt", "status": "ok", ...image}` or `{"index",
+    "prompt", "status": "error", "detail"}`; a failed or timed-out item does
+    not stop the others. The stream ends with `{"done": true, "ok", "failed"}`.
+    """
+    session_id = _session_id(x_session_id)
+    prompts = _batch_prompts(payload)
+    sse = "text/event-stream" in (accept or "")
+    semaphore = get_semaphore("image_generate", IMAGE_BATCH_CONCURRENCY)
+
+    async def one(index: int, prompt: str) -> Dict[str, Any]:
+        item: Dict[str, Any] = {"index": index, "prompt": prompt}
+        try:
+            async with semaphore:
+                image_bytes, mime_type, caption = await asyncio.wait_for(
+                    _generate_one(prompt, payload.aspect_ratio), timeout=IMAGE_ITEM_TIMEOUT
+                )
+            image = await _store(session_id, image_bytes, mime_type)
+        except TimeoutError:
+            return {**item, "status": "error", "detail": f"Timed out after {IMAGE_ITEM_TIMEOUT:g}s"}
+        except HTTPException as e:
+            return {**item, "status": "error", "detail": e.detail}
+        except Exception as e:
+            # One broken item (e.g. the store failing to write) must not end the stream
+            logger.exception("Batch image %d failed: %s", index, e)
+            return {**item, "status": "error", "detail": f"Image generation failed: {e}"}
+        return {**item, "status": "ok", **_image_payload(image), "caption": caption}
+
+    def encode(event: Dict[str, Any]) -> str:
+        line = json.dumps(event, ensure_ascii=False)
+        return f"data: {line}\n\n" if sse else line + "\n"
+
+    async def stream() -> AsyncIterator[str]:
+        tasks = [asyncio.ensure_future(one(i, p)) for i, p in enumerate(prompts)]
+        ok = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                ok += item["status"] == "ok"
+                yield encode(item)
+            yield encode({"done": True, "ok": ok, "failed": len(prompts) - ok})
+        finally:
+            # The client went away: stop the images nobody will receive
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 @router.post("/edit")
@@ -94,13 +266,18 @@ async def edit_image(
     prompt: str = Form(...),
     file: Optional[UploadFile] = File(None),
     aspect_ratio: Optional[str] = Form(None),
+    image_id: Optional[str] = Form(None),
+    x_session_id: Optional[str] = Header(None),
+    data_url: bool = Query(False, description="Also return the image as a base64 data URL"),
 ):
     """Edit an existing image using Gemini 2.5 Flash Image.
 
     - If a file is provided, it will be used as the base image.
-    - If no file is provided, the last generated image will be used.
+    - Otherwise, if `image_id` is given, that image of the session is used.
+    - Otherwise, the session's last generated image will be used; this needs an
+      X-Session-Id header.
     """
-    global _last_image_bytes, _last_mime_type
+    session_id = _session_id(x_session_id)
 
     prompt = prompt.strip()
     if not prompt:
@@ -115,16 +292,23 @@ async def edit_image(
             mime_type = file.content_type or "image/png"
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to read uploaded file: {e}")
+    elif image_id:
+        stored = await get_executor("image").run(get_image_store().get, session_id, image_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        img_bytes, mime_type = stored.data, stored.mime_type
     else:
         # Use last image if available
-        if _last_image_bytes is None:
+        stored = await get_executor("image").run(get_image_store().last, _required_session_id(x_session_id))
+        if stored is None:
             raise HTTPException(status_code=400, detail="No image file provided and no previous image to edit")
-        img_bytes = _last_image_bytes
-        mime_type = _last_mime_type
+        img_bytes, mime_type = stored.data, stored.mime_type
+
+    from google.genai import types
 
     image_part = types.Part.from_bytes(data=img_bytes, mime_type=mime_type)
 
-    config: dict = {
+    config: types.GenerateContentConfigDict = {
         "response_modalities": ["IMAGE", "TEXT"],
         "temperature": 0.7,
     }
@@ -132,13 +316,17 @@ async def edit_image(
         config["image_config"] = {"aspect_ratio": aspect_ratio}
 
     try:
-        import asyncio
-        # Use asyncio.to_thread to avoid blocking the event loop
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model="gemini-2.5-flash-image",
-            contents=[prompt, image_part],
-            config=config,
+        response = await scheduler.acall(
+            IMAGE_MODEL,
+            lambda: get_genai_client().aio.models.generate_content(
+                model=IMAGE_MODEL,
+                contents=[prompt, image_part],
+                config=config,
+            ),
+            # The input image is billed like one generated image
+            tokens=reserve_tokens(prompt, output=2 * IMAGE_OUTPUT_TOKENS),
+            priority=Priority.DEFAULT,
+            usage=genai_usage,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini image edit failed: {e}")
@@ -147,24 +335,57 @@ async def edit_image(
     if image_bytes is None:
         raise HTTPException(status_code=500, detail="No edited image returned from Gemini")
 
-    # Cache last image
-    _last_image_bytes = image_bytes
-    _last_mime_type = mime_type or "image/png"
-
-    import base64
-
-    data_url = f"data:{_last_mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
-    return {"mime_type": _last_mime_type, "data_url": data_url, "caption": caption}
+    # Becomes the session's last image
+    image = await _store(session_id, image_bytes, mime_type)
+    return {**_image_payload(image, data_url), "caption": caption}
 
 
 @router.get("/last")
-async def get_last_image():
-    """Return last generated/edited image as data URL."""
-    global _last_image_bytes, _last_mime_type
-    if _last_image_bytes is None:
+async def get_last_image(
+    x_session_id: Optional[str] = Header(None),
+    data_url: bool = Query(False, description="Also return the image as a base64 data URL"),
+):
+    """Return the session's last generated/edited image (URL, optionally a data URL).
+
+    Needs an X-Session-Id header: clients without one do not get a "last image".
+    """
+    image = await get_executor("image").run(get_image_store().last, _required_session_id(x_session_id))
+    if image is None:
         raise HTTPException(status_code=404, detail="No image available")
+    return _image_payload(image, data_url)
+
 
-    import base64
+@router.get("/{image_id}")
+async def get_image(
+    image_id: str,
+    size: Optional[str] = Query(None, description=f"Resized variant: {', '.join(VARIANT_SIZES)}"),
+    fmt: str = Query(DEFAULT_FORMAT, alias="format", description=f"Variant format: {', '.join(VARIANT_FORMATS)}"),
+    if_none_match: Optional[str] = Header(None),
+) -> Response:
+    """Return the raw bytes of a stored image, or of one of its resized variants.
 
-    data_url = f"data:{_last_mime_type};base64,{base64.b64encode(_last_image_bytes).decode('utf-8')}"
-    return {"mime_type": _last_mime_type, "data_url": data_url}
\ No newline at end of file
+    Without Pillow on the server, `size` is ignored and the original is returned.
+    """
+    if size is not None and size not in VARIANT_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(VARIANT_SIZES)}")
+    if fmt not in VARIANT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(VARIANT_FORMATS)}")
+    variant = size if size is not None and derivatives_available() else None
+    etag = f'"{image_id}@{variant}.{fmt}"' if variant else f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if if_none_match and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    image = None
+    if variant:
+        try:
+            image = await get_variant(image_id, variant, fmt)
+        except Exception as e:
+            # Serve the original rather than failing the request
+            logger.warning("Rendering %s.%s of image %s failed: %s", size, fmt, image_id, e)
+            # Not cacheable under the variant URL: the next request should get the variant
+            headers = {"ETag": f'"{image_id}"', "Cache-Control": "no-cache"}
+    if image is None:
+        image = await get_executor("image").run(get_image_store().fetch, image_id)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=image.data, media_type=image.mime_type, headers=headers)
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""Resized WebP/JPEG variants ("derivatives") of stored images.
+
+When an image is generated or edited, every variant in `VARIANT_SIZES` x
+`VARIANT_FORMATS` is rendered in a process pool (decoding and re-encoding
+images is CPU-bound and would stall the event loop) and cached in the image
+store next to the original. `GET /api/image/{id}?size=...` serves them; a
+variant that is not cached yet (another worker made the image, or the cache
+dropped it) is rendered on demand, sharing any render already running.
+
+Needs the optional Pillow package (pip install 'agent[images]'); without it
+`derivatives_available()` is False and callers serve the original.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import io
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Set, Tuple
+
+from agent.executors import get_executor
+from agent.image_store import StoredImage, get_image_store
+from agent.metrics import registry
+from agent.singleflight import SingleFlight
+
+# Longest side in pixels. Images already smaller are re-encoded, not upscaled.
+VARIANT_SIZES: Dict[str, int] = {"thumb": 256, "small": 512, "medium": 1024}
+VARIANT_FORMATS: Dict[str, str] = {"webp": "image/webp", "jpeg": "image/jpeg"}
+DEFAULT_FORMAT = "webp"
+_QUALITY = {"webp": 80, "jpeg": 85}
+
+RENDERS = registry.counter(
+    "locaith_image_derivative_renders_total",
+    "Derivative render jobs, by trigger and outcome.",
+)
+
+_flights = SingleFlight("image_derivatives")
+# Keeps eager render tasks alive until they finish
+_background: Set[asyncio.Task[Dict[str, Tuple[bytes, str]]]] = set()
+
+
+def variant_name(size: str, fmt: str) -> str:
+    """Return the image store variant name of a size and format, e.g. "thumb.webp"."""
+    return f"{size}.{fmt}"
+
+
+@functools.lru_cache(maxsize=1)
+def derivatives_available() -> bool:
+    """Return whether Pillow is installed; without it only originals are served."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def render_variants(data: bytes) -> Dict[str, Tuple[bytes, str]]:
+    """Render every variant of an encoded image: {variant name: (bytes, mime type)}.
+
+    Runs in a pool worker process, so it only takes and returns plain bytes.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        has_alpha = source.mode in ("RGBA", "LA") or "transparency" in source.info
+        base = source.convert("RGBA" if has_alpha else "RGB")
+    variants: Dict[str, Tuple[bytes, str]] = {}
+    for size, longest in VARIANT_SIZES.items():
+        image = base.copy()
+        image.thumbnail((longest, longest), Image.Resampling.LANCZOS)
+        for fmt, mime_type in VARIANT_FORMATS.items():
+            # JPEG has no alpha channel
+            frame = (
+                image.convert("RGB") if fmt == "jpeg" and image.mode != "RGB" else image
+            )
+            out = io.BytesIO()
+            frame.save(out, format=fmt.upper(), quality=_QUALITY[fmt], optimize=True)
+            variants[variant_name(size, fmt)] = (out.getvalue(), mime_type)
+    return variants
+
+
+@functools.lru_cache(maxsize=1)
+def get_derivative_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Process-wide pool for derivative renders (IMAGE_DERIVATIVE_WORKERS processes).
+
+    Workers are spawned rather than forked: the server process runs threads.
+    """
+    workers = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", min(2, os.cpu_count() or 1)))
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+async def _render_and_store(image: StoredImage) -> Dict[str, Tuple[bytes, str]]:
+    loop = asyncio.get_running_loop()
+    try:
+        variants = await loop.run_in_executor(
+            get_derivative_pool(), render_variants, image.data
+        )
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        get_derivative_pool.cache_clear()
+        raise
+    store = get_image_store()
+    await get_executor("image").run(store.put_variants, image.id, variants)
+    return variants
+
+
+async def ensure_derivatives(
+    image: StoredImage, trigger: str = "on_demand"
+) -> Dict[str, Tuple[bytes, str]]:
+    """Render and cache all variants of `image`, joining a render of it already running."""
+    try:
+        variants: Dict[str, Tuple[bytes, str]] = await _flights.ado(
+            image.id, lambda: _render_and_store(image)
+        )
+    except Exception:
+        RENDERS.inc(trigger=trigger, outcome="error")
+        raise
+    RENDERS.inc(trigger=trigger, outcome="ok")
+    return variants
+
+
+def _forget(task: "asyncio.Task[Any]") -> None:
+    _background.discard(task)
+    if not task.cancelled():
+        task.exception()
+
+
+def schedule_derivatives(image: StoredImage) -> None:
+    """Start rendering the variants of a new image in the background."""
+    if not derivatives_available():
+        return
+    task = asyncio.get_running_loop().create_task(
+        ensure_derivatives(image, trigger="eager")
+    )
+    _background.add(task)
+    # Failures are counted in RENDERS; the variant is retried on demand
+    task.add_done_callback(_forget)
+
+
+async def get_variant(
+    image_id: str, size: str, fmt: str = DEFAULT_FORMAT
+) -> Optional[StoredImage]:
+    """Return variant `size`/`fmt` of a stored image, rendering it if needed.
+
+    None when the image is unknown or derivatives are unavailable.
+    """
+    if not derivatives_available():
+        return None
+    store = get_image_store()
+    name = variant_name(size, fmt)
+    cached = await get_executor("image").run(store.fetch_variant, image_id, name)
+    if cached is not None:
+        return cached
+    original = await get_executor("image").run(store.fetch, image_id)
+    if original is None:
+        return None
+    variants = await ensure_derivatives(original)
+    data, mime_type = variants[name]
+    return StoredImage(image_id, data, mime_type)
@@ -0,0 +1,409 @@
+"""Per-session, content-addressed store for generated and edited images.
+
+Images are identified by the SHA-256 of their bytes (the first 32 hex digits),
+so the same image is kept once however many sessions refer to it. Each session
+has an ordered list of the images it produced (at most `session_images`); edits
+and the session's "last image" only see images in that list. Fetching by id
+alone (`fetch`, used to serve image URLs) needs no session: the id cannot be
+derived without the image itself.
+
+Clients that still want data URLs get them from `data_url`, which encodes each
+image once and keeps the encoded strings in a small LRU of their own.
+
+Resized variants (see agent.image_derivatives) are kept next to their original
+under `<id>@<variant>` and count against the same budgets.
+
+Two tiers:
+
+- memory: an LRU of image bytes capped at `max_bytes`;
+- disk (optional, IMAGE_STORE_DIR): every image and session list is written
+  through to disk, capped at `disk_max_bytes` (oldest files are removed
+  first). Memory misses are read back from it, so workers that share the
+  directory (a volume behind a load balancer) see each other's images.
+  Session lists are re-read and rewritten under a file lock on every `put`.
+  Disk writes happen outside the lock that guards the memory tier, so reads
+  do not wait behind them.
+
+Without a directory the store is per process, and an image evicted from memory
+is gone.
+"""
+
+import base64
+import contextlib
+import functools
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from agent.metrics import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows: session files are only rewritten atomically
+    fcntl = None  # type: ignore[assignment]
+
+STORE_BYTES = registry.gauge(
+    "locaith_image_store_bytes", "Image bytes held by the image store, by tier."
+)
+STORE_LOOKUPS = registry.counter(
+    "locaith_image_store_lookups_total",
+    "Image store reads, by tier that served them (or miss).",
+)
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_SESSION_IMAGES = 20
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_DATA_URL_BYTES = 32 * 1024 * 1024
+# Used when the client does not send a session id
+ANONYMOUS_SESSION = "anonymous"
+
+
+class StoredImage(NamedTuple):
+    """An image and its content-addressed id."""
+
+    id: str
+    data: bytes
+    mime_type: str
+
+
+_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def is_image_id(value: str) -> bool:
+    """Return whether `value` has the shape of an image id."""
+    return bool(_ID_RE.fullmatch(value or ""))
+
+
+def image_id(data: bytes) -> str:
+    """Return the content-addressed id of image bytes."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _session_key(session_id: str) -> str:
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+
+
+class ImageStore:
+    """Two-tier image store; see the module docstring."""
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        directory: Optional[str] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+        session_images: int = DEFAULT_SESSION_IMAGES,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        data_url_bytes: int = DEFAULT_DATA_URL_BYTES,
+    ):
+        """Budgets are in bytes; without `directory` the store is memory only."""
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.session_images = session_images
+        self.max_sessions = max_sessions
+        self._images: OrderedDict[str, StoredImage] = OrderedDict()
+        self._bytes = 0
+        self._sessions: OrderedDict[str, List[str]] = OrderedDict()
+        self.data_url_bytes = data_url_bytes
+        self._data_urls: OrderedDict[str, str] = OrderedDict()
+        self._data_url_size = 0
+        self._lock = threading.Lock()
+        # Guards the disk byte count and trimming; never taken inside self._lock
+        self._disk_lock = threading.Lock()
+        # Serializes session rewrites in this process where fcntl is unavailable
+        self._session_lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        if directory:
+            os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+            os.makedirs(os.path.join(directory, "sessions"), exist_ok=True)
+
+    # Memory tier. Callers hold self._lock.
+
+    def _remember(self, image: StoredImage, key: Optional[str] = None) -> None:
+        key = key or image.id
+        if key in self._images:
+            self._images.move_to_end(key)
+            return
+        self._images[key] = image
+        self._bytes += len(image.data)
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, evicted = self._images.popitem(last=False)
+            self._bytes -= len(evicted.data)
+        STORE_BYTES.set(self._bytes, tier="memory")
+
+    def _set_session(self, session_key: str, ids: List[str]) -> None:
+        self._sessions[session_key] = ids
+        self._sessions.move_to_end(session_key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _session_list(self, session_key: str) -> List[str]:
+        ids = self._sessions.get(session_key)
+        if ids is None:
+            ids = self._read_session(session_key) or []
+        self._set_session(session_key, ids)
+        return ids
+
+    def _append(self, ids: List[str], id: str) -> List[str]:
+        ids = [i for i in ids if i != id]
+        ids.append(id)
+        return ids[-self.session_images :]
+
+    # Disk tier. Only used when the store has a directory; callers do not hold self._lock.
+
+    def _disk_path(self, *parts: str) -> str:
+        return os.path.join(self.directory or "", *parts)
+
+    def _blob_path(self, id: str, mime_type: str) -> str:
+        ext = mimetypes.guess_extension(mime_type) or ".bin"
+        return self._disk_path("blobs", id[:2], id + ext)
+
+    def _find_blob(self, id: str) -> Optional[str]:
+        folder = self._disk_path("blobs", id[:2])
+        try:
+            names = os.listdir(folder)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(id + "."):
+                return os.path.join(folder, name)
+        return None
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _variant_path(self, id: str, variant: str) -> str:
+        return self._disk_path("blobs", id[:2], f"{id}@{variant}")
+
+    def _write_blob(self, image: StoredImage, path: Optional[str] = None) -> None:
+        path = path or self._blob_path(image.id, image.mime_type)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        self._write_atomic(path, image.data)
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(image.data)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._trim_disk()
+            STORE_BYTES.set(self._disk_bytes, tier="disk")
+
+    def _read_blob(self, id: str, path: Optional[str] = None) -> Optional[StoredImage]:
+        path = path or self._find_blob(id)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return StoredImage(id, data, mime_type)
+
+    def _blob_files(self) -> Iterator[str]:
+        for root, _, names in os.walk(self._disk_path("blobs")):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(root, name)
+
+    def _scan_disk_bytes(self) -> int:
+        return sum(os.path.getsize(p) for p in self._blob_files())
+
+    def _trim_disk(self) -> None:
+        """Remove the least recently used files until the disk tier is at 90% of its budget."""
+        files = []
+        for path in self._blob_files():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= 0.9 * self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    def _session_path(self, session_key: str) -> str:
+        return self._disk_path("sessions", session_key + ".json")
+
+    @contextlib.contextmanager
+    def _locked_session(self, session_key: str) -> Iterator[None]:
+        """Hold an exclusive lock on a session file across threads and workers sharing the directory."""
+        if fcntl is None:
+            with self._session_lock:
+                yield
+            return
+        with open(self._session_path(session_key) + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_session(self, session_key: str) -> Optional[List[str]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._session_path(session_key), encoding="utf-8") as f:
+                return list(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # Public API
+
+    def put(self, session_id: str, data: bytes, mime_type: str) -> str:
+        """Store `data` for `session_id` and make it the session's last image; return its id."""
+        image = StoredImage(image_id(data), data, mime_type)
+        key = _session_key(session_id)
+        if not self.directory:
+            with self._lock:
+                self._remember(image)
+                self._set_session(key, self._append(self._session_list(key), image.id))
+            return image.id
+        with self._lock:
+            self._remember(image)
+        self._write_blob(image)
+        with self._locked_session(key):
+            # Re-read the list: another worker may have added to the session
+            ids = self._append(self._read_session(key) or [], image.id)
+            self._write_atomic(self._session_path(key), json.dumps(ids).encode("utf-8"))
+            with self._lock:
+                self._set_session(key, ids)
+        return image.id
+
+    def _fetch(self, id: str, variant: Optional[str] = None) -> Optional[StoredImage]:
+        if not is_image_id(id):
+            STORE_LOOKUPS.inc(tier="miss")
+            return None
+        key = f"{id}@{variant}" if variant else id
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            STORE_LOOKUPS.inc(tier="memory")
+            return image
+        image = None
+        if self.directory:
+            image = self._read_blob(
+                id, self._variant_path(id, variant) if variant else None
+            )
+        if image is None:
+            STORE_LOOKUPS.inc(tier="miss")
+            return None
+        self._remember(image, key)
+        STORE_LOOKUPS.inc(tier="disk")
+        return image
+
+    def fetch(self, id: str) -> Optional[StoredImage]:
+        """Return image `id` whichever session stored it."""
+        with self._lock:
+            return self._fetch(id)
+
+    def fetch_variant(self, id: str, variant: str) -> Optional[StoredImage]:
+        """Return a cached variant (e.g. "thumb.webp") of image `id`."""
+        with self._lock:
+            return self._fetch(id, variant)
+
+    def put_variants(self, id: str, variants: Dict[str, Tuple[bytes, str]]) -> None:
+        """Cache rendered variants of image `id`: {variant: (bytes, mime type)}."""
+        images = {
+            variant: StoredImage(id, data, mime_type)
+            for variant, (data, mime_type) in variants.items()
+        }
+        with self._lock:
+            for variant, image in images.items():
+                self._remember(image, f"{id}@{variant}")
+        if self.directory:
+            for variant, image in images.items():
+                self._write_blob(image, self._variant_path(id, variant))
+
+    def get(self, session_id: str, id: str) -> Optional[StoredImage]:
+        """Return image `id` if it belongs to `session_id`."""
+        key = _session_key(session_id)
+        with self._lock:
+            if self.directory:
+                # Another worker may have added to the session since it was cached
+                self._sessions.pop(key, None)
+            if id not in self._session_list(key):
+                STORE_LOOKUPS.inc(tier="miss")
+                return None
+            return self._fetch(id)
+
+    def last(self, session_id: str) -> Optional[StoredImage]:
+        """Return the newest image of `session_id` that is still stored."""
+        key = _session_key(session_id)
+        with self._lock:
+            if self.directory:
+                self._sessions.pop(key, None)
+            ids = list(self._session_list(key))
+        for id in reversed(ids):
+            image = self.get(session_id, id)
+            if image is not None:
+                return image
+        return None
+
+    def data_url(self, image: StoredImage) -> str:
+        """Return the `data:` URL of `image`, base64-encoded on first request only."""
+        with self._lock:
+            cached = self._data_urls.get(image.id)
+            if cached is not None:
+                self._data_urls.move_to_end(image.id)
+                return cached
+        encoded = f"data:{image.mime_type};base64,{base64.b64encode(image.data).decode('ascii')}"
+        with self._lock:
+            if image.id not in self._data_urls:
+                self._data_urls[image.id] = encoded
+                self._data_url_size += len(encoded)
+            while (
+                self._data_url_size > self.data_url_bytes and len(self._data_urls) > 1
+            ):
+                _, evicted = self._data_urls.popitem(last=False)
+                self._data_url_size -= len(evicted)
+        return encoded
+
+    def stats(self) -> Dict[str, int]:
+        """Return the memory and disk tier counters."""
+        with self._lock:
+            return {
+                "images": len(self._images),
+                "bytes": self._bytes,
+                "sessions": len(self._sessions),
+                "disk_bytes": self._disk_bytes or 0,
+            }
+
+
+@functools.lru_cache(maxsize=1)
+def get_image_store() -> ImageStore:
+    """Return the process-wide image store, configured from the environment.
+
+    Reads IMAGE_STORE_MAX_BYTES, IMAGE_STORE_DIR, IMAGE_STORE_DISK_MAX_BYTES and
+    IMAGE_STORE_SESSION_IMAGES.
+    """
+    return ImageStore(
+        max_bytes=int(os.getenv("IMAGE_STORE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        directory=os.getenv("IMAGE_STORE_DIR") or None,
+        disk_max_bytes=int(
+            os.getenv("IMAGE_STORE_DISK_MAX_BYTES", DEFAULT_DISK_MAX_BYTES)
+        ),
+        session_images=int(
+            os.getenv("IMAGE_STORE_SESSION_IMAGES", DEFAULT_SESSION_IMAGES)
+        ),
+    )
@@ -1,17 +1,19 @@
-import os
-from typing import Literal, Optional
+import logging
+from typing import Literal
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from google.genai import Client
 
-# Ensure API key is set for Gemini
-if os.getenv("GEMINI_API_KEY") is None:
-    raise ValueError("GEMINI_API_KEY is not set")
+from agent.clients import get_genai_client, get_semaphore
+from agent.outbound import Priority, genai_usage, reserve_tokens, scheduler
 
-client = Client(api_key=os.getenv("GEMINI_API_KEY"))
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/intent", tags=["intent"]) 
 
+# Classify calls in flight at once across all requests
+MAX_CONCURRENT_CLASSIFY = 32
+
 
 class ImageIntentRequest(BaseModel):
     user_input: str
@@ -82,7 +84,7 @@ def _keyword_confidence(text: str) -> tuple[list[str], float]:
     return hits, conf
 
 
-def _call_flash_classify(user_input: str) -> str:
+async def _call_flash_classify(user_input: str) -> str:
     """Call Gemini 2.5 Flash to classify 'create' or 'ask'."""
     prompt = (
         "Phân tích xem người dùng có đang:\n"
@@ -92,11 +94,18 @@ def _call_flash_classify(user_input: str) -> str:
         f"Câu hỏi: {user_input}\n"
     )
     try:
-        res = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config={"temperature": 0, "max_output_tokens": 2},
-        )
+        async with get_semaphore("classify", MAX_CONCURRENT_CLASSIFY):
+            res = await scheduler.acall(
+                "gemini-2.5-flash",
+                lambda: get_genai_client().aio.models.generate_content(
+                    model="gemini-2.5-flash",
+                    contents=prompt,
+                    config={"temperature": 0, "max_output_tokens": 2},
+                ),
+                tokens=reserve_tokens(prompt, output=2),
+                priority=Priority.INTERACTIVE,
+                usage=genai_usage,
+            )
         text = (res.text or "").strip().lower()
         if "create" in text:
             return "create"
@@ -106,18 +115,18 @@ def _call_flash_classify(user_input: str) -> str:
         return "create" if any(s in user_input.lower() for s in ["tạo", "vẽ", "generate", "render"]) else "ask"
     except Exception as e:
         # In case of model failure, fallback to heuristic only
-        print(f"WARN: flash classify failed: {e}")
+        logger.warning("Flash classify failed: %s", e)
         return "create" if any(s in user_input.lower() for s in ["tạo", "vẽ", "generate", "render"]) else "ask"
 
 
 @router.post("/image", response_model=ImageIntentResponse)
-def classify_image_intent(payload: ImageIntentRequest):
+async def classify_image_intent(payload: ImageIntentRequest):
     text = (payload.user_input or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="user_input is required")
 
     hits, kw_conf = _keyword_confidence(text)
-    model_intent = _call_flash_classify(text)
+    model_intent = await _call_flash_classify(text)
 
     # Combine confidences. If model says 'ask', reduce overall confidence.
     # Base trust 0.5, keywords up to +0.3, model alignment up to +0.2
@@ -0,0 +1,473 @@
+"""Per-node latency, token, retry and cache instrumentation.
+
+Every graph node registered through `instrument_node` records its wall time and
+status, plus whatever the node reports while it runs: model calls with token
+usage, retry attempts and cache lookups. LangChain chat model calls are picked
+up automatically through a callback handler bound to the running node; direct
+google-genai calls and caches report through `note_model_call`, `note_retry`
+and `note_cache`. The data is exported in Prometheus text format on `/metrics`
+and logged as one JSON line per node run on the `agent.metrics` logger.
+
+Set METRICS_ENABLED=false to build the graph without any wrappers.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_M = TypeVar("_M", bound="Counter | Histogram")
+
+_DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+)
+
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, documentation: str):
+        """Create counter `name`; `documentation` becomes its HELP line."""
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Add `amount` to the series of `labels`."""
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    """Counter whose series can also be set to any value."""
+
+    def set(self, value: float, **labels: Any) -> None:
+        """Set the series of `labels` to `value`."""
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        return (
+            super()
+            .render()
+            .replace(f"# TYPE {self.name} counter", f"# TYPE {self.name} gauge")
+        )
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    def __init__(
+        self, name: str, documentation: str, buckets: Iterable[float] = _DEFAULT_BUCKETS
+    ):
+        """Create histogram `name` with upper bounds `buckets`."""
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record one `value` in the series of `labels`."""
+        key = _labels(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [bucket counts..., sum, count]
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}"
+                    )
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {entry[-1]}"
+                )
+                lines.append(f"{self.name}_sum{_format_labels(key)} {entry[-2]:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {entry[-1]}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """The metrics served on `/metrics`, by name."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _M) -> _M:
+        """Add `metric`, or return the one already registered under its name."""
+        with self._lock:
+            registered: _M = self._metrics.setdefault(metric.name, metric)
+            return registered
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        """Return the counter `name`, creating it on first use."""
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        """Return the gauge `name`, creating it on first use."""
+        return self.register(Gauge(name, documentation))
+
+    def histogram(
+        self, name: str, documentation: str, buckets: Iterable[float] = _DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Return the histogram `name`, creating it on first use."""
+        return self.register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+registry = Registry()
+
+NODE_DURATION = registry.histogram(
+    "locaith_node_duration_seconds", "Wall time of graph node runs."
+)
+MODEL_CALLS = registry.counter(
+    "locaith_model_calls_total", "Model calls made by graph nodes."
+)
+MODEL_TOKENS = registry.counter(
+    "locaith_model_tokens_total", "Prompt and completion tokens used by graph nodes."
+)
+NODE_RETRIES = registry.counter(
+    "locaith_node_retries_total", "Retry attempts made inside graph nodes."
+)
+CACHE_LOOKUPS = registry.counter(
+    "locaith_cache_lookups_total", "Cache lookups made by graph nodes."
+)
+
+
+class NodeRun:
+    """What one node execution reported; becomes metrics and one log line."""
+
+    __slots__ = (
+        "node",
+        "models",
+        "prompt_tokens",
+        "completion_tokens",
+        "retries",
+        "cache",
+    )
+
+    def __init__(self, node: str):
+        """Start an empty report for one run of `node`."""
+        self.node = node
+        self.models: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.cache: Dict[str, str] = {}
+
+    def model_call(
+        self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0
+    ) -> None:
+        """Record one model call and its token usage."""
+        model = model or "unknown"
+        self.models[model] = self.models.get(model, 0) + 1
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        MODEL_CALLS.inc(node=self.node, model=model)
+        if prompt_tokens:
+            MODEL_TOKENS.inc(prompt_tokens, node=self.node, model=model, kind="prompt")
+        if completion_tokens:
+            MODEL_TOKENS.inc(
+                completion_tokens, node=self.node, model=model, kind="completion"
+            )
+
+
+class _RecentDurations:
+    """Exponentially weighted moving average of successful run time per node."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, node: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._values.get(node)
+            self._values[node] = (
+                seconds
+                if previous is None
+                else previous + self.alpha * (seconds - previous)
+            )
+
+    def get(self, node: str, default: float) -> float:
+        with self._lock:
+            return self._values.get(node, default)
+
+
+_recent = _RecentDurations()
+
+
+def recent_duration(node: str, default: float) -> float:
+    """Recent typical wall time of `node` runs (EWMA); `default` until one has finished.
+
+    Only instrumented nodes are observed, so this is `default` with METRICS_ENABLED off.
+    """
+    return _recent.get(node, default)
+
+
+_current_run: ContextVar[Optional[NodeRun]] = ContextVar(
+    "locaith_node_run", default=None
+)
+
+
+class _NodeCallbackHandler(BaseCallbackHandler):
+    """Feeds token usage of LangChain chat model calls into the running node's record."""
+
+    def __init__(self, run: NodeRun):
+        self.run = run
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        for generations in response.generations or []:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                metadata = getattr(message, "response_metadata", None) or {}
+                model = metadata.get("model_name") or (response.llm_output or {}).get(
+                    "model_name"
+                )
+                self.run.model_call(
+                    model or "unknown",
+                    usage.get("input_tokens", 0),
+                    usage.get("output_tokens", 0),
+                )
+
+
+_node_handler: ContextVar[Optional[_NodeCallbackHandler]] = ContextVar(
+    "locaith_node_handler", default=None
+)
+register_configure_hook(_node_handler, inheritable=True)
+
+
+def note_model_call(
+    model: str, prompt_tokens: int = 0, completion_tokens: int = 0
+) -> None:
+    """Record a model call made outside LangChain (e.g. direct google-genai calls)."""
+    run = _current_run.get()
+    if run is not None:
+        run.model_call(model, prompt_tokens, completion_tokens)
+
+
+def note_retry() -> None:
+    """Count a retry of the current node."""
+    run = _current_run.get()
+    if run is not None:
+        run.retries += 1
+        NODE_RETRIES.inc(node=run.node)
+
+
+def note_cache(cache: str, hit: bool) -> None:
+    """Record a cache hit or miss of the current node."""
+    run = _current_run.get()
+    if run is not None:
+        result = "hit" if hit else "miss"
+        run.cache[cache] = result
+        CACHE_LOOKUPS.inc(node=run.node, cache=cache, result=result)
+
+
+_Tokens = Tuple[Token[Optional[NodeRun]], Token[Optional[_NodeCallbackHandler]]]
+
+
+def _start(node: str) -> Tuple[NodeRun, _Tokens, float]:
+    run = NodeRun(node)
+    tokens = (_current_run.set(run), _node_handler.set(_NodeCallbackHandler(run)))
+    return run, tokens, time.perf_counter()
+
+
+def _finish(
+    run: NodeRun, tokens: _Tokens, started: float, error: Optional[BaseException]
+) -> None:
+    try:
+        _current_run.reset(tokens[0])
+        _node_handler.reset(tokens[1])
+    except ValueError:
+        # A generator node finished in a different context than it started in
+        _current_run.set(None)
+        _node_handler.set(None)
+    duration = time.perf_counter() - started
+    if error is None:
+        status = "ok"
+    elif isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        status = "cancelled"
+    else:
+        status = "error"
+    NODE_DURATION.observe(duration, node=run.node, status=status)
+    if status == "ok":
+        _recent.observe(run.node, duration)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            json.dumps(
+                {
+                    "event": "node",
+                    "node": run.node,
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 2),
+                    "models": run.models,
+                    "prompt_tokens": run.prompt_tokens,
+                    "completion_tokens": run.completion_tokens,
+                    "retries": run.retries,
+                    "cache": run.cache,
+                    "error": repr(error) if error is not None else None,
+                },
+                ensure_ascii=False,
+            )
+        )
+
+
+def instrument_node(name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a node function (sync, async or generator) so each run is measured.
+
+    Returns `fn` unchanged when METRICS_ENABLED is off. The wrapper keeps the
+    signature and annotations of `fn`, so LangGraph still injects `config` and
+    infers the node's input schema.
+    """
+    if not METRICS_ENABLED:
+        return fn
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            run, tokens, started = _start(name)
+            error: Optional[BaseException] = None
+            try:
+                return await fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _finish(run, tokens, started, error)
+
+        return async_wrapper
+
+    if inspect.isgeneratorfunction(fn):
+
+        @functools.wraps(fn)
+        def generator_wrapper(*args: Any, **kwargs: Any) -> Iterator[Any]:
+            run, tokens, started = _start(name)
+            error: Optional[BaseException] = None
+            try:
+                yield from fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _finish(run, tokens, started, error)
+
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        run, tokens, started = _start(name)
+        error: Optional[BaseException] = None
+        try:
+            return fn(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _finish(run, tokens, started, error)
+
+    return wrapper
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of the agent metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,57 @@
+"""Pooled chat models and structured-output runnables, one per settings."""
+
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Type
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel, SecretStr
+
+from agent.clients import set_genai_client
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Upper bound on distinct (model, temperature, streaming) combinations kept alive.
+# Model names can come from per-request config, so the pool must not grow forever.
+_MAX_POOLED_MODELS = 64
+
+
+@lru_cache(maxsize=_MAX_POOLED_MODELS)
+def get_chat_model(
+    model: str, temperature: float, streaming: bool = False
+) -> "ChatGoogleGenerativeAI":
+    """Return a shared ChatGoogleGenerativeAI for the given settings.
+
+    Instances are reused across nodes and runs so their underlying HTTP client
+    (and its keep-alive connections) stays warm instead of being rebuilt per call.
+    Calls go through the outbound scheduler (see agent.outbound).
+    """
+    # langchain_google_genai is slow to import; pay for it on first use
+    from agent.chat_model import ScheduledChatModel
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    return ScheduledChatModel(
+        model=model,
+        temperature=temperature,
+        # `retries` is the field alias of max_retries
+        retries=2,
+        api_key=SecretStr(api_key) if api_key else None,
+        streaming=streaming,
+    )
+
+
+@lru_cache(maxsize=_MAX_POOLED_MODELS)
+def get_structured_model(
+    model: str, temperature: float, schema: Type[BaseModel]
+) -> Runnable[LanguageModelInput, Any]:
+    """Return a shared `with_structured_output(schema)` runnable on top of the pooled model."""
+    return get_chat_model(model, temperature).with_structured_output(schema)
+
+
+def clear_model_cache() -> None:
+    """Drop all pooled models and the shared genai client, e.g. after rotating GEMINI_API_KEY."""
+    get_structured_model.cache_clear()
+    get_chat_model.cache_clear()
+    set_genai_client(None)
@@ -0,0 +1,411 @@
+"""Central scheduler for outbound Gemini calls, with priority classes.
+
+Every Gemini call of the process (graph nodes, image and intent endpoints)
+acquires capacity from its model's RPM/TPM token buckets before it is sent. Calls that do
+not fit wait in a per-model queue instead of failing; the queue is served by
+priority class (interactive before default before background), first come
+first served within a class, and a waiting call moves up one class for every
+`AGING_SECONDS` it has waited so background work is never starved.
+
+A quota error (HTTP 429 / RESOURCE_EXHAUSTED) pauses the model for the delay
+the API asks for (or an exponential backoff) and puts the call back in the
+queue, up to `MAX_QUOTA_RETRIES` times.
+
+Limits come from GEMINI_RATE_LIMITS, a JSON object keyed by model name, with
+"*" as the fallback for unlisted models:
+
+    GEMINI_RATE_LIMITS='{"gemini-2.5-pro": {"rpm": 150, "tpm": 2000000}, "*": {"rpm": 1000}}'
+
+Models without limits are not throttled, but still queue behind a quota pause.
+"""
+
+import asyncio
+import enum
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from agent.context import estimate_tokens
+from agent.metrics import registry
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+AGING_SECONDS = 10.0
+MAX_QUOTA_RETRIES = 5
+MAX_QUOTA_BACKOFF = 60.0
+
+QUEUE_WAIT = registry.histogram(
+    "locaith_outbound_wait_seconds", "Time Gemini calls waited for rate-limit capacity."
+)
+QUEUE_DEPTH = registry.gauge(
+    "locaith_outbound_queue_depth", "Gemini calls waiting for rate-limit capacity."
+)
+QUOTA_ERRORS = registry.counter(
+    "locaith_outbound_quota_errors_total", "Quota errors returned by Gemini, by model."
+)
+
+
+class Priority(enum.IntEnum):
+    """Scheduling class of a call; lower values are served first."""
+
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BACKGROUND = 2
+
+
+# Graph nodes whose model calls are not plain DEFAULT work
+NODE_PRIORITIES: Dict[str, Priority] = {
+    "llm": Priority.INTERACTIVE,
+    "speculate": Priority.INTERACTIVE,
+    "finalize_answer": Priority.INTERACTIVE,
+    "self_check": Priority.BACKGROUND,
+}
+
+
+def priority_for_node(node: Optional[str]) -> Priority:
+    """Return the priority of model calls made by graph node `node`."""
+    return NODE_PRIORITIES.get(node or "", Priority.DEFAULT)
+
+
+def _model_name(model: str) -> str:
+    return model[len("models/") :] if model.startswith("models/") else model
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """Return whether `error` is a Gemini quota error (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code == 429:
+        return True
+    text = str(error)
+    return "RESOURCE_EXHAUSTED" in text or "429" in text.split(" ", 1)[0]
+
+
+_RETRY_DELAY_RE = re.compile(
+    r"retry(?:Delay\W+|\s+in\s+)(\d+(?:\.\d+)?)s", re.IGNORECASE
+)
+
+
+def quota_delay(error: BaseException, attempt: int) -> float:
+    """Return how long to pause after a quota error: the delay the API asks for, or a backoff."""
+    m = _RETRY_DELAY_RE.search(str(error))
+    if m:
+        return min(float(m.group(1)), MAX_QUOTA_BACKOFF)
+    return min(2.0**attempt, MAX_QUOTA_BACKOFF)
+
+
+class TokenBucket:
+    """Refills `per_minute` units a minute up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        """Start full."""
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add what has accrued since the last refill."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Return the seconds until `amount` units are available."""
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        """Spend `amount` units; the level may go negative."""
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        """Return `amount` units taken but not spent, up to capacity."""
+        self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Waiter:
+    __slots__ = (
+        "priority",
+        "seq",
+        "tokens",
+        "enqueued",
+        "grant",
+        "granted",
+        "cancelled",
+    )
+
+    def __init__(
+        self, priority: Priority, seq: int, tokens: int, grant: Callable[[], None]
+    ):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.grant = grant
+        self.granted = False
+        self.cancelled = False
+
+    def rank(self, now: float) -> Tuple[float, int]:
+        return (self.priority - (now - self.enqueued) / AGING_SECONDS, self.seq)
+
+
+class _ModelLimiter:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.queue: List[_Waiter] = []
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        wait = max(0.0, self.paused_until - now)
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+    def take(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def give_back(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.give_back(1)
+        if self.tokens is not None:
+            self.tokens.give_back(tokens)
+
+
+def _load_limits() -> Dict[str, Dict[str, float]]:
+    raw = os.getenv("GEMINI_RATE_LIMITS")
+    if not raw:
+        return {}
+    try:
+        return {str(k): dict(v) for k, v in json.loads(raw).items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning("Ignoring invalid GEMINI_RATE_LIMITS: %s", e)
+        return {}
+
+
+class OutboundScheduler:
+    """Queues Gemini calls per model until their rate limits have room."""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        """Use `limits` ({model: {"rpm", "tpm"}}), or GEMINI_RATE_LIMITS when None."""
+        self._limits = _load_limits() if limits is None else limits
+        self._limiters: Dict[str, _ModelLimiter] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def _limiter(self, model: str) -> _ModelLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limits = self._limits.get(model) or self._limits.get("*") or {}
+            limiter = self._limiters[model] = _ModelLimiter(
+                limits.get("rpm"), limits.get("tpm")
+            )
+        return limiter
+
+    # Queue handling. All of it runs under self._cond.
+
+    def _try_now(self, limiter: _ModelLimiter, tokens: int) -> bool:
+        if limiter.queue or limiter.wait_time(tokens, time.monotonic()) > 0:
+            return False
+        limiter.take(tokens)
+        return True
+
+    def _enqueue(self, model: str, limiter: _ModelLimiter, waiter: _Waiter) -> None:
+        limiter.queue.append(waiter)
+        QUEUE_DEPTH.inc(1, model=model, priority=waiter.priority.name.lower())
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_forever, name="gemini-outbound", daemon=True
+            )
+            self._dispatcher.start()
+        self._cond.notify()
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant every call that fits now; return seconds until the next one may fit."""
+        now = time.monotonic()
+        next_wake = None
+        for model, limiter in self._limiters.items():
+            while limiter.queue:
+                waiter = min(limiter.queue, key=lambda w: w.rank(now))
+                if waiter.cancelled:
+                    limiter.queue.remove(waiter)
+                    QUEUE_DEPTH.inc(
+                        -1, model=model, priority=waiter.priority.name.lower()
+                    )
+                    continue
+                wait = limiter.wait_time(waiter.tokens, now)
+                if wait > 0:
+                    next_wake = wait if next_wake is None else min(next_wake, wait)
+                    break
+                limiter.queue.remove(waiter)
+                limiter.take(waiter.tokens)
+                QUEUE_DEPTH.inc(-1, model=model, priority=waiter.priority.name.lower())
+                QUEUE_WAIT.observe(
+                    now - waiter.enqueued,
+                    model=model,
+                    priority=waiter.priority.name.lower(),
+                )
+                waiter.granted = True
+                waiter.grant()
+        return next_wake
+
+    def _dispatch_forever(self) -> None:
+        with self._cond:
+            while True:
+                self._cond.wait(self._dispatch())
+
+    # Public API
+
+    def acquire(
+        self, model: str, tokens: int, priority: Priority = Priority.DEFAULT
+    ) -> None:
+        """Block the calling thread until `model` has capacity for one call of `tokens`."""
+        model = _model_name(model)
+        event = threading.Event()
+        with self._cond:
+            limiter = self._limiter(model)
+            if self._try_now(limiter, tokens):
+                return
+            self._enqueue(
+                model, limiter, _Waiter(priority, next(self._seq), tokens, event.set)
+            )
+        event.wait()
+
+    async def aacquire(
+        self, model: str, tokens: int, priority: Priority = Priority.DEFAULT
+    ) -> None:
+        """Wait (without blocking the event loop) until `model` has capacity for one call."""
+        model = _model_name(model)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def grant() -> None:
+            loop.call_soon_threadsafe(_resolve, future)
+
+        with self._cond:
+            limiter = self._limiter(model)
+            if self._try_now(limiter, tokens):
+                return
+            waiter = _Waiter(priority, next(self._seq), tokens, grant)
+            self._enqueue(model, limiter, waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._cond:
+                if waiter.granted:
+                    # Granted before the cancellation reached us: the call will not be made
+                    limiter.give_back(tokens)
+                else:
+                    waiter.cancelled = True
+                self._cond.notify()
+            raise
+
+    def settle(self, model: str, reserved: int, used: Optional[int]) -> None:
+        """Charge (or refund) the difference between reserved and actually used tokens."""
+        if not used:
+            return
+        with self._cond:
+            limiter = self._limiter(_model_name(model))
+            if limiter.tokens is not None:
+                limiter.tokens.level -= used - reserved
+
+    def pause(self, model: str, seconds: float) -> None:
+        """Hold every call to `model` for `seconds`, e.g. after a quota error."""
+        model = _model_name(model)
+        with self._cond:
+            limiter = self._limiter(model)
+            limiter.paused_until = max(limiter.paused_until, time.monotonic() + seconds)
+        QUOTA_ERRORS.inc(model=model)
+
+    def call(
+        self,
+        model: str,
+        fn: Callable[[], _T],
+        *,
+        tokens: int,
+        priority: Priority = Priority.DEFAULT,
+        usage: Optional[Callable[[_T], Optional[int]]] = None,
+    ) -> _T:
+        """Run `fn()` once `model` has capacity, requeueing it after quota errors."""
+        attempt = 0
+        while True:
+            self.acquire(model, tokens, priority)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_quota_error(e) or attempt >= MAX_QUOTA_RETRIES:
+                    raise
+                self.pause(model, quota_delay(e, attempt))
+                attempt += 1
+                continue
+            if usage is not None:
+                self.settle(model, tokens, usage(result))
+            return result
+
+    async def acall(
+        self,
+        model: str,
+        factory: Callable[[], Awaitable[_T]],
+        *,
+        tokens: int,
+        priority: Priority = Priority.DEFAULT,
+        usage: Optional[Callable[[_T], Optional[int]]] = None,
+    ) -> _T:
+        """Async `call`: await `factory()` once `model` has capacity."""
+        attempt = 0
+        while True:
+            await self.aacquire(model, tokens, priority)
+            try:
+                result = await factory()
+            except Exception as e:
+                if not is_quota_error(e) or attempt >= MAX_QUOTA_RETRIES:
+                    raise
+                self.pause(model, quota_delay(e, attempt))
+                attempt += 1
+                continue
+            if usage is not None:
+                self.settle(model, tokens, usage(result))
+            return result
+
+
+def reserve_tokens(*texts: str, output: int = 1024) -> int:
+    """Tokens to reserve for a call on `texts`: their estimate plus the expected output."""
+    return sum(estimate_tokens(t or "") for t in texts) + output
+
+
+def genai_usage(response: "types.GenerateContentResponse") -> Optional[int]:
+    """Total tokens of a google-genai response, for `usage=`."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None)
+
+
+scheduler = OutboundScheduler()
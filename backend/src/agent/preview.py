@@ -1,30 +1,188 @@
+"""Link previews (title, description, image) for source cards.
+
+Pages are fetched with the shared pooled HTTP client and read as a stream
+that stops at `<body>` / `</head>` or after `MAX_PREVIEW_BYTES`, feeding a
+small incremental parser that only looks at `<title>` and `<meta>` tags.
+Previews are kept in an LRU+TTL cache keyed by URL, and concurrent requests
+for the same URL share one fetch. Empty previews (non-HTML content, pages
+without title or meta tags) are kept for `EMPTY_PREVIEW_TTL` only.
+"""
+
+import asyncio
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
 from fastapi import APIRouter, HTTPException, Query
-import requests
-from bs4 import BeautifulSoup
+from pydantic import BaseModel
+from typing_extensions import override
+
+from agent.clients import get_http_client, get_semaphore
+from agent.metrics import registry
+from agent.search_cache import MemoryCacheBackend
+from agent.singleflight import SingleFlight
 
 router = APIRouter()
 
+MAX_PREVIEW_BYTES = 256 * 1024
+MAX_BULK_URLS = 50
+# Pages fetched at once across all requests
+MAX_CONCURRENT_FETCHES = 16
+PREVIEW_TTL = 6 * 3600
+EMPTY_PREVIEW_TTL = 5 * 60
+
+PREVIEWS = registry.counter(
+    "locaith_preview_requests_total", "Link previews served: hit (cache), miss (fetched) or error."
+)
+
+# {"title": ..., "description": ..., "image": ...}; missing fields are None
+Preview = Dict[str, Any]
+
+_cache = MemoryCacheBackend(ttl=PREVIEW_TTL, max_entries=4096)
+_empty_cache = MemoryCacheBackend(ttl=EMPTY_PREVIEW_TTL, max_entries=1024)
+_flights = SingleFlight("preview")
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
 
-def _og_from_html(html: str):
-    soup = BeautifulSoup(html, "html.parser")
 
-    def meta(p: str):
-        tag = soup.find("meta", property=p) or soup.find("meta", attrs={"name": p})
-        return tag["content"] if tag and tag.has_attr("content") else None
+class _HeadParser(HTMLParser):
+    """Collects `<title>` and `<meta property|name=... content=...>` until the body starts."""
 
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title: Optional[str] = None
+        self.done = False
+        self._in_title = False
+        self._title_parts: List[str] = []
+
+    @override
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self.done:
+            return
+        if tag == "meta":
+            values = dict(attrs)
+            key = (values.get("property") or values.get("name") or "").lower()
+            content = values.get("content")
+            if key and content and key not in self.meta:
+                self.meta[key] = content.strip()
+        elif tag == "title" and self.title is None:
+            self._in_title = True
+        elif tag == "body":
+            self.done = True
+
+    @override
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = "".join(self._title_parts).strip() or None
+        elif tag == "head":
+            self.done = True
+
+    @override
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self._title_parts.append(data)
+
+
+def _og_from_head(parser: _HeadParser, base_url: str) -> Preview:
+    image = parser.meta.get("og:image")
     return {
-        "title": meta("og:title") or (soup.title.string if soup.title else None),
-        "description": meta("og:description"),
-        "image": meta("og:image"),
+        "title": parser.meta.get("og:title") or parser.title,
+        "description": parser.meta.get("og:description"),
+        "image": urljoin(base_url, image) if image else None,
     }
 
 
-@router.get("/api/preview")
-def preview(url: str = Query(..., description="Target URL")):
+async def _fetch_preview(url: str) -> Preview:
+    async with get_semaphore("preview", MAX_CONCURRENT_FETCHES):
+        async with get_http_client().stream("GET", url) as r:
+            r.raise_for_status()
+            parser = _HeadParser()
+            content_type = r.headers.get("content-type", "")
+            if content_type and "html" not in content_type:
+                return _og_from_head(parser, str(r.url))
+            decoder = None
+            read = 0
+            async for chunk in r.aiter_bytes():
+                if decoder is None:
+                    sniffed = None if r.charset_encoding else _CHARSET_RE.search(chunk[:2048])
+                    encoding = r.charset_encoding or (sniffed and sniffed.group(1).decode()) or "utf-8"
+                    try:
+                        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                    except LookupError:
+                        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                chunk = chunk[: MAX_PREVIEW_BYTES - read]
+                read += len(chunk)
+                parser.feed(decoder.decode(chunk))
+                if parser.done or read >= MAX_PREVIEW_BYTES:
+                    break
+            return _og_from_head(parser, str(r.url))
+
+
+def _check_url(url: str) -> None:
+    if urlsplit(url).scheme not in ("http", "https"):
+        raise HTTPException(status_code=400, detail="Only http(s) URLs can be previewed")
+
+
+async def get_preview(url: str) -> Preview:
+    """Return the cached preview of `url`, fetching it on a miss.
+
+    Raises:
+        HTTPException: 502 if the page cannot be fetched.
+    """
+    cached = _cache.get(url) or _empty_cache.get(url)
+    if cached is not None:
+        PREVIEWS.inc(result="hit")
+        return cached
     try:
-        r = requests.get(url, timeout=5, headers={"User-Agent": "Mozilla/5.0"})
-        r.raise_for_status()
+        data: Preview = await _flights.ado(url, lambda: _fetch_preview(url))
     except Exception as e:
+        PREVIEWS.inc(result="error")
         raise HTTPException(status_code=502, detail=f"fetch failed: {e}")
-    data = _og_from_html(r.text)
-    return data
\ No newline at end of file
+    PREVIEWS.inc(result="miss")
+    (_cache if any(data.values()) else _empty_cache).set(url, data)
+    return data
+
+
+@router.get("/api/preview")
+async def preview(url: str = Query(..., description="Target URL")) -> Preview:
+    """Preview one URL."""
+    _check_url(url)
+    return await get_preview(url)
+
+
+class BulkPreviewRequest(BaseModel):
+    """Body of `POST /api/preview/bulk`."""
+
+    urls: List[str]
+
+
+@router.post("/api/preview/bulk")
+async def bulk_preview(payload: BulkPreviewRequest) -> Dict[str, Dict[str, Any]]:
+    """Preview many URLs at once.
+
+    Returns `{"previews": {url: preview}, "errors": {url: detail}}`; one failing
+    URL does not fail the others.
+    """
+    urls = list(dict.fromkeys(u.strip() for u in payload.urls if u and u.strip()))
+    if len(urls) > MAX_BULK_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_URLS} URLs per request")
+
+    async def one(url: str) -> Tuple[str, Optional[Preview], Optional[str]]:
+        try:
+            _check_url(url)
+            return url, await get_preview(url), None
+        except HTTPException as e:
+            return url, None, e.detail
+
+    previews: Dict[str, Any] = {}
+    errors: Dict[str, Any] = {}
+    for url, data, error in await asyncio.gather(*(one(u) for u in urls)):
+        if error is None:
+            previews[url] = data
+        else:
+            errors[url] = error
+    return {"previews": previews, "errors": errors}
@@ -104,3 +104,13 @@ User Context:
 
 Available Materials and Summaries:
 {summaries}"""
+
+route_classifier_instructions = """Classify the user's latest message.
+
+- chat: casual conversation, opinions, writing help or general knowledge that can be answered well without looking anything up.
+- search: needs current, factual or verifiable information from the web (news, prices, statistics, recent products, specific people or events).
+
+Reply with exactly one word: chat or search.
+
+Conversation:
+{research_topic}"""
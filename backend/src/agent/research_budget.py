@@ -0,0 +1,55 @@
+"""How many follow-up queries `evaluate_research` sends in parallel.
+
+Each research loop costs one round of web research (queries run in parallel)
+plus one reflection, so the loops the latency budget still allows are
+`remaining seconds / (web_research + reflection time)`, using the recently
+observed node times. The follow-up queries are spread over the loops that are
+left, so fewer loops mean a wider fan-out and no time spent on loops that will
+never run. The token budget caps the fan-out by the summary tokens an average
+query has added so far.
+"""
+
+import math
+
+# Used until the nodes have been observed (see agent.metrics.recent_duration)
+DEFAULT_WEB_RESEARCH_SECONDS = 8.0
+DEFAULT_REFLECTION_SECONDS = 4.0
+# Summary tokens of one web_research result before any has been seen
+DEFAULT_TOKENS_PER_QUERY = 1500
+
+
+def follow_up_fan_out(
+    candidates: int,
+    loops_left: int,
+    remaining_seconds: float,
+    loop_seconds: float,
+    remaining_tokens: int,
+    tokens_per_query: int,
+    max_queries: int,
+) -> int:
+    """Return the number of follow-up queries to send now; 0 means stop researching.
+
+    Args:
+        candidates: Follow-up queries proposed by reflection.
+        loops_left: Research loops left under max_research_loops.
+        remaining_seconds: What is left of the request's latency budget.
+        loop_seconds: Expected wall time of one more loop.
+        remaining_tokens: What is left of the request's research token budget.
+        tokens_per_query: Expected summary tokens added by one query.
+        max_queries: Upper bound on the fan-out of one loop.
+    """
+    if candidates <= 0 or loops_left <= 0 or max_queries <= 0:
+        return 0
+    if remaining_seconds < loop_seconds or remaining_tokens < tokens_per_query:
+        return 0
+    loops = min(loops_left, max(1, int(remaining_seconds // max(loop_seconds, 1e-3))))
+    fan_out = math.ceil(candidates / loops)
+    return max(
+        1,
+        min(
+            fan_out,
+            candidates,
+            max_queries,
+            remaining_tokens // max(tokens_per_query, 1),
+        ),
+    )
@@ -0,0 +1,405 @@
+"""Keyword routing tables for `route_mode`, compiled into a single matcher."""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+
+# Every rule routes to web search. When one keyword belongs to several rules, the
+# first rule in this order is reported.
+ROUTE_RULES: Dict[str, List[str]] = {
+    # Các từ khóa nhận diện câu hỏi thời gian thực hoặc phụ thuộc dữ liệu cập nhật
+    "time": [
+        "hôm nay",
+        "today",
+        "hiện tại",
+        "bây giờ",
+        "mới nhất",
+        "latest",
+        "tuần này",
+        "tháng này",
+        "năm nay",
+        "this week",
+        "this month",
+        "this year",
+        "lịch",
+        "calendar",
+        "ngày",
+        "ngày gì",
+        "holiday",
+        "lễ",
+        "event",
+        "festival",
+        "sự kiện",
+        "đang diễn ra",
+        "happening",
+        "thời tiết",
+        "weather",
+        "giá",
+        "price",
+        "cổ phiếu",
+        "stock",
+        "tỷ giá",
+        "exchange rate",
+        "ở việt nam",
+        "tại việt nam",
+        "vn",
+        "in vietnam",
+    ],
+    # Từ khóa về công nghệ mới, sản phẩm mới, thông tin cập nhật
+    "new_tech": [
+        "mới",
+        "new",
+        "ra mắt",
+        "launch",
+        "phát hành",
+        "release",
+        "công bố",
+        "announce",
+        "cập nhật",
+        "update",
+        "phiên bản",
+        "version",
+        "beta",
+        "alpha",
+        "agentkit",
+        "gpt-5",
+        "gpt 5",
+        "claude",
+        "gemini",
+        "chatgpt",
+        "openai",
+        "ai mới",
+        "new ai",
+        "model mới",
+        "new model",
+        "công nghệ mới",
+        "new technology",
+        "startup",
+        "unicorn",
+        "ipo",
+        "funding",
+        "đầu tư",
+        "investment",
+        "breakthrough",
+        "đột phá",
+        "innovation",
+        "sáng tạo",
+    ],
+    # Từ khóa tri thức/hỏi đáp phổ biến -> ưu tiên tìm kiếm
+    "knowledge": [
+        "tin",
+        "news",
+        "ai là",
+        "what",
+        "when",
+        "where",
+        "who",
+        "how",
+        "định nghĩa",
+        "define",
+        "nguồn",
+        "source",
+        "website",
+        "so sánh",
+        "compare",
+        "thông tin",
+        "information",
+        "chi tiết",
+        "details",
+        "giải thích",
+        "explain",
+        "tìm hiểu",
+        "learn",
+        "research",
+        "nghiên cứu",
+    ],
+    # Tên công ty, sản phẩm công nghệ nổi tiếng
+    "tech_entity": [
+        "openai",
+        "google",
+        "microsoft",
+        "apple",
+        "meta",
+        "facebook",
+        "amazon",
+        "tesla",
+        "nvidia",
+        "anthropic",
+        "deepmind",
+        "hugging face",
+        "stability ai",
+        "chatgpt",
+        "claude",
+        "gemini",
+        "bard",
+        "copilot",
+        "midjourney",
+        "dall-e",
+        "github",
+        "stackoverflow",
+        "reddit",
+        "twitter",
+        "x.com",
+        "linkedin",
+    ],
+    # Số liệu, thống kê, hoặc thông tin có thể thay đổi / lỗi thời
+    "outdated": [
+        "bao nhiêu",
+        "how many",
+        "số lượng",
+        "count",
+        "thống kê",
+        "statistics",
+        "tỷ lệ",
+        "rate",
+        "percentage",
+        "phần trăm",
+        "top",
+        "ranking",
+        "xếp hạng",
+        "danh sách",
+        "list",
+        "best",
+        "tốt nhất",
+        "worst",
+        "tệ nhất",
+        "popular",
+        "phổ biến",
+        "trending",
+        "xu hướng",
+        "market share",
+        "thị phần",
+    ],
+    # Sự kiện, tin tức, hoặc tình hình đang thay đổi
+    "event": [
+        "có gì",
+        "what's",
+        "diễn ra",
+        "happening",
+        "xảy ra",
+        "occur",
+        "tình hình",
+        "situation",
+        "status",
+        "trạng thái",
+        "hiện trạng",
+        "vấn đề",
+        "issue",
+        "problem",
+        "crisis",
+        "khủng hoảng",
+    ],
+}
+
+# Only fires for short prompts (see SHORT_FACTUAL_MAX_WORDS).
+SHORT_FACTUAL_RULE = "short_factual"
+SHORT_FACTUAL_WORDS = ["là", "is", "are", "was", "were", "có", "have", "has"]
+SHORT_FACTUAL_MAX_WORDS = 10
+
+# Rules made of broad question words ("what", "how", "giải thích", ...). A prompt
+# routed to search by these alone is borderline and may be routed speculatively.
+BORDERLINE_RULES = frozenset({"knowledge", SHORT_FACTUAL_RULE})
+
+# Năm hoặc ngày cụ thể -> ưu tiên search
+PATTERN_RULES: Dict[str, str] = {
+    "year": r"\b20\d{2}\b",
+    "date": r"\b\d{1,2}/\d{1,2}/\d{2,4}\b",
+}
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Build a prefix-factored alternation so the regex engine walks it like a trie."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: Dict[str, Any]) -> str:
+        ends = "" in node
+        branches = [
+            re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        # Optional suffix: prefer the longest keyword, but the shorter one is a match too
+        return body + "?" if ends else body
+
+    return emit(trie)
+
+
+class RouteDecision(NamedTuple):
+    """Route picked by the keyword rules, with what made it fire."""
+
+    route: str
+    # Rule that decided the route (None for "llm"), plus every rule/keyword present
+    # when classify_route is called with explain=True.
+    rule: Optional[str]
+    rules: FrozenSet[str] = frozenset()
+    keywords: FrozenSet[str] = frozenset()
+
+
+class KeywordMatcher:
+    """All keyword rules and regex rules compiled into one regex.
+
+    Keywords are folded into a prefix-factored alternation, so at each position
+    the engine follows a single trie branch instead of retrying every keyword,
+    and the regex rules are extra named alternatives. `first` answers "does any
+    rule fire" with one scan that stops at the first hit; `match_all` reports
+    every rule and keyword present, with the same result as running `k in text`
+    for each keyword.
+    """
+
+    def __init__(
+        self, rules: Dict[str, List[str]], patterns: Optional[Dict[str, str]] = None
+    ):
+        """Compile keyword `rules` and regex `patterns` (both by rule name) into one matcher."""
+        patterns = patterns or {}
+        keywords = sorted({k for words in rules.values() for k in words})
+        self.rule_order = list(rules) + list(patterns)
+        self._rules_for: Dict[str, FrozenSet[str]] = {}
+        self._keywords_for: Dict[str, FrozenSet[str]] = {}
+        for kw in keywords:
+            # The regex reports the longest keyword at a position; everything it
+            # contains is present too (e.g. "new" inside "news").
+            contained = frozenset(k for k in keywords if k in kw)
+            self._keywords_for[kw] = contained
+            self._rules_for[kw] = frozenset(
+                rule for rule, words in rules.items() if contained.intersection(words)
+            )
+        alternatives = [f"(?P<kw>{_trie_regex(keywords)})"]
+        alternatives += [f"(?P<{name}>{pattern})" for name, pattern in patterns.items()]
+        self._regex = re.compile("|".join(alternatives))
+
+    def _rules_of(self, m: "re.Match[str]") -> FrozenSet[str]:
+        kw = m.group("kw")
+        return self._rules_for[kw] if kw is not None else frozenset([m.lastgroup or ""])
+
+    def first(self, text: str) -> Optional[str]:
+        """Return the rule of the earliest match in `text`, or None if nothing fires."""
+        m = self._regex.search(text)
+        if m is None:
+            return None
+        rules = self._rules_of(m)
+        return next(rule for rule in self.rule_order if rule in rules)
+
+    def match_all(self, text: str) -> tuple[FrozenSet[str], FrozenSet[str]]:
+        """Return every (rule, keyword) present in `text`, including overlapping ones."""
+        rules: Set[str] = set()
+        keywords: Set[str] = set()
+        pos = 0
+        while True:
+            m = self._regex.search(text, pos)
+            if m is None:
+                break
+            rules |= self._rules_of(m)
+            kw = m.group("kw")
+            if kw is not None:
+                keywords |= self._keywords_for[kw]
+            # Restart right after the match start so overlapping keywords are seen
+            pos = m.start() + 1
+        return frozenset(rules), frozenset(keywords)
+
+
+_ROUTE_MATCHER = KeywordMatcher(ROUTE_RULES, PATTERN_RULES)
+_SHORT_FACTUAL_MATCHER = KeywordMatcher({SHORT_FACTUAL_RULE: SHORT_FACTUAL_WORDS})
+
+
+def classify_route(text: str, explain: bool = False) -> RouteDecision:
+    """Decide between "generate_query" (web search) and "llm" for a lower-cased prompt.
+
+    With `explain=True` the decision also lists every rule and keyword found,
+    which costs a full scan instead of stopping at the first hit.
+    """
+    rule = _ROUTE_MATCHER.first(text)
+    # Nếu câu hỏi ngắn và có thể là factual question
+    if (
+        rule is None
+        and len(text.split()) <= SHORT_FACTUAL_MAX_WORDS
+        and _SHORT_FACTUAL_MATCHER.first(text) is not None
+    ):
+        rule = SHORT_FACTUAL_RULE
+    route = "llm" if rule is None else "generate_query"
+    if not explain:
+        return RouteDecision(route, rule)
+    rules, keywords = _ROUTE_MATCHER.match_all(text)
+    short_rules, short_keywords = _SHORT_FACTUAL_MATCHER.match_all(text)
+    return RouteDecision(route, rule, rules | short_rules, keywords | short_keywords)
+
+
+def is_borderline(decision: RouteDecision) -> bool:
+    """Whether a search decision rests only on `BORDERLINE_RULES`.
+
+    Needs a decision made with `explain=True`, which lists every rule that matched.
+    """
+    return (
+        decision.route == "generate_query"
+        and bool(decision.rules)
+        and decision.rules <= BORDERLINE_RULES
+    )
+
+
+@lru_cache(maxsize=4096)
+def _scan_message(
+    role: str, content: str
+) -> tuple[FrozenSet[str], FrozenSet[str], int]:
+    r"""Match one lower-cased "{role}: {content}\n" transcript segment (cached per message)."""
+    segment = f"{role}: {content}\n".lower()
+    rules, keywords = _ROUTE_MATCHER.match_all(segment)
+    short_rules, short_keywords = _SHORT_FACTUAL_MATCHER.match_all(segment)
+    return rules | short_rules, keywords | short_keywords, len(segment.split())
+
+
+def classify_conversation(
+    messages: List[AnyMessage], explain: bool = False
+) -> RouteDecision:
+    r"""Route a conversation like `classify_route` on its lower-cased `get_research_topic` text.
+
+    Multi-turn histories are matched one "User: ...\n" / "Assistant: ...\n" segment
+    at a time and each segment's result is cached, so a new turn only scans the
+    messages it has not seen yet instead of the whole transcript. No keyword
+    contains a newline, so matches never span two segments.
+    """
+    if len(messages) == 1:
+        return classify_route(
+            f"{messages[-1].content}".lower().strip(), explain=explain
+        )
+
+    rules: Set[str] = set()
+    keywords: Set[str] = set()
+    n_words = 0
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "User"
+        elif isinstance(message, AIMessage):
+            role = "Assistant"
+        else:
+            continue
+        content = (
+            message.content
+            if isinstance(message.content, str)
+            else f"{message.content}"
+        )
+        seg_rules, seg_keywords, seg_words = _scan_message(role, content)
+        rules.update(seg_rules)
+        n_words += seg_words
+        if explain:
+            keywords.update(seg_keywords)
+
+    rule = next((r for r in _ROUTE_MATCHER.rule_order if r in rules), None)
+    if (
+        rule is None
+        and SHORT_FACTUAL_RULE in rules
+        and n_words <= SHORT_FACTUAL_MAX_WORDS
+    ):
+        rule = SHORT_FACTUAL_RULE
+    route = "llm" if rule is None else "generate_query"
+    if not explain:
+        return RouteDecision(route, rule)
+    return RouteDecision(route, rule, frozenset(rules), frozenset(keywords))
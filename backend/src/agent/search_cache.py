@@ -0,0 +1,361 @@
+"""Cache of grounded web_research results, keyed by normalized query, model and day.
+
+`SearchCache` does key building and hit/miss accounting on top of a pluggable
+`CacheBackend`: an in-process LRU, SQLite (survives restarts) or Redis (shared
+by every worker). Cache failures are logged and treated as misses.
+"""
+
+import abc
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from typing_extensions import override
+
+from agent.executors import get_executor
+
+logger = logging.getLogger(__name__)
+
+# Cached payloads are plain JSON-serializable dicts:
+#   {
+#       "text": str,                                   # raw grounded answer text
+#       "grounding_chunks": [{"uri": str, "title": str}],
+#       "citations": [{"start_index": int, "end_index": int,
+#                      "segments": [{"label": str, "value": str}]}],
+#   }
+# Short urls are not cached because they depend on the branch id of the run
+# that reads the entry; they are re-resolved on every hit.
+Payload = Dict[str, Any]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    q = _WHITESPACE_RE.sub(" ", (query or "").casefold()).strip()
+    return q.strip(" ?!.,;:")
+
+
+def make_cache_key(query: str, model: str, date_bucket: str) -> str:
+    """Build the cache key of a query: model, date bucket and normalized query."""
+    return f"{model}|{date_bucket}|{normalize_query(query)}"
+
+
+class CacheBackend(abc.ABC):
+    """Storage interface for `SearchCache`.
+
+    Backends own TTL and size-based eviction; `SearchCache` only does key
+    building and hit/miss accounting. Backends that do I/O set `blocking`, and
+    async callers reach them through the "search_cache" executor.
+    """
+
+    blocking = True
+
+    def __init__(self, ttl: float, max_entries: int):
+        """Keep entries for `ttl` seconds, at most `max_entries` of them."""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Payload]:
+        """Return the live entry for `key`, or None."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Payload) -> None:
+        """Store `value` under `key` for `ttl` seconds."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Return the number of stored entries."""
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Process-local LRU with TTL."""
+
+    blocking = False
+
+    def __init__(self, ttl: float, max_entries: int):
+        """Create an empty in-process cache."""
+        super().__init__(ttl, max_entries)
+        self._data: OrderedDict[str, tuple[float, Payload]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @override
+    def get(self, key: str) -> Optional[Payload]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    @override
+    def set(self, key: str, value: Payload) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    @override
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @override
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite-backed cache that survives restarts; evicts least recently used rows."""
+
+    def __init__(self, ttl: float, max_entries: int, path: str):
+        """Open (and create if needed) the cache table in the SQLite file at `path`."""
+        super().__init__(ttl, max_entries)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache(last_used)"
+            )
+
+    @override
+    def get(self, key: str) -> Optional[Payload]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self.evictions += 1
+                return None
+            self._conn.execute(
+                "UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+        value: Payload = json.loads(row[0])
+        return value
+
+    @override
+    def set(self, key: str, value: Payload) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires_at, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl, now),
+            )
+            expired = self._conn.execute(
+                "DELETE FROM search_cache WHERE expires_at <= ?", (now,)
+            ).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM search_cache WHERE key IN ("
+                " SELECT key FROM search_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self.evictions += max(expired, 0) + max(overflow, 0)
+
+    @override
+    def __len__(self) -> int:
+        with self._lock:
+            return int(
+                self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            )
+
+    @override
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM search_cache")
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-compatible backend (e.g. the `langgraph-redis` compose service).
+
+    Entries expire through Redis TTLs; a sorted set of keys ordered by last use
+    enforces `max_entries`. Requires the optional `redis` package.
+    """
+
+    def __init__(
+        self, ttl: float, max_entries: int, url: str, prefix: str = "locaith:search:"
+    ):
+        """Connect to the Redis server at `url`; keys are namespaced by `prefix`."""
+        super().__init__(ttl, max_entries)
+        try:
+            import redis  # type: ignore[import-not-found, unused-ignore]
+        except ImportError as e:
+            raise ImportError(
+                "The redis search cache backend requires the `redis` package "
+                "(pip install 'agent[cache]')."
+            ) from e
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._index = f"{prefix}__lru__"
+
+    @override
+    def get(self, key: str) -> Optional[Payload]:
+        raw = self._client.get(self._prefix + key)
+        if raw is None:
+            self._client.zrem(self._index, key)
+            return None
+        self._client.zadd(self._index, {key: time.time()})
+        value: Payload = json.loads(raw)
+        return value
+
+    @override
+    def set(self, key: str, value: Payload) -> None:
+        pipe = self._client.pipeline()
+        pipe.set(
+            self._prefix + key, json.dumps(value, ensure_ascii=False), ex=int(self.ttl)
+        )
+        pipe.zadd(self._index, {key: time.time()})
+        pipe.execute()
+        overflow = self._client.zcard(self._index) - self.max_entries
+        if overflow > 0:
+            stale = self._client.zrange(self._index, 0, overflow - 1)
+            if stale:
+                pipe = self._client.pipeline()
+                pipe.delete(*[self._prefix + k.decode() for k in stale])
+                pipe.zrem(self._index, *stale)
+                pipe.execute()
+                self.evictions += len(stale)
+
+    @override
+    def __len__(self) -> int:
+        return int(self._client.zcard(self._index))
+
+    @override
+    def clear(self) -> None:
+        keys = self._client.zrange(self._index, 0, -1)
+        if keys:
+            self._client.delete(*[self._prefix + k.decode() for k in keys])
+        self._client.delete(self._index)
+
+
+class SearchCache:
+    """Cache of grounded Google Search results keyed by (model, date bucket, normalized query)."""
+
+    def __init__(self, backend: CacheBackend):
+        """Wrap `backend`, counting hits and misses."""
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, query: str, model: str, date_bucket: str) -> Optional[Payload]:
+        """Return the cached payload of a query, or None on a miss or cache failure."""
+        try:
+            value = self.backend.get(make_cache_key(query, model, date_bucket))
+        except Exception as e:
+            # A broken cache must never break research; treat it as a miss.
+            logger.warning("Search cache read failed: %s", e)
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, query: str, model: str, date_bucket: str, value: Payload) -> None:
+        """Cache the payload of a query; failures are logged and ignored."""
+        try:
+            self.backend.set(make_cache_key(query, model, date_bucket), value)
+        except Exception as e:
+            logger.warning("Search cache write failed: %s", e)
+
+    async def aget(self, query: str, model: str, date_bucket: str) -> Optional[Payload]:
+        """Async `get`; blocking backends are read off the event loop."""
+        if not self.backend.blocking:
+            return self.get(query, model, date_bucket)
+        value: Optional[Payload] = await get_executor("search_cache").run(
+            self.get, query, model, date_bucket
+        )
+        return value
+
+    async def aset(
+        self, query: str, model: str, date_bucket: str, value: Payload
+    ) -> None:
+        """Async `set`; blocking backends are written off the event loop."""
+        if not self.backend.blocking:
+            self.set(query, model, date_bucket, value)
+            return
+        await get_executor("search_cache").run(
+            self.set, query, model, date_bucket, value
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit, miss, eviction and size counters."""
+        try:
+            size = len(self.backend)
+        except Exception:
+            size = -1
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "size": size,
+        }
+
+
+_caches: Dict[Tuple[str, float, int, Optional[str]], Optional[SearchCache]] = {}
+_caches_lock = threading.Lock()
+
+
+def get_search_cache(
+    backend: str, ttl: float, max_entries: int, url: Optional[str] = None
+) -> Optional[SearchCache]:
+    """Return the shared SearchCache for these settings, or None when caching is disabled.
+
+    Args:
+        backend: One of "memory", "sqlite", "redis" or "none".
+        ttl: Entry lifetime in seconds.
+        max_entries: Maximum number of cached queries before LRU eviction.
+        url: SQLite file path or Redis URL; defaults to `search_cache.sqlite3`
+            and the REDIS_URI environment variable respectively.
+    """
+    key = (backend, ttl, max_entries, url)
+    with _caches_lock:
+        if key in _caches:
+            return _caches[key]
+        if backend == "memory":
+            cache = SearchCache(MemoryCacheBackend(ttl, max_entries))
+        elif backend == "sqlite":
+            cache = SearchCache(
+                SQLiteCacheBackend(ttl, max_entries, url or "search_cache.sqlite3")
+            )
+        elif backend == "redis":
+            redis_url = url or os.getenv("REDIS_URI") or "redis://localhost:6379"
+            cache = SearchCache(RedisCacheBackend(ttl, max_entries, redis_url))
+        elif backend in ("none", "", None):
+            cache = None
+        else:
+            raise ValueError(f"Unknown search cache backend: {backend}")
+        _caches[key] = cache
+        return cache
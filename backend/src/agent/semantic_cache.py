@@ -0,0 +1,242 @@
+"""Semantic answer cache for the direct llm path.
+
+Prompts are embedded (by default with a local hashing embedder, no model
+call) and kept in a fixed-size NumPy index; a prompt whose nearest cached
+neighbour is similar enough, and names the same numbers, dates and named
+tokens, gets that neighbour's answer.
+"""
+
+import hashlib
+import re
+import threading
+from typing import Callable, Dict, FrozenSet, Generic, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+EmbedFn = Callable[[str], np.ndarray]
+
+_V = TypeVar("_V")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Numbers, including dates, times and versions ("2025-01-31", "10:30", "3.11")
+_NUMBER_RE = re.compile(r"\d+(?:[.,:/-]\d+)*")
+# Code spans, called functions and snake_case identifiers
+_CODE_RE = re.compile(r"`([^`]+)`|(\w+)\(|\b(\w+_\w+)\b")
+# Words within a sentence; those with capitals are names ("Hà Nội", "NVDA", "iPhone")
+_INNER_WORD_RE = re.compile(r"(?<=[^\s.!?]) +(\w+)")
+_TIME_PHRASE_RE = re.compile(
+    r"\b(?:thứ (?:hai|ba|tư|năm|sáu|bảy)|chủ nhật|hôm nay|hôm qua|ngày mai|bình minh|hoàng hôn)\b"
+)
+_TIME_WORDS = frozenset(
+    "monday tuesday wednesday thursday friday saturday sunday weekend "
+    "january february march april may june july august september october november december "
+    "today tomorrow yesterday tonight morning afternoon evening night dawn dusk noon midnight "
+    "sáng trưa chiều tối đêm".split()
+)
+
+
+def exact_tokens(text: str) -> FrozenSet[str]:
+    """Return the tokens two prompts must share to be answered alike.
+
+    These are the numbers, dates and times of day, and named tokens (proper
+    names, identifiers, code spans) in `text`. Similar wording says nothing
+    about them: "xin nghỉ thứ hai" and "xin nghỉ thứ sáu" embed almost alike.
+    """
+    text = text or ""
+    folded = text.casefold()
+    tokens = set(_NUMBER_RE.findall(text))
+    tokens.update(_TIME_PHRASE_RE.findall(folded))
+    tokens.update(t for t in _TOKEN_RE.findall(folded) if t in _TIME_WORDS)
+    for groups in _CODE_RE.findall(text):
+        tokens.update(g for g in groups if g)
+    tokens.update(w for w in _INNER_WORD_RE.findall(text) if w != w.lower())
+    return frozenset(tokens)
+
+
+class HashingEmbedder:
+    """Deterministic local embedder based on the hashing trick.
+
+    Words and character trigrams are hashed into a fixed number of buckets and
+    the result is L2-normalized. It needs no model or network call, is stable
+    across processes (unlike `hash()`), and is good enough to catch repeated or
+    lightly reworded chit-chat.
+    """
+
+    def __init__(self, dim: int = 512):
+        """Embed into `dim` buckets."""
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, (1.0 if (value >> 63) & 1 else -1.0)
+
+    def __call__(self, text: str) -> np.ndarray:
+        """Return the L2-normalized embedding of `text`."""
+        vec = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN_RE.findall((text or "").casefold())
+        for token in tokens:
+            # Whole words carry most of the meaning; numbers must match exactly
+            idx, sign = self._bucket("w:" + token)
+            vec[idx] += sign * (3.0 if token.isdigit() else 1.0)
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                idx, sign = self._bucket("c:" + padded[i : i + 3])
+                vec[idx] += sign * 0.5
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+
+class VectorStore(Generic[_V]):
+    """Fixed-capacity cosine-similarity index over a single NumPy matrix.
+
+    Vectors are expected to be L2-normalized, so similarity is a dot product.
+    When full, the slot to overwrite is picked by `eviction`: "lru" drops the
+    least recently hit entry, "fifo" the oldest insertion.
+    """
+
+    def __init__(self, dim: int, capacity: int, eviction: str = "lru"):
+        """Allocate room for `capacity` vectors of `dim` floats."""
+        if eviction not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.dim = dim
+        self.capacity = capacity
+        self.eviction = eviction
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._values: List[Optional[_V]] = [None] * capacity
+        self._inserted = np.zeros(capacity, dtype=np.int64)
+        self._used = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._clock = 0
+
+    def __len__(self) -> int:
+        """Return the number of stored vectors."""
+        return self._size
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def search(
+        self,
+        vector: np.ndarray,
+        threshold: float = -1.0,
+        accept: Optional[Callable[[_V], bool]] = None,
+    ) -> tuple[Optional[_V], float]:
+        """Return the nearest stored value and its similarity, or (None, 0.0) if empty.
+
+        The value is None when the similarity is below `threshold` or `accept`
+        rejects it. Only a returned value counts as a hit for LRU eviction.
+        """
+        if self._size == 0:
+            return None, 0.0
+        scores = self._vectors[: self._size] @ vector
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        value = self._values[best]
+        if (
+            value is None
+            or score < threshold
+            or (accept is not None and not accept(value))
+        ):
+            return None, score
+        self._used[best] = self._tick()
+        return value, score
+
+    def add(self, vector: np.ndarray, value: _V) -> None:
+        """Store `value` under `vector`, evicting one entry when full."""
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            order = self._used if self.eviction == "lru" else self._inserted
+            slot = int(np.argmin(order))
+        now = self._tick()
+        self._vectors[slot] = vector
+        self._values[slot] = value
+        self._inserted[slot] = now
+        self._used[slot] = now
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._vectors[:] = 0
+        self._values = [None] * self.capacity
+        self._inserted[:] = 0
+        self._used[:] = 0
+        self._size = 0
+
+
+class SemanticCache:
+    """Nearest-neighbour answer cache for prompts that do not need fresh data.
+
+    A hit needs both the similarity `threshold` and the same `exact_tokens`:
+    the hashing embedder scores prompts that differ only in a number, a day or
+    a name as near-duplicates.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        capacity: int = 2048,
+        eviction: str = "lru",
+        embed_fn: Optional[EmbedFn] = None,
+        dim: int = 512,
+    ):
+        """Answers are returned for prompts at least `threshold` cosine-similar to a cached one.
+
+        `embed_fn` defaults to a `HashingEmbedder` of `dim` dimensions.
+        """
+        self.threshold = threshold
+        self.embed_fn = embed_fn or HashingEmbedder(dim)
+        self.store: VectorStore[Tuple[FrozenSet[str], str]] = VectorStore(
+            dim, capacity, eviction
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text: str) -> np.ndarray:
+        vec = np.asarray(self.embed_fn(text), dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Return the cached answer for the closest prompt above `threshold`, if any."""
+        vec = self._embed(text)
+        tokens = exact_tokens(text)
+        with self._lock:
+            entry, _ = self.store.search(vec, self.threshold, lambda e: e[0] == tokens)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def add(self, text: str, answer: str) -> None:
+        """Cache `answer` for prompt `text`."""
+        vec = self._embed(text)
+        tokens = exact_tokens(text)
+        with self._lock:
+            self.store.add(vec, (tokens, answer))
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit, miss and size counters."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.store)}
+
+
+_caches: Dict[Tuple[float, int, str], SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(threshold: float, capacity: int, eviction: str) -> SemanticCache:
+    """Return the shared SemanticCache for these settings."""
+    key = (threshold, capacity, eviction)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = SemanticCache(
+                threshold=threshold, capacity=capacity, eviction=eviction
+            )
+            _caches[key] = cache
+        return cache
@@ -0,0 +1,116 @@
+"""Single-flight coalescing of identical concurrent model calls.
+
+Callers that ask for the same key while a call for it is in flight wait for
+that call instead of starting their own, and all of them get its result or
+its exception. Nothing is cached: once the call finishes the key is free
+again (the search and semantic caches keep results around).
+
+Threads (sync graph runs, sync nodes run in executor threads) coalesce through
+`SingleFlight.do`; coroutines coalesce per event loop through `SingleFlight.ado`.
+An async call is cancelled only when every caller waiting for it has been
+cancelled.
+"""
+
+import asyncio
+import functools
+import threading
+import weakref
+from typing import Any, Callable, Coroutine, Dict, Hashable
+
+from agent.metrics import registry
+
+COALESCED = registry.counter(
+    "locaith_singleflight_calls_total",
+    "Calls through single-flight groups: leader (made the call) or shared (joined one).",
+)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "task", "waiters")
+
+    # Set for async calls only
+    task: asyncio.Task[Any]
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+def _consume_error(task: asyncio.Task[Any]) -> None:
+    # Nobody may be left waiting; retrieve the error so asyncio does not log it
+    if not task.cancelled():
+        task.exception()
+
+
+def _release(
+    calls: Dict[Hashable, _Call], key: Hashable, call: _Call, _: asyncio.Task[Any]
+) -> None:
+    # Free the key unless a cancelled call has already been replaced by a new one
+    if calls.get(key) is call:
+        del calls[key]
+
+
+class SingleFlight:
+    """Coalesces concurrent calls by key; `name` labels its metrics."""
+
+    def __init__(self, name: str):
+        """Create an empty group labelled `name`."""
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._async_calls: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[Hashable, _Call]
+        ] = weakref.WeakKeyDictionary()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run `fn()` unless a call for `key` is in flight in another thread; then share it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+        COALESCED.inc(group=self.name, role="leader" if leader else "shared")
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def ado(
+        self, key: Hashable, factory: Callable[[], Coroutine[Any, Any, Any]]
+    ) -> Any:
+        """Await `factory()` unless a call for `key` is in flight on this loop; then share it."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+        call = calls.get(key)
+        leader = call is None
+        if call is None:
+            call = calls[key] = _Call()
+            call.task = loop.create_task(factory())
+            call.task.add_done_callback(_consume_error)
+            call.task.add_done_callback(functools.partial(_release, calls, key, call))
+        COALESCED.inc(group=self.name, role="leader" if leader else "shared")
+        task = call.task
+        call.waiters += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not task.done():
+                # Every caller gave up: stop the call and let the next caller start afresh
+                if calls.get(key) is call:
+                    del calls[key]
+                task.cancel()
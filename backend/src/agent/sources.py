@@ -0,0 +1,151 @@
+"""Compact source records and short-URL rewriting for research answers.
+
+`sources_gathered` keeps one record per URL; the registry maps the short URLs
+shown to the model back to the original ones.
+"""
+
+import re
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TypedDict,
+    cast,
+)
+
+from agent.utils import SHORT_URL_PREFIX
+
+# short_url -> original URL, built by web_research and used to rewrite the answer
+SourceRegistry = Dict[str, str]
+
+# Matches every short URL produced by `resolve_url_list` in one scan. Matching the
+# whole URL (not each known one in turn) keeps `.../id/0-1` from rewriting the
+# start of `.../id/0-10`.
+SHORT_URL_RE = re.compile(re.escape(SHORT_URL_PREFIX) + r"[\w-]+")
+
+
+class Source(TypedDict):
+    """One gathered source, stored once per original URL.
+
+    `refs` lists the citation segments that cite it as "<query id>:<citation index>"
+    strings, so the label and URLs are not repeated for every segment. Records are
+    plain dicts so checkpoints need no custom (de)serialization.
+    """
+
+    url: str
+    label: str
+    short_url: Optional[str]
+    refs: List[str]
+
+
+def _original_url(source: Mapping[str, Any]) -> Optional[str]:
+    url: Optional[str] = source.get("url") or source.get("value") or source.get("link")
+    return url
+
+
+def as_source(source: Mapping[str, Any]) -> Optional[Source]:
+    """Convert a record, citation segment or older source dict to a `Source` (None without a URL)."""
+    if "refs" in source and "url" in source:
+        return cast(Source, source)
+    url = _original_url(source)
+    if not url:
+        return None
+    return {
+        "url": url,
+        "label": source.get("label") or source.get("title") or url,
+        "short_url": source.get("short_url"),
+        "refs": [],
+    }
+
+
+def sources_from_citations(
+    citations: List[Dict[str, Any]], query_id: Any
+) -> List[Source]:
+    """Compact, per-URL sources of one web_research result."""
+    by_url: Dict[str, Source] = {}
+    for index, citation in enumerate(citations):
+        ref = f"{query_id}:{index}"
+        for segment in citation["segments"]:
+            url = segment.get("value")
+            if not url:
+                continue
+            source = by_url.get(url)
+            if source is None:
+                source = by_url[url] = {
+                    "url": url,
+                    "label": segment.get("label") or url,
+                    "short_url": segment.get("short_url"),
+                    "refs": [],
+                }
+            if not source["refs"] or source["refs"][-1] != ref:
+                source["refs"].append(ref)
+    return list(by_url.values())
+
+
+def merge_sources(
+    left: Optional[Sequence[Mapping[str, Any]]],
+    right: Optional[Sequence[Mapping[str, Any]]],
+) -> List[Source]:
+    """State reducer: one `Source` per URL, first label/short URL wins, refs are unioned.
+
+    Records already in state are never mutated; a record that gains refs is replaced.
+    Also accepts citation segments and older source dicts on either side.
+    """
+    merged: List[Source] = []
+    positions: Dict[str, int] = {}
+    for record in [*(left or []), *(right or [])]:
+        source = as_source(record)
+        if source is None:
+            continue
+        i = positions.get(source["url"])
+        if i is None:
+            positions[source["url"]] = len(merged)
+            merged.append(source)
+            continue
+        current = merged[i]
+        new_refs = [ref for ref in source["refs"] if ref not in current["refs"]]
+        if new_refs or (not current["short_url"] and source["short_url"]):
+            merged[i] = {
+                **current,
+                "short_url": current["short_url"] or source["short_url"],
+                "refs": current["refs"] + new_refs,
+            }
+    return merged
+
+
+def register_short_urls(sources: Iterable[Mapping[str, Any]]) -> SourceRegistry:
+    """Map the short URL of every source to its original URL."""
+    registry: SourceRegistry = {}
+    for record in sources:
+        source = as_source(record)
+        if source is not None and source["short_url"]:
+            registry.setdefault(source["short_url"], source["url"])
+    return registry
+
+
+def merge_source_registry(
+    left: Optional[SourceRegistry], right: Optional[SourceRegistry]
+) -> SourceRegistry:
+    """State reducer: union of two registries; the first mapping seen for a short URL wins."""
+    merged = dict(left or {})
+    for short_url, url in (right or {}).items():
+        merged.setdefault(short_url, url)
+    return merged
+
+
+def source_registry_from_state(state: Mapping[str, Any]) -> SourceRegistry:
+    """Source registry of a run; rebuilt from `sources_gathered` for older checkpoints."""
+    return state.get("source_registry") or register_short_urls(
+        state.get("sources_gathered") or []
+    )
+
+
+def rewrite_short_urls(text: str, registry: SourceRegistry) -> str:
+    """Replace every known short URL in `text` with its original URL in a single pass."""
+    if not registry:
+        return text
+    return SHORT_URL_RE.sub(lambda m: registry.get(m.group(0), m.group(0)), text)
@@ -0,0 +1,77 @@
+"""Budget and bookkeeping for speculative routing of borderline prompts.
+
+When `speculative_routing` is on, prompts that only match weak search keywords
+(see `agent.routing.is_borderline`) go to the `speculate` node, which starts the
+direct llm draft and query generation together and keeps whichever a fast
+classifier picks. Every speculation pays for one call that is thrown away, so
+runs are capped process-wide by concurrency and by rate; over budget, the
+prompt takes its keyword route without speculating.
+"""
+
+import functools
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from agent.metrics import registry
+
+SPECULATIONS = registry.counter(
+    "locaith_speculations_total",
+    "Speculative routing outcomes: chat, search, undecided (classifier failed) or skipped (over budget).",
+)
+
+
+class SpeculationBudget:
+    """At most `max_in_flight` concurrent speculations and `max_per_minute` starts a minute."""
+
+    def __init__(self, max_in_flight: int, max_per_minute: int):
+        """Start with no speculation in flight."""
+        self.max_in_flight = max_in_flight
+        self.max_per_minute = max_per_minute
+        self._in_flight = 0
+        self._starts: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """Take a slot for one speculation; False when over either limit."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._starts and now - self._starts[0] >= 60.0:
+                self._starts.popleft()
+            if (
+                self._in_flight >= self.max_in_flight
+                or len(self._starts) >= self.max_per_minute
+            ):
+                return False
+            self._in_flight += 1
+            self._starts.append(now)
+            return True
+
+    def release(self) -> None:
+        """Give back the slot taken by `try_acquire`."""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+
+@functools.lru_cache(maxsize=8)
+def get_speculation_budget(
+    max_in_flight: int, max_per_minute: int
+) -> SpeculationBudget:
+    """Process-wide budget shared by every graph run with the same limits."""
+    return SpeculationBudget(max_in_flight, max_per_minute)
+
+
+def parse_verdict(text: Optional[str]) -> Optional[str]:
+    """Read "chat" or "search" from the classifier's reply; None when it is neither."""
+    text = (text or "").strip().lower()
+    if "chat" in text:
+        return "chat"
+    if "search" in text:
+        return "search"
+    return None
+
+
+def note_speculation(outcome: str) -> None:
+    """Count one speculative routing outcome."""
+    SPECULATIONS.inc(outcome=outcome)
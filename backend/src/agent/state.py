@@ -1,24 +1,36 @@
 from __future__ import annotations
 
+import operator
 from dataclasses import dataclass, field
 from typing import TypedDict
 
 from langgraph.graph import add_messages
 from typing_extensions import Annotated
 
-
-import operator
+from agent.context import Segment, merge_segments
+from agent.sources import Source, SourceRegistry, merge_source_registry, merge_sources
 
 
 class OverallState(TypedDict):
     messages: Annotated[list, add_messages]
     search_query: Annotated[list, operator.add]
     web_research_result: Annotated[list, operator.add]
-    sources_gathered: Annotated[list, operator.add]
+    # Deduplicated, token-counted copy of web_research_result used to build prompts
+    research_context: Annotated[list[Segment], merge_segments]
+    # One agent.sources.Source record per URL, with the citation segments citing it
+    sources_gathered: Annotated[list[Source], merge_sources]
+    # short_url -> original URL, built by web_research
+    source_registry: Annotated[SourceRegistry, merge_source_registry]
     initial_search_query_count: int
     max_research_loops: int
     research_loop_count: int
+    # time.time() when query generation started; the research latency budget runs from here
+    research_started_at: float
     reasoning_model: str
+    # Branch kept by the speculate node: "llm" or "generate_query"
+    speculative_route: str
+    # fast | balanced | thorough; overrides Configuration.execution_profile per request
+    execution_profile: str
     # Guild5 additions
     plan: dict
     task_kind: str
@@ -29,9 +41,17 @@ class OverallState(TypedDict):
 class ReflectionState(TypedDict):
     is_sufficient: bool
     knowledge_gap: str
-    follow_up_queries: Annotated[list, operator.add]
+    # Follow-ups of the latest reflection only; research fans out from its head
+    follow_up_queries: list[str]
     research_loop_count: int
     number_of_ran_queries: int
+    # Read by evaluate_research, which only sees the keys of this schema
+    execution_profile: str
+    max_research_loops: int
+    research_started_at: float
+    # Summary tokens and deduplicated summaries gathered so far (set by reflection)
+    research_tokens: int
+    research_segments: int
 
 
 class Query(TypedDict):
@@ -45,7 +65,7 @@ class QueryGenerationState(TypedDict):
 
 class WebSearchState(TypedDict):
     search_query: str
-    id: str
+    id: int
 
 
 @dataclass(kw_only=True)
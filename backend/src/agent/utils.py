@@ -1,6 +1,10 @@
-from typing import Any, Dict, List
+import heapq
+from typing import Any, Dict, Iterator, List
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
 
+# Short citation URLs shown to the model in place of the long grounding redirects
+SHORT_URL_PREFIX = "https://vertexaisearch.cloud.google.com/id/"
+
 
 def get_research_topic(messages: List[AnyMessage]) -> str:
     """
@@ -24,18 +28,27 @@ def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
     Ensures each original URL gets a consistent shortened form while maintaining uniqueness.
     """
-    prefix = f"https://vertexaisearch.cloud.google.com/id/"
-    urls = [site.web.uri for site in urls_to_resolve]
+    return resolve_url_list([site.web.uri for site in urls_to_resolve], id)
+
 
+def resolve_url_list(urls: List[str], id: int) -> Dict[str, str]:
+    """Shorten plain URL strings like `resolve_urls` (e.g. grounding chunks read back from a cache)."""
     # Create a dictionary that maps each unique URL to its first occurrence index
     resolved_map = {}
     for idx, url in enumerate(urls):
         if url not in resolved_map:
-            resolved_map[url] = f"{prefix}{id}-{idx}"
+            resolved_map[url] = f"{SHORT_URL_PREFIX}{id}-{idx}"
 
     return resolved_map
 
 
+def _citation_marker(citation_info: Dict[str, Any]) -> str:
+    return "".join(
+        f" [{segment['label']}]({segment['short_url']})"
+        for segment in citation_info["segments"]
+    )
+
+
 def insert_citation_markers(text, citations_list):
     """
     Inserts citation markers into a text string based on start and end indices.
@@ -50,6 +63,57 @@ def insert_citation_markers(text, citations_list):
     Returns:
         str: The text with citation markers inserted.
     """
+    return "".join(iter_citation_markers(text, citations_list))
+
+
+def iter_citation_markers(text: str, citations_list: List[Dict[str, Any]]) -> Iterator[str]:
+    """Yield the output of `insert_citation_markers` piece by piece.
+
+    Text pieces and markers come out in document order, so a consumer can
+    start streaming before every citation has been placed. The work is one
+    heap pass over the citations plus one slice per piece, instead of
+    rebuilding the whole string once per citation.
+
+    Ordering matches the original end-to-start insertion exactly: markers
+    sharing an end index appear by ascending start index, and exact ties in
+    reverse list order. End indices past the end of the text (Gemini reports
+    UTF-8 byte offsets, so non-ASCII answers produce them) are replayed on the
+    short tail the original would have appended.
+    """
+    if any(c["end_index"] < 0 for c in citations_list):
+        # Negative slice indices depend on earlier insertions; keep the original algorithm
+        yield _insert_citation_markers_sequential(text, citations_list)
+        return
+
+    text_len = len(text)
+    heap = [
+        (c["end_index"], c["start_index"], -i)
+        for i, c in enumerate(citations_list)
+        if c["end_index"] <= text_len
+    ]
+    heapq.heapify(heap)
+    pos = 0
+    while heap:
+        end_idx, _, neg_i = heapq.heappop(heap)
+        if end_idx > pos:
+            yield text[pos:end_idx]
+            pos = end_idx
+        yield _citation_marker(citations_list[-neg_i])
+    if pos < text_len:
+        yield text[pos:]
+
+    overflow = [c for c in citations_list if c["end_index"] > text_len]
+    if overflow:
+        tail = ""
+        for citation_info in sorted(
+            overflow, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+        ):
+            at = citation_info["end_index"] - text_len
+            tail = tail[:at] + _citation_marker(citation_info) + tail[at:]
+        yield tail
+
+
+def _insert_citation_markers_sequential(text: str, citations_list: List[Dict[str, Any]]) -> str:
     # Sort citations by end_index in descending order.
     # If end_index is the same, secondary sort by start_index descending.
     # This ensures that insertions at the end of the string don't affect
@@ -64,12 +128,9 @@ def insert_citation_markers(text, citations_list):
         # but since we iterate from the end, they remain valid for insertion
         # relative to the parts of the string already processed.
         end_idx = citation_info["end_index"]
-        marker_to_insert = ""
-        for segment in citation_info["segments"]:
-            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
         # Insert the citation marker at the original end_idx position
         modified_text = (
-            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+            modified_text[:end_idx] + _citation_marker(citation_info) + modified_text[end_idx:]
         )
 
     return modified_text
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from agent.utils import (
+    _insert_citation_markers_sequential,
+    insert_citation_markers,
+    iter_citation_markers,
+)
+
+ALPHABET = "abc xyz.đườngệ"
+
+
+def random_case(rng: random.Random):
+    text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 60)))
+    citations = []
+    for _ in range(rng.randint(0, 8)):
+        # Out-of-range ends (UTF-8 byte offsets) and a small range of values so ties are common
+        end = rng.randint(0, len(text) + 12)
+        if rng.random() < 0.05:
+            end = -rng.randint(1, 5)
+        start = rng.choice([0, rng.randint(0, max(end, 0))])
+        segments = [
+            {
+                "label": rng.choice(["a", "bb", ""]),
+                "short_url": rng.choice(["u1", "u-22", None]),
+            }
+            for _ in range(rng.randint(0, 3))
+        ]
+        citations.append({"start_index": start, "end_index": end, "segments": segments})
+    return text, citations
+
+
+def _citation(start, end, *labels):
+    return {
+        "start_index": start,
+        "end_index": end,
+        "segments": [{"label": label, "short_url": f"u/{label}"} for label in labels],
+    }
+
+
+@pytest.mark.parametrize(
+    "text, citations",
+    [
+        ("", []),
+        ("Một câu.", []),
+        ("ab. cd.", [_citation(0, 3, "x"), _citation(4, 7, "y", "z")]),
+        # Shared end index: ascending start, exact ties in reverse list order
+        (
+            "ab. cd.",
+            [_citation(4, 7, "late"), _citation(0, 7, "early"), _citation(0, 7, "tie")],
+        ),
+        # End index past the end of the text
+        ("đường.", [_citation(0, 6, "a"), _citation(0, 11, "b"), _citation(0, 9, "c")]),
+        ("abc", [_citation(0, -1, "neg"), _citation(0, 2, "x")]),
+    ],
+)
+def test_insert_citation_markers_matches_sequential_insertion(text, citations):
+    expected = _insert_citation_markers_sequential(text, citations)
+    assert insert_citation_markers(text, citations) == expected
+    assert "".join(iter_citation_markers(text, citations)) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_insert_citation_markers_matches_sequential_insertion_on_random_inputs(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        text, citations = random_case(rng)
+        expected = _insert_citation_markers_sequential(text, citations)
+        assert insert_citation_markers(text, citations) == expected, (text, citations)
+        assert "".join(iter_citation_markers(text, citations)) == expected, (
+            text,
+            citations,
+        )
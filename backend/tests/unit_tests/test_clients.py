@@ -0,0 +1,56 @@
+import asyncio
+
+from agent.clients import (
+    SEMAPHORE_IN_FLIGHT,
+    SEMAPHORE_QUEUE_DEPTH,
+    SEMAPHORE_SATURATION,
+    SEMAPHORE_WAIT,
+    get_semaphore,
+)
+
+LABELS = (("workload", "test_metered"),)
+
+
+def _gauges():
+    return (
+        SEMAPHORE_QUEUE_DEPTH._values.get(LABELS, 0),
+        SEMAPHORE_IN_FLIGHT._values.get(LABELS, 0),
+        SEMAPHORE_SATURATION._values.get(LABELS, 0),
+    )
+
+
+def test_named_semaphore_reports_queue_depth_in_flight_and_wait():
+    async def run():
+        semaphore = get_semaphore("test_metered", 1)
+        assert get_semaphore("test_metered", 5) is semaphore
+        release = asyncio.Event()
+
+        async def hold():
+            async with semaphore:
+                await release.wait()
+
+        holders = [asyncio.create_task(hold()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        during = _gauges()
+        release.set()
+        await asyncio.gather(*holders)
+        return during
+
+    waits = SEMAPHORE_WAIT._values.get(LABELS, [0])[-1]
+    assert asyncio.run(run()) == (1, 1, 1.0)
+    assert _gauges() == (0, 0, 0.0)
+    assert SEMAPHORE_WAIT._values[LABELS][-1] == waits + 2
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        semaphore = get_semaphore("test_metered", 1)
+        async with semaphore:
+            waiter = asyncio.create_task(semaphore.acquire())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            return _gauges()
+
+    assert asyncio.run(run()) == (0, 1, 1.0)
+    assert _gauges() == (0, 0, 0.0)
@@ -0,0 +1,22 @@
+import importlib
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+# `agent.graph` as an attribute is the compiled graph, not the module
+agent_graph = importlib.import_module("agent.graph")
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ("Xin chào", "Xin chào"),
+        ("", ""),
+        (
+            [{"type": "text", "text": "a"}, "b", {"type": "thinking", "thinking": "x"}],
+            "ab",
+        ),
+    ],
+)
+def test_chunk_text_reads_string_and_part_content(content, expected):
+    assert agent_graph._chunk_text(AIMessageChunk(content=content)) == expected
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from agent import image
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fake_generate_one(prompt, aspect_ratio):
+        return prompt.encode(), "image/png", f"caption {prompt}"
+
+    async def fake_store(session_id, image_bytes, mime_type):
+        if image_bytes == b"broken":
+            raise OSError("disk full")
+        return image.StoredImage("0" * 32, image_bytes, mime_type)
+
+    monkeypatch.setattr(image, "_generate_one", fake_generate_one)
+    monkeypatch.setattr(image, "_store", fake_store)
+    app = FastAPI()
+    app.include_router(image.router)
+    return TestClient(app)
+
+
+def test_failed_item_is_reported_without_ending_the_stream(client):
+    response = client.post(
+        "/api/image/generate/batch", json={"prompts": ["a", "broken", "c"]}
+    )
+    events = [json.loads(line) for line in response.text.splitlines()]
+    items = {e["index"]: e for e in events if "index" in e}
+    assert [items[i]["status"] for i in range(3)] == ["ok", "error", "ok"]
+    assert "disk full" in items[1]["detail"]
+    assert events[-1] == {"done": True, "ok": 2, "failed": 1}
+
+
+def test_last_image_needs_a_session_id(client):
+    assert client.get("/api/image/last").status_code == 400
+    assert (
+        client.post("/api/image/edit", data={"prompt": "brighter"}).status_code == 400
+    )
+    response = client.get("/api/image/last", headers={"X-Session-Id": "s"})
+    assert response.status_code == 404
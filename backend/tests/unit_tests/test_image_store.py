@@ -0,0 +1,53 @@
+import threading
+import time
+
+from agent.image_store import ImageStore
+
+
+def test_workers_sharing_a_directory_keep_each_others_session_images(tmp_path):
+    a = ImageStore(directory=str(tmp_path))
+    b = ImageStore(directory=str(tmp_path))
+
+    x = a.put("s", b"x", "image/png")
+    y = b.put("s", b"y", "image/png")
+    z = a.put("s", b"z", "image/png")
+
+    for store in (a, b):
+        assert [store.get("s", id) is not None for id in (x, y, z)] == [
+            True,
+            True,
+            True,
+        ]
+        assert store.last("s").id == z
+
+
+def test_session_keeps_newest_images_only():
+    store = ImageStore(session_images=2)
+    ids = [store.put("s", bytes([i]), "image/png") for i in range(3)]
+    assert store.get("s", ids[0]) is None
+    assert store.last("s").id == ids[2]
+    assert store.get("other", ids[2]) is None
+
+
+def test_reads_do_not_wait_for_a_slow_disk_write(tmp_path):
+    store = ImageStore(directory=str(tmp_path))
+    x = store.put("s", b"x", "image/png")
+    release = threading.Event()
+    write_atomic = store._write_atomic
+
+    def slow_write(path, data):
+        release.wait(5)
+        write_atomic(path, data)
+
+    store._write_atomic = slow_write
+    writer = threading.Thread(target=store.put, args=("s", b"y", "image/png"))
+    writer.start()
+    try:
+        start = time.monotonic()
+        assert store.fetch(x).data == b"x"
+        assert store.get("s", x) is not None
+        assert time.monotonic() - start < 1
+    finally:
+        release.set()
+        writer.join()
+    assert store.last("s").data == b"y"
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from agent import metrics
+from agent.metrics import Counter, Gauge, Histogram, Registry, instrument_node
+
+
+def test_label_values_are_escaped():
+    counter = Counter("c_total", "Help.")
+    counter.inc(query='say "hi"\\\nbye')
+    assert counter.render().splitlines() == [
+        "# HELP c_total Help.",
+        "# TYPE c_total counter",
+        'c_total{query="say \\"hi\\"\\\\\\nbye"} 1',
+    ]
+
+
+def test_gauge_renders_its_type_and_set_values():
+    gauge = Gauge("g", "Help.")
+    gauge.inc(3, a="x")
+    gauge.set(1.5, a="x")
+    gauge.inc(-2, a="y")
+    assert gauge.render().splitlines()[1:] == [
+        "# TYPE g gauge",
+        'g{a="x"} 1.5',
+        'g{a="y"} -2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    histogram = Histogram("h_seconds", "Help.", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, node="n")
+    assert histogram.render().splitlines()[2:] == [
+        'h_seconds_bucket{node="n",le="0.1"} 1',
+        'h_seconds_bucket{node="n",le="1"} 3',
+        'h_seconds_bucket{node="n",le="+Inf"} 4',
+        'h_seconds_sum{node="n"} 6.05',
+        'h_seconds_count{node="n"} 4',
+    ]
+
+
+def test_registry_returns_the_registered_metric_and_renders_all():
+    registry = Registry()
+    counter = registry.counter("a_total", "A.")
+    assert registry.counter("a_total", "A.") is counter
+    registry.gauge("b", "B.").set(2)
+    counter.inc()
+    assert registry.render() == (
+        "# HELP a_total A.\n# TYPE a_total counter\na_total 1\n# HELP b B.\n# TYPE b gauge\nb 2\n"
+    )
+
+
+def _runs(node, status):
+    entry = metrics.NODE_DURATION._values.get((("node", node), ("status", status)))
+    return entry[-1] if entry else 0
+
+
+def sync_node(state, config=None):
+    if state.get("fail"):
+        raise ValueError("boom")
+    return {"ok": True}
+
+
+async def async_node(state, config=None):
+    if state.get("fail"):
+        raise ValueError("boom")
+    return {"ok": True}
+
+
+def generator_node(state, config=None):
+    yield {"ok": True}
+    if state.get("fail"):
+        raise ValueError("boom")
+
+
+@pytest.mark.parametrize(
+    "node, run",
+    [
+        (sync_node, lambda fn, state: fn(state)),
+        (async_node, lambda fn, state: asyncio.run(fn(state))),
+        (generator_node, lambda fn, state: list(fn(state))),
+    ],
+)
+def test_instrument_node_records_ok_and_error_runs(node, run):
+    name = f"test_{node.__name__}"
+    wrapped = instrument_node(name, node)
+    assert wrapped.__name__ == node.__name__
+
+    run(wrapped, {})
+    with pytest.raises(ValueError):
+        run(wrapped, {"fail": True})
+
+    assert _runs(name, "ok") == 1
+    assert _runs(name, "error") == 1
+    assert metrics.recent_duration(name, -1.0) >= 0
+
+
+def test_instrument_node_counts_model_calls_retries_and_cache_lookups():
+    def node(state):
+        metrics.note_model_call("m", 10, 5)
+        metrics.note_retry()
+        metrics.note_cache("search", hit=True)
+        return {}
+
+    instrument_node("test_notes", node)({})
+    assert metrics.MODEL_CALLS._values[(("model", "m"), ("node", "test_notes"))] == 1
+    assert (
+        metrics.MODEL_TOKENS._values[
+            (("kind", "prompt"), ("model", "m"), ("node", "test_notes"))
+        ]
+        == 10
+    )
+    assert metrics.NODE_RETRIES._values[(("node", "test_notes"),)] == 1
+    key = (("cache", "search"), ("node", "test_notes"), ("result", "hit"))
+    assert metrics.CACHE_LOOKUPS._values[key] == 1
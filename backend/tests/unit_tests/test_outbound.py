@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from agent.outbound import (
+    AGING_SECONDS,
+    OutboundScheduler,
+    Priority,
+    TokenBucket,
+    _Waiter,
+)
+
+
+async def _grant_order(scheduler, priorities):
+    order = []
+
+    async def one(priority):
+        await scheduler.aacquire("m", 1, priority)
+        order.append(priority)
+
+    tasks = []
+    for priority in priorities:
+        tasks.append(asyncio.create_task(one(priority)))
+        # Enqueue in this order
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_queued_calls_are_granted_by_priority_then_arrival():
+    scheduler = OutboundScheduler({})
+    scheduler.pause("m", 0.1)
+    priorities = [
+        Priority.BACKGROUND,
+        Priority.DEFAULT,
+        Priority.INTERACTIVE,
+        Priority.DEFAULT,
+    ]
+    order = asyncio.run(_grant_order(scheduler, priorities))
+    assert order == [
+        Priority.INTERACTIVE,
+        Priority.DEFAULT,
+        Priority.DEFAULT,
+        Priority.BACKGROUND,
+    ]
+
+
+def test_waiting_calls_age_into_higher_classes():
+    now = time.monotonic()
+    old = _Waiter(Priority.BACKGROUND, 0, 1, lambda: None)
+    old.enqueued = now - 2.5 * AGING_SECONDS
+    fresh = _Waiter(Priority.DEFAULT, 1, 1, lambda: None)
+    assert old.rank(now) < fresh.rank(now)
+
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    bucket.refill(bucket.updated + 0.5)
+    assert bucket.level == pytest.approx(0.5)
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.level == 60
+    # Calls larger than a minute's worth wait for a full bucket, not forever
+    assert bucket.wait_time(1000) == 0.0
+
+
+def test_rpm_and_tpm_limits_hold_calls_until_refilled():
+    scheduler = OutboundScheduler({"m": {"rpm": 60, "tpm": 6000}})
+    scheduler.acquire("m", 100)
+    limiter = scheduler._limiter("m")
+    now = time.monotonic()
+    # 59 requests and 5900 tokens are left
+    assert limiter.wait_time(3000, now) == 0.0
+    # 6000 tokens need the 100 spent to refill at 100 a second
+    assert limiter.wait_time(6000, now) == pytest.approx(1.0, abs=0.05)
+
+
+def test_settle_refunds_and_charges_the_difference():
+    scheduler = OutboundScheduler({"m": {"tpm": 1000}})
+    scheduler.acquire("models/m", 800)
+    bucket = scheduler._limiter("m").tokens
+    scheduler.settle("m", 800, 100)
+    assert bucket.level == pytest.approx(900, abs=1)
+    scheduler.settle("m", 100, 400)
+    assert bucket.level == pytest.approx(600, abs=1)
+    # No usage reported: keep the reservation
+    scheduler.settle("m", 100, None)
+    assert bucket.level == pytest.approx(600, abs=1)
+
+
+def test_pause_holds_calls_to_that_model_only():
+    scheduler = OutboundScheduler({})
+    scheduler.pause("m", 0.2)
+    start = time.monotonic()
+    scheduler.acquire("other", 1)
+    assert time.monotonic() - start < 0.1
+    scheduler.acquire("m", 1)
+    assert time.monotonic() - start >= 0.2
+
+
+def test_cancelled_waiter_does_not_hold_capacity():
+    scheduler = OutboundScheduler({"m": {"rpm": 1}})
+    scheduler.pause("m", 0.1)
+
+    async def run():
+        cancelled = asyncio.create_task(scheduler.aacquire("m", 1))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        # The only request of the minute goes to the live call
+        await asyncio.wait_for(scheduler.aacquire("m", 1), timeout=2)
+        return cancelled
+
+    cancelled = asyncio.run(run())
+    assert cancelled.cancelled()
+    assert scheduler._limiter("m").queue == []
+
+
+def test_waiter_cancelled_after_its_grant_gives_capacity_back():
+    scheduler = OutboundScheduler({"m": {"rpm": 1, "tpm": 100}})
+    scheduler.pause("m", 0.05)
+
+    async def run():
+        task = asyncio.create_task(scheduler.aacquire("m", 80))
+        await asyncio.sleep(0)
+        # Block the loop so the grant lands before the task sees it
+        time.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    limiter = scheduler._limiter("m")
+    assert limiter.requests.level == pytest.approx(1, abs=0.01)
+    assert limiter.tokens.level == pytest.approx(100, abs=1)
@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from agent import preview
+
+HEAD = """<!doctype html>
+<html><head>
+<title>Plain title</title>
+<meta property="og:title" content=" OG title ">
+<meta name="description" content="plain description">
+<meta property="og:description" content="OG description">
+<meta property="og:image" content="img/cover.png">
+</head>
+<body>
+<meta property="og:image" content="/ignored.png">
+</body></html>
+"""
+
+
+def _parse(html):
+    parser = preview._HeadParser()
+    parser.feed(html)
+    return parser
+
+
+def test_og_tags_win_over_title_and_relative_image_is_resolved():
+    data = preview._og_from_head(_parse(HEAD), "https://example.com/a/page")
+    assert data == {
+        "title": "OG title",
+        "description": "OG description",
+        "image": "https://example.com/a/img/cover.png",
+    }
+
+
+def test_title_is_the_fallback_and_parsing_stops_at_body():
+    parser = _parse(
+        "<head><title> Only title </title></head><body><title>Not this</title>"
+    )
+    assert parser.done
+    assert (
+        preview._og_from_head(parser, "https://example.com/")["title"] == "Only title"
+    )
+    parser = _parse("<html><body><meta property='og:title' content='late'>")
+    assert parser.meta == {}
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    preview._cache.clear()
+    preview._empty_cache.clear()
+    served = {"chunks": 0}
+
+    async def big_head():
+        yield b"<html><head><title>big</title>"
+        for _ in range(100):
+            served["chunks"] += 1
+            yield b"<!-- " + b"x" * 1024 + b" -->"
+        yield b'<meta property="og:title" content="after the cap"></head>'
+
+    def handler(request):
+        if request.url.path == "/moved":
+            return httpx.Response(
+                302, headers={"location": "https://final.test/dir/page"}
+            )
+        if request.url.path == "/dir/page":
+            return httpx.Response(200, headers={"content-type": "text/html"}, text=HEAD)
+        if request.url.path == "/big":
+            return httpx.Response(
+                200, headers={"content-type": "text/html"}, content=big_head()
+            )
+        if request.url.path == "/file.pdf":
+            return httpx.Response(
+                200, headers={"content-type": "application/pdf"}, content=b"%PDF"
+            )
+        return httpx.Response(404)
+
+    monkeypatch.setattr(
+        preview,
+        "get_http_client",
+        lambda: httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), follow_redirects=True
+        ),
+    )
+    return served
+
+
+def test_image_is_resolved_against_the_final_url(pages):
+    data = asyncio.run(preview._fetch_preview("https://start.test/moved"))
+    assert data["image"] == "https://final.test/dir/img/cover.png"
+
+
+def test_fetch_stops_at_the_byte_cap(pages, monkeypatch):
+    monkeypatch.setattr(preview, "MAX_PREVIEW_BYTES", 8 * 1024)
+    data = asyncio.run(preview._fetch_preview("https://site.test/big"))
+    assert data["title"] == "big"
+    assert pages["chunks"] < 20
+
+
+def test_empty_previews_are_cached_briefly(pages):
+    data = asyncio.run(preview.get_preview("https://site.test/file.pdf"))
+    assert data == {"title": None, "description": None, "image": None}
+    assert preview._cache.get("https://site.test/file.pdf") is None
+    assert preview._empty_cache.get("https://site.test/file.pdf") == data
+    assert preview._empty_cache.ttl < preview._cache.ttl
+
+
+def test_bulk_reports_bad_urls_without_failing_the_rest(pages):
+    app = FastAPI()
+    app.include_router(preview.router)
+    response = TestClient(app).post(
+        "/api/preview/bulk",
+        json={
+            "urls": [
+                "https://final.test/dir/page",
+                "https://site.test/missing",
+                "ftp://x",
+                "",
+            ]
+        },
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["previews"]["https://final.test/dir/page"]["title"] == "OG title"
+    assert set(body["errors"]) == {"https://site.test/missing", "ftp://x"}
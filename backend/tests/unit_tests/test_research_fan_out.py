@@ -0,0 +1,82 @@
+import asyncio
+import importlib
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agent.metrics import NODE_DURATION
+
+# `agent.graph` as an attribute is the compiled graph, not the module
+agent_graph = importlib.import_module("agent.graph")
+
+
+@pytest.fixture
+def searched(monkeypatch):
+    searched = []
+
+    async def fake_web_research(state, config):
+        searched.append(state["search_query"])
+        return {"search_query": [state["search_query"]], "web_research_result": ["ok"]}
+
+    def fake_reflection(state, config):
+        loop = state["research_loop_count"] + 1
+        return {
+            "reflection": {"is_sufficient": loop > 1},
+            "is_sufficient": loop > 1,
+            "knowledge_gap": "",
+            "follow_up_queries": ["f1", "f2", "f3", "f4"],
+            "research_loop_count": loop,
+            "number_of_ran_queries": len(state["search_query"]),
+            "research_tokens": 100,
+            "research_segments": 1,
+        }
+
+    monkeypatch.setattr(agent_graph, "aweb_research", fake_web_research)
+    monkeypatch.setattr(agent_graph, "reflection", fake_reflection)
+    return searched
+
+
+def _web_research_runs():
+    entry = NODE_DURATION._values.get((("node", "web_research"), ("status", "ok")))
+    return entry[-1] if entry else 0
+
+
+def _state():
+    return {
+        "messages": [HumanMessage(content="q")],
+        "search_query": ["q"],
+        "research_started_at": time.time(),
+    }
+
+
+CONFIG = {
+    "configurable": {
+        "max_research_loops": 2,
+        "follow_up_max_queries": 3,
+        "pipelined_reflection_quorum": 1.0,
+    }
+}
+
+
+def test_pipelined_research_fans_out_like_evaluate_research(searched):
+    runs = _web_research_runs()
+    update = asyncio.run(agent_graph.apipelined_research(_state(), CONFIG))
+
+    # One loop left: every follow-up up to follow_up_max_queries runs at once
+    assert searched == ["q", "f1", "f2", "f3"]
+    assert update["research_loop_count"] == 2
+    # Every search is measured as a web_research run, which the adaptive fan-out reads
+    assert _web_research_runs() == runs + 4
+
+
+def test_sync_pipelined_research_reuses_one_loop_even_inside_a_running_loop(searched):
+    first = agent_graph.pipelined_research(_state(), CONFIG)
+    loop = agent_graph._research_loop
+
+    async def called_from_a_loop():
+        return agent_graph.pipelined_research(_state(), CONFIG)
+
+    second = asyncio.run(called_from_a_loop())
+    assert first["research_loop_count"] == second["research_loop_count"] == 2
+    assert agent_graph._research_loop is loop
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+
+from agent.search_cache import (
+    CacheBackend,
+    MemoryCacheBackend,
+    SearchCache,
+    SQLiteCacheBackend,
+)
+
+
+class ThreadRecordingBackend(MemoryCacheBackend):
+    blocking = True
+
+    def __init__(self):
+        super().__init__(ttl=60, max_entries=8)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value):
+        self.threads.append(threading.current_thread())
+        super().set(key, value)
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend(60, 8)
+
+
+def test_blocking_backends_run_off_the_event_loop():
+    backend = ThreadRecordingBackend()
+    cache = SearchCache(backend)
+
+    async def run():
+        await cache.aset("Giá vàng?", "m", "2026-01-01", {"text": "x"})
+        return await cache.aget(
+            "giá  vàng", "m", "2026-01-01"
+        ), threading.current_thread()
+
+    value, loop_thread = asyncio.run(run())
+    assert value == {"text": "x"}
+    assert len(backend.threads) == 2
+    assert loop_thread not in backend.threads
+
+
+def test_sqlite_backend_round_trip_and_eviction(tmp_path):
+    cache = SearchCache(SQLiteCacheBackend(60, 2, str(tmp_path / "cache.sqlite3")))
+    for i in range(3):
+        cache.set(f"q{i}", "m", "d", {"i": i})
+    assert cache.get("q0", "m", "d") is None
+    assert asyncio.run(cache.aget("q2", "m", "d")) == {"i": 2}
+    assert cache.stats()["size"] == 2
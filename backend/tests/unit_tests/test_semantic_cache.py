@@ -0,0 +1,127 @@
+import importlib
+
+import numpy as np
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.semantic_cache import SemanticCache, VectorStore
+
+# `agent.graph` as an attribute is the compiled graph, not the module
+agent_graph = importlib.import_module("agent.graph")
+
+
+class CountingChatModel:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=f"answer {self.calls}: {messages[-1].content}")
+
+
+@pytest.fixture
+def chat_model(monkeypatch):
+    model = CountingChatModel()
+    monkeypatch.setattr(agent_graph, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(agent_graph, "get_system_preamble", lambda: "")
+    cache = SemanticCache(threshold=0.9, capacity=16)
+    monkeypatch.setattr(agent_graph, "get_semantic_cache", lambda *args: cache)
+    return model
+
+
+CONFIG = {"configurable": {"singleflight_enabled": False, "llm_cache_enabled": True}}
+
+
+def test_repeated_opening_prompt_is_cached(chat_model):
+    first = agent_graph.node_llm(
+        {"messages": [HumanMessage(content="xin chào")]}, CONFIG
+    )
+    second = agent_graph.node_llm(
+        {"messages": [HumanMessage(content="Xin chào!")]}, CONFIG
+    )
+    assert chat_model.calls == 1
+    assert second["llm"]["cache"] == "hit"
+    assert second["messages"][0].content == first["messages"][0].content
+
+
+def test_shared_history_does_not_match_other_conversations(chat_model):
+    # The transcripts of these two turns are more than 0.9 similar
+    opening = [
+        HumanMessage(content="xin chào"),
+        AIMessage(
+            content="Xin chào! Tôi là trợ lý AI của Locaith. Tôi có thể giúp gì cho bạn hôm nay? "
+            "Bạn có thể hỏi tôi bất cứ điều gì, từ nấu ăn, du lịch đến học tập và công việc."
+        ),
+    ]
+    joke = opening + [HumanMessage(content="kể một câu chuyện cười")]
+    pho = opening + [HumanMessage(content="dạy tôi cách nấu phở bò")]
+
+    agent_graph.node_llm({"messages": joke}, CONFIG)
+    answer = agent_graph.node_llm({"messages": pho}, CONFIG)
+
+    assert chat_model.calls == 2
+    assert "cache" not in answer["llm"]
+    assert "phở bò" in answer["messages"][0].content
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("viết email xin nghỉ phép thứ hai", "viết email xin nghỉ phép thứ sáu"),
+        ("write a poem about the sea at night", "write a poem about the sea at dawn"),
+        ("giá vàng ngày 12/5 thế nào", "giá vàng ngày 13/5 thế nào"),
+        (
+            "fix this code: def add(a, b): return a - b",
+            "fix this code: def mul(a, b): return a - b",
+        ),
+    ],
+)
+def test_prompts_differing_in_numbers_days_or_names_do_not_hit(first, second):
+    # Low enough a threshold that only the exact-token guard keeps these apart
+    cache = SemanticCache(threshold=0.5, capacity=16)
+    cache.add(first, "cached")
+    assert cache.lookup(first) == "cached"
+    assert cache.lookup(second) is None
+
+
+def test_llm_cache_is_off_by_default(monkeypatch):
+    monkeypatch.setattr(agent_graph, "get_semantic_cache", pytest.fail)
+    model = CountingChatModel()
+    monkeypatch.setattr(agent_graph, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(agent_graph, "get_system_preamble", lambda: "")
+    config = {"configurable": {"singleflight_enabled": False}}
+    agent_graph.node_llm({"messages": [HumanMessage(content="xin chào")]}, config)
+    agent_graph.node_llm({"messages": [HumanMessage(content="xin chào")]}, config)
+    assert model.calls == 2
+
+
+def _unit(*values):
+    vec = np.array(values, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def test_miss_below_threshold_does_not_refresh_lru():
+    store = VectorStore(dim=2, capacity=2)
+    store.add(_unit(1, 0), "a")
+    store.add(_unit(0, 1), "b")
+    # Nearest to "a" but not similar enough: a miss must not make "a" recent
+    assert store.search(_unit(1, 1), threshold=0.9) == (
+        None,
+        pytest.approx(0.7071, abs=1e-3),
+    )
+    store.add(_unit(1, -1), "c")
+    assert store.search(_unit(1, 0))[0] != "a"
+    assert store.search(_unit(0, 1))[0] == "b"
+
+
+def test_clear_resets_eviction_order():
+    store = VectorStore(dim=2, capacity=2, eviction="fifo")
+    store.add(_unit(1, 0), "a")
+    store.add(_unit(0, 1), "b")
+    store.clear()
+    store.add(_unit(1, 0), "c")
+    store.add(_unit(0, 1), "d")
+    store.add(_unit(1, 1), "e")
+    # Oldest since clear() is "c"
+    assert store.search(_unit(0, 1))[0] == "d"
+    assert store.search(_unit(1, 0), threshold=0.9)[0] is None
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent.singleflight import COALESCED, SingleFlight
+
+
+def test_threads_share_the_leaders_exception_and_free_the_key():
+    flight = SingleFlight("test_threads")
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def caller():
+        try:
+            flight.do("k", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=caller) for _ in range(3)]
+    for t in followers:
+        t.start()
+    # Fail only once every follower has joined the in-flight call
+    shared = (("group", "test_threads"), ("role", "shared"))
+    while COALESCED._values.get(shared, 0) < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert len(errors) == 4
+    assert len({id(e) for e in errors}) == 1
+    assert flight._calls == {}
+    assert flight.do("k", lambda: "fresh") == "fresh"
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _pending(flight):
+    # Done callbacks free the key on the next loop iteration
+    await asyncio.sleep(0)
+    return flight._async_calls[asyncio.get_running_loop()]
+
+
+def test_async_waiters_all_get_the_leaders_exception():
+    async def run():
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            *(flight.ado("k", failing) for _ in range(3)), return_exceptions=True
+        )
+        return calls, results, await _pending(flight)
+
+    calls, results, pending = _run(run())
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len({id(r) for r in results}) == 1
+    assert pending == {}
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call_running():
+    async def run():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.ado("k", slow))
+        second = asyncio.create_task(flight.ado("k", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await second, first, await _pending(flight)
+
+    result, first, pending = _run(run())
+    assert result == "done"
+    assert first.cancelled()
+    assert pending == {}
+
+
+def test_call_is_cancelled_once_every_waiter_is_gone_and_the_key_is_freed():
+    async def run():
+        flight = SingleFlight("test")
+        cancelled = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.ado("k", slow)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+        async def fresh():
+            return "fresh"
+
+        # The key is free: the next caller starts its own call
+        return await flight.ado("k", fresh)
+
+    assert _run(run()) == "fresh"
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_async_key_is_released_after_the_call(fail):
+    async def run():
+        flight = SingleFlight("test")
+
+        async def call():
+            if fail:
+                raise RuntimeError("boom")
+            return "ok"
+
+        try:
+            await flight.ado("k", call)
+        except RuntimeError:
+            pass
+        return await _pending(flight)
+
+    assert _run(run()) == {}
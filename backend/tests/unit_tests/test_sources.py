@@ -0,0 +1,107 @@
+from agent.sources import (
+    merge_sources,
+    register_short_urls,
+    rewrite_short_urls,
+    sources_from_citations,
+)
+from agent.utils import SHORT_URL_PREFIX
+
+
+def short(name):
+    return f"{SHORT_URL_PREFIX}{name}"
+
+
+def test_rewrite_replaces_known_short_urls_and_keeps_unknown_ones():
+    registry = {short("0-1"): "https://a.example/"}
+    text = f"See [a]({short('0-1')}) and [b]({short('9-9')})."
+    assert (
+        rewrite_short_urls(text, registry)
+        == f"See [a](https://a.example/) and [b]({short('9-9')})."
+    )
+    assert rewrite_short_urls(text, {}) == text
+
+
+def test_short_urls_that_prefix_others_are_rewritten_whole():
+    registry = {
+        short("0-1"): "https://one.example/",
+        short("0-10"): "https://ten.example/",
+        short("0-100"): "https://hundred.example/",
+    }
+    text = f"{short('0-100')} {short('0-10')} {short('0-1')} {short('0-1000')}"
+    assert rewrite_short_urls(text, registry) == (
+        f"https://hundred.example/ https://ten.example/ https://one.example/ {short('0-1000')}"
+    )
+
+
+def test_registry_keeps_the_first_url_of_each_short_url():
+    registry = register_short_urls(
+        [
+            {
+                "url": "https://a.example/",
+                "label": "a",
+                "short_url": short("0-0"),
+                "refs": [],
+            },
+            {"value": "https://b.example/", "short_url": short("0-0")},
+            {"url": "https://c.example/", "label": "c", "short_url": None, "refs": []},
+        ]
+    )
+    assert registry == {short("0-0"): "https://a.example/"}
+
+
+def _citations(*segments):
+    return [{"segments": [dict(segment)]} for segment in segments]
+
+
+def test_same_url_from_parallel_branches_becomes_one_record_with_merged_refs():
+    a = {"value": "https://a.example/", "label": "A", "short_url": short("0-0")}
+    b = {"value": "https://b.example/", "label": "B", "short_url": short("1-1")}
+    first = sources_from_citations(_citations(a, a), 0)
+    second = sources_from_citations(
+        _citations(b, {**a, "label": "A again", "short_url": short("1-0")}), 1
+    )
+    assert first == [
+        {
+            "url": "https://a.example/",
+            "label": "A",
+            "short_url": short("0-0"),
+            "refs": ["0:0", "0:1"],
+        }
+    ]
+
+    merged = merge_sources(merge_sources([], first), second)
+
+    assert [s["url"] for s in merged] == ["https://a.example/", "https://b.example/"]
+    assert merged[0] == {
+        "url": "https://a.example/",
+        "label": "A",
+        "short_url": short("0-0"),
+        "refs": ["0:0", "0:1", "1:1"],
+    }
+    # Records already in state are not mutated
+    assert first[0]["refs"] == ["0:0", "0:1"]
+    # Merging the same branch update again changes nothing
+    assert merge_sources(merged, second) == merged
+
+
+def test_merge_accepts_citation_segments_and_older_source_dicts():
+    merged = merge_sources(
+        [{"label": "old", "short_url": short("0-0"), "value": "https://a.example/"}],
+        [
+            {
+                "url": "https://a.example/",
+                "label": "new",
+                "short_url": None,
+                "refs": ["1:0"],
+            },
+            {"label": "no url"},
+        ],
+    )
+    assert merged == [
+        {
+            "url": "https://a.example/",
+            "label": "old",
+            "short_url": short("0-0"),
+            "refs": ["1:0"],
+        }
+    ]
@@ -0,0 +1,132 @@
+import asyncio
+import importlib
+import threading
+import time
+from types import SimpleNamespace as NS
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.clients import set_genai_client
+from agent.configuration import Configuration
+from agent.semantic_cache import SemanticCache
+
+# `agent.graph` as an attribute is the compiled graph, not the module
+agent_graph = importlib.import_module("agent.graph")
+
+
+class StubModels:
+    def __init__(self, verdict):
+        self.verdict = verdict
+        self.calls = []
+
+    def generate_content(self, model, contents, config):
+        self.calls.append((model, contents, config))
+        return NS(text=self.verdict, usage_metadata=None)
+
+
+class StubAsyncModels(StubModels):
+    async def generate_content(self, model, contents, config):
+        return StubModels.generate_content(self, model, contents, config)
+
+
+class StubClient:
+    def __init__(self, verdict):
+        self.models = StubModels(verdict)
+        self.aio = NS(models=StubAsyncModels(verdict))
+
+
+@pytest.fixture
+def stub_client():
+    def install(verdict):
+        client = StubClient(verdict)
+        set_genai_client(client)
+        return client
+
+    yield install
+    set_genai_client(None)
+
+
+@pytest.fixture
+def branches(monkeypatch):
+    monkeypatch.setattr(
+        agent_graph, "node_llm", lambda state, config: {"branch": "llm"}
+    )
+    monkeypatch.setattr(
+        agent_graph,
+        "generate_query",
+        lambda state, config: {"branch": "generate_query"},
+    )
+
+
+def _state(text="giá vàng hôm nay thế nào"):
+    return {"messages": [HumanMessage(content=text)]}
+
+
+@pytest.mark.parametrize(
+    "verdict, route",
+    [("chat", "llm"), ("search", "generate_query"), ("???", "generate_query")],
+)
+def test_speculate_follows_classifier_verdict(stub_client, branches, verdict, route):
+    client = stub_client(verdict)
+    update = agent_graph.speculate(_state(), {"configurable": {}})
+    assert update == {"branch": route, "speculative_route": route}
+    assert len(client.models.calls) == 1
+
+
+def test_speculate_keeps_search_when_classifier_fails(stub_client, branches):
+    client = stub_client("chat")
+
+    def boom(model, contents, config):
+        raise RuntimeError("down")
+
+    client.models.generate_content = boom
+    update = agent_graph.speculate(_state(), {"configurable": {}})
+    assert update["speculative_route"] == "generate_query"
+
+
+@pytest.mark.parametrize(
+    "verdict, expected", [("chat", "chat"), ("search", "search"), ("", None)]
+)
+def test_aclassify_route_returns_verdict(stub_client, verdict, expected):
+    client = stub_client(verdict)
+    result = asyncio.run(agent_graph._aclassify_route(_state(), Configuration()))
+    assert result == expected
+    assert len(client.aio.models.calls) == 1
+
+
+class SlowChatModel:
+    def __init__(self):
+        self.finished = threading.Event()
+
+    def invoke(self, messages):
+        # Outlives the classifier, as a real draft would
+        time.sleep(0.1)
+        self.finished.set()
+        return AIMessage(content="draft answer")
+
+
+@pytest.mark.parametrize("verdict, cached", [("chat", True), ("search", False)])
+def test_only_kept_drafts_reach_the_semantic_cache(
+    stub_client, monkeypatch, verdict, cached
+):
+    stub_client(verdict)
+    model = SlowChatModel()
+    cache = SemanticCache(threshold=0.97, capacity=16)
+    monkeypatch.setattr(agent_graph, "get_chat_model", lambda *args, **kwargs: model)
+    monkeypatch.setattr(agent_graph, "get_system_preamble", lambda: "")
+    monkeypatch.setattr(agent_graph, "get_semantic_cache", lambda *args: cache)
+    monkeypatch.setattr(
+        agent_graph,
+        "generate_query",
+        lambda state, config: {"branch": "generate_query"},
+    )
+    config = {
+        "configurable": {"llm_cache_enabled": True, "singleflight_enabled": False}
+    }
+
+    asyncio.run(agent_graph.aspeculate(_state("xin chào"), config))
+    # A discarded draft runs in a worker thread and cannot be stopped; let it finish
+    assert model.finished.wait(2)
+    time.sleep(0.05)
+    assert (cache.lookup("xin chào") == "draft answer") is cached
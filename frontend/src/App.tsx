@@ -127,6 +127,7 @@ export default function App() {
     initial_search_query_count: number;
     max_research_loops: number;
     reasoning_model: string;
+    execution_profile: string;
   }>({
     apiUrl: getApiUrl(),
     assistantId: "agent",
@@ -153,6 +154,14 @@ export default function App() {
           }.`,
           sources: sources,
         };
+      } else if (event.research) {
+        // Pipelined research: searches and reflections ran inside one node
+        const sources = event.research.web_research?.sources_gathered || [];
+        processedEvent = {
+          title: "Web Research",
+          data: `Gathered ${sources.length} sources in ${event.research.research_loop_count || 1} research loop(s).`,
+          sources: sources,
+        };
       } else if (event.reflection) {
         processedEvent = {
           title: "Reflection",
@@ -182,6 +191,15 @@ export default function App() {
           sources: Array.isArray(event.sources_gathered) ? event.sources_gathered : [],
         };
         hasFinalizeEventOccurredRef.current = true;
+      } else if (event.speculate) {
+        // Borderline prompt: the backend kept either the direct answer or the search queries
+        processedEvent = event.speculate.speculative_route === "llm"
+          ? { title: "LLM", data: event.speculate.llm?.model || "gemini-2.5-flash" }
+          : {
+              title: "Generating Search Queries",
+              data: event.speculate.search_query?.join(", ") || "",
+              queries: event.speculate.search_query || [],
+            };
       } else if (event.llm) {
         processedEvent = {
           title: "LLM",
@@ -376,20 +394,25 @@ export default function App() {
       // Low: 1 initial query, 1 loop max
       // Medium: 2 initial queries, 1 loop max (faster response)
       // High: 3 initial queries, 3 loops max (detailed answers)
+      // Effort also picks the execution profile (planner/actor/self-check depth)
       let initial_search_query_count = 0;
       let max_research_loops = 0;
+      let execution_profile = "balanced";
       switch (effort) {
         case "low":
           initial_search_query_count = 1;
           max_research_loops = 1;
+          execution_profile = "fast";
           break;
         case "medium":
           initial_search_query_count = 2;
           max_research_loops = 1;
+          execution_profile = "balanced";
           break;
         case "high":
           initial_search_query_count = 3;
           max_research_loops = 3;
+          execution_profile = "thorough";
           break;
       }
 
@@ -427,6 +450,7 @@ export default function App() {
         initial_search_query_count: initial_search_query_count,
         max_research_loops: max_research_loops,
         reasoning_model: "gemini-2.5-pro", // Sử dụng model chính xác cho reasoning
+        execution_profile: execution_profile,
       };
       lastPayloadRef.current = payload;
       retryAttemptRef.current = 0;
@@ -6,7 +6,7 @@ import { InputForm } from "@/components/InputForm";
 import { Button } from "@/components/ui/button";
 import { useState, ReactNode, useEffect, useRef } from "react";
 import ReactMarkdown from "react-markdown";
-import { cn } from "@/lib/utils";
+import { cn, imageVariantUrl } from "@/lib/utils";
 import { Badge } from "@/components/ui/badge";
 import {
   ActivityTimeline,
@@ -428,7 +428,7 @@ export default function ChatMessagesView({
                 <div className="relative group max-w-[85%] md:max-w-[80%] break-words w-full">
                   {imgUrl ? (
                     <img
-                      src={imgUrl}
+                      src={imageVariantUrl(imgUrl, "medium")}
                       alt="Generated"
                       className="max-h-[420px] w-auto rounded-md border border-neutral-700 cursor-pointer hover:opacity-90 transition-opacity"
                       loading="lazy"
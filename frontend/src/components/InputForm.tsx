@@ -15,8 +15,21 @@ import {
   DropdownMenuItem,
   DropdownMenuTrigger,
 } from "@/components/ui/dropdown-menu";
+import { sessionHeaders } from "@/lib/session";
+import { safeCreateURL } from "@/lib/errorHandler";
 
 // Helper functions
+// Absolute URL of an image returned by /api/image (served as raw bytes by id);
+// falls back to a data URL from older backends
+function imageUrlFrom(json: any): string {
+  if (json?.url) {
+    const base = import.meta.env.DEV ? window.location.origin : "http://localhost:8123";
+    const absolute = safeCreateURL(json.url, base);
+    if (absolute) return absolute.toString();
+  }
+  return json?.data_url || "";
+}
+
 
 // Updated InputFormProps
 interface InputFormProps {
@@ -70,6 +83,8 @@ export const InputForm: React.FC<InputFormProps> = ({
   const [justSubmitted, setJustSubmitted] = useState<boolean>(false);
   const [recentImageGenerated, setRecentImageGenerated] = useState<boolean>(false);
   const [lastGeneratedImageId, setLastGeneratedImageId] = useState<string | null>(null);
+  // Image last returned by the backend; edits of it are sent by id instead of re-uploading it
+  const [lastServerImage, setLastServerImage] = useState<{ id: string; dataUrl: string } | null>(null);
   
   // Auto-set mode when image intent is detected
   useEffect(() => {
@@ -322,10 +337,15 @@ export const InputForm: React.FC<InputFormProps> = ({
           fd.append("aspect_ratio", aspectRatio);
           
           // Priority order for image source: attachmentFile > recentPreview > lastImageUrl > imagePreview
+          const selectedPreview = recentPreview || lastImageUrl || (lastGeneratedImageId ? imagePreview : null);
           if (attachmentFile) {
             fd.append("file", attachmentFile);
             console.info('[InputForm] Using uploaded file for edit');
           } 
+          else if (lastServerImage && selectedPreview === lastServerImage.dataUrl) {
+            fd.append("image_id", lastServerImage.id);
+            console.info('[InputForm] Using stored image for edit', { imageId: lastServerImage.id });
+          }
           else if (recentPreview) {
             try {
               // Convert data URL to blob
@@ -376,7 +396,7 @@ export const InputForm: React.FC<InputFormProps> = ({
           }
           console.info('[InputForm] POST /api/image/edit', { aspectRatio, hasFile: !!attachmentFile, prompt: trimmed });
 
-          const res = await fetch(url, { method: "POST", body: fd });
+          const res = await fetch(url, { method: "POST", body: fd, headers: sessionHeaders() });
           let json: any = null;
           try {
             json = await res.json();
@@ -391,7 +411,7 @@ export const InputForm: React.FC<InputFormProps> = ({
             throw new Error(detail || `Image edit failed: ${res.status}`);
           }
           if (!json) throw new Error("No response body");
-          dataUrl = json?.data_url || "";
+          dataUrl = imageUrlFrom(json);
         } else {
           const url = import.meta.env.DEV ? "/api/image/generate" : "http://localhost:8123/api/image/generate";
 
@@ -403,7 +423,7 @@ export const InputForm: React.FC<InputFormProps> = ({
 
           const res = await fetch(url, {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
+            headers: { "Content-Type": "application/json", ...sessionHeaders() },
             body: JSON.stringify({ prompt: trimmed, aspect_ratio: aspectRatio }),
           });
           let json: any = null;
@@ -420,11 +440,12 @@ export const InputForm: React.FC<InputFormProps> = ({
             throw new Error(detail || `Image generate failed: ${res.status}`);
           }
           if (!json) throw new Error("No response body");
-          dataUrl = json?.data_url || "";
+          dataUrl = imageUrlFrom(json);
         }
         if (dataUrl) {
-          console.info('[InputForm] Image data_url received');
+          console.info('[InputForm] Image received');
           setImagePreview(dataUrl);
+          setLastServerImage(lastJson?.image_id ? { id: lastJson.image_id, dataUrl } : null);
 
           // Call callback to add image to chat history like ChatGPT/Gemini
           if (onImageGenerated) {
@@ -77,28 +77,38 @@ const HostLink: React.FC<{ url: string; title?: string }> = ({ url, title }) =>
   );
 };
 
-const SourcePreview: React.FC<{ url: string }> = ({ url }) => {
-  const [data, setData] = useState<{ title?: string; image?: string } | null>(null);
+type Preview = { title?: string; description?: string; image?: string };
+
+const PREVIEW_BULK_URL = import.meta.env.DEV
+  ? "/api/preview/bulk"
+  : "http://localhost:8123/api/preview/bulk";
+// Server-side cap on URLs per bulk request
+const PREVIEW_BATCH_SIZE = 50;
+
+// Fetches previews for all source cards in as few requests as possible
+function usePreviews(urls: string[]): { previews: Record<string, Preview>; loading: boolean } {
+  const [previews, setPreviews] = useState<Record<string, Preview>>({});
   const [loading, setLoading] = useState<boolean>(false);
+  const key = urls.join("\n");
 
   useEffect(() => {
     let mounted = true;
-    async function fetchPreview() {
+    const wanted = urls.filter((u) => typeof u === "string" && u.trim() !== "");
+    if (wanted.length === 0) return;
+    async function fetchPreviews() {
       setLoading(true);
       try {
-        const base = import.meta.env.DEV ? "/api/preview" : "http://localhost:8123/api/preview";
-        
-        // Validate base URL and input URL
-        if (!base || typeof base !== "string" || base.trim() === "") {
-          throw new Error("Invalid base URL for preview");
-        }
-        if (!url || typeof url !== "string" || url.trim() === "") {
-          throw new Error("Invalid URL for preview");
+        for (let i = 0; i < wanted.length; i += PREVIEW_BATCH_SIZE) {
+          const res = await fetch(PREVIEW_BULK_URL, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ urls: wanted.slice(i, i + PREVIEW_BATCH_SIZE) }),
+          });
+          const json = await res.json();
+          if (mounted && json?.previews) {
+            setPreviews((prev) => ({ ...prev, ...json.previews }));
+          }
         }
-        
-        const res = await fetch(`${base}?url=${encodeURIComponent(url)}`);
-        const json = await res.json();
-        if (mounted) setData(json);
       } catch (e) {
         console.warn('Preview fetch error:', e);
         // silent fail
@@ -106,10 +116,15 @@ const SourcePreview: React.FC<{ url: string }> = ({ url }) => {
         if (mounted) setLoading(false);
       }
     }
-    fetchPreview();
+    fetchPreviews();
     return () => { mounted = false; };
-  }, [url]);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [key]);
+
+  return { previews, loading };
+}
 
+const SourcePreview: React.FC<{ data?: Preview; loading: boolean }> = ({ data, loading }) => {
   if (loading) {
     return <Skeleton className="h-16 w-24 rounded-md" />;
   }
@@ -130,6 +145,7 @@ const SourcePreview: React.FC<{ url: string }> = ({ url }) => {
 
 export const SearchResultsPanel: React.FC<SearchResultsPanelProps> = ({ processedEvents, isLoading }) => {
   const sources = useMemo(() => extractSources(processedEvents), [processedEvents]);
+  const { previews, loading: previewsLoading } = usePreviews(sources.map((s) => s.url));
 
   return (
     <Card className="bg-neutral-800 border-neutral-700">
@@ -151,7 +167,7 @@ export const SearchResultsPanel: React.FC<SearchResultsPanelProps> = ({ processe
               {sources.map((s, idx) => (
                 <li key={idx} className="flex items-start gap-3">
                   <div className="shrink-0">
-                    <SourcePreview url={s.url} />
+                    <SourcePreview data={previews[s.url]} loading={previewsLoading && !previews[s.url]} />
                   </div>
                   <div className="flex-1">
                     <HostLink url={s.url} title={s.title} />
@@ -0,0 +1,32 @@
+// Identifies this browser to the backend image store (X-Session-Id header),
+// so each user's images and "last image" are kept apart.
+let cachedSessionId: string | null = null;
+
+function newSessionId(): string {
+  try {
+    if (typeof crypto !== "undefined" && typeof crypto.randomUUID === "function") {
+      return crypto.randomUUID();
+    }
+  } catch {}
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+export function getClientSessionId(): string {
+  if (cachedSessionId) return cachedSessionId;
+  try {
+    const stored = localStorage.getItem("locaith.session");
+    if (stored) {
+      cachedSessionId = stored;
+      return stored;
+    }
+  } catch {}
+  cachedSessionId = newSessionId();
+  try {
+    localStorage.setItem("locaith.session", cachedSessionId);
+  } catch {}
+  return cachedSessionId;
+}
+
+export function sessionHeaders(): Record<string, string> {
+  return { "X-Session-Id": getClientSessionId() };
+}
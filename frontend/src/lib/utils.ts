@@ -4,3 +4,12 @@ import { twMerge } from "tailwind-merge";
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs));
 }
+
+// Backend image URLs (/api/image/<id>) can be served resized; other URLs are returned as-is
+const BACKEND_IMAGE_RE = /\/api\/image\/[0-9a-f]{32}$/;
+
+export function imageVariantUrl(url: string, size: "thumb" | "small" | "medium"): string {
+  const [path, query] = url.split("?");
+  if (!BACKEND_IMAGE_RE.test(path) || query) return url;
+  return `${path}?size=${size}`;
+}